@@ -1,13 +1,19 @@
+import asyncio
 import cProfile
 import os.path
 import sys
+from unittest.mock import PropertyMock, patch
 
+from asgiref.sync import sync_to_async
+from django.db import connection
 from django.test import TestCase
-from django.utils import timezone
-from tests.util import DictStorage
+from django.test.utils import CaptureQueriesContext
+from tests.util import DictStorage, collected_query
 
-from silk.collector import DataCollector
+from silk.collector import CollectedProfile, DataCollector
 from silk.config import SilkyConfig
+from silk.models import NPlusOneFinding, Profile, Request, SQLQuery, Traceback
+from silk.profiling.sampling import Sampler
 
 from .factories import RequestMinFactory
 
@@ -20,7 +26,7 @@ class TestCollector(TestCase):
         self.assertTrue(a == b == c)
 
     def test_query_registration(self):
-        mock_query = {}
+        mock_query = collected_query()
         DataCollector().register_query(mock_query)
         self.assertIn(mock_query, list(DataCollector().queries.values()))
 
@@ -55,18 +61,192 @@ class TestCollector(TestCase):
     def test_finalise_is_idempotent(self):
         request = RequestMinFactory()
         DataCollector().configure(request, should_profile=False)
-        DataCollector().register_query({
-            'query': 'SELECT 1',
-            'start_time': timezone.now(),
-            'end_time': timezone.now(),
-            'traceback': '',
-            'analysis': None,
-            'request': request,
-        })
+        DataCollector().register_query(collected_query(request=request))
         DataCollector().finalise()
-        # Second call must not raise TypeError from stale 'model' key in query dict
+        # Second call must not fail because of state left on the query by the first
         DataCollector().finalise()
 
+    def _register_profiled_queries(self, request, num_profiles):
+        for _ in range(num_profiles):
+            DataCollector().register_query(collected_query(request=request))
+            profile = CollectedProfile('profile', request=request)
+            profile.queries = [DataCollector().local.temp_identifier]
+            profile.finish()
+            DataCollector().register_profile(profile)
+
+    def test_finalise_links_profiles_to_queries(self):
+        request = RequestMinFactory()
+        DataCollector().configure(request, should_profile=False)
+        self._register_profiled_queries(request, 3)
+        DataCollector().finalise()
+        profiles = Profile.objects.filter(request=request)
+        self.assertEqual(profiles.count(), 3)
+        for profile in profiles:
+            self.assertEqual(profile.queries.count(), 1)
+            self.assertIsNotNone(profile.time_taken)
+
+    def test_finalise_num_queries_independent_of_num_profiles(self):
+        num_queries = []
+        for num_profiles in (1, 5):
+            request = RequestMinFactory()
+            DataCollector().configure(request, should_profile=False)
+            self._register_profiled_queries(request, num_profiles)
+            with CaptureQueriesContext(connection) as ctx:
+                DataCollector().finalise()
+            num_queries.append(len(ctx.captured_queries))
+        self.assertEqual(num_queries[0], num_queries[1])
+
+    def test_finalise_computes_db_time(self):
+        request = RequestMinFactory()
+        DataCollector().configure(request, should_profile=False)
+        self._register_profiled_queries(request, 2)
+        for query in DataCollector().queries.values():
+            query.end_ns = query.start_ns + 2 * 10**6
+        DataCollector().finalise()
+        self.assertAlmostEqual(Request.objects.get(pk=request.pk).db_time, 4)
+        for profile in Profile.objects.filter(request=request):
+            self.assertAlmostEqual(profile.db_time, 2)
+
+    def test_finalise_keeps_sub_millisecond_times(self):
+        request = RequestMinFactory()
+        DataCollector().configure(request, should_profile=False)
+        DataCollector().register_query(collected_query(milliseconds=0.25, request=request))
+        DataCollector().finalise()
+        query = SQLQuery.objects.get(request=request)
+        self.assertEqual(query.time_taken_us, 250)
+        self.assertEqual(query.time_taken, 0.25)
+        self.assertGreaterEqual(query.start_time, DataCollector().local.clock.time)
+
+    def test_finish_request(self):
+        request = RequestMinFactory()
+        DataCollector().configure(request, should_profile=False)
+        DataCollector().finish_request()
+        self.assertGreaterEqual(request.time_taken_us, 0)
+        self.assertGreaterEqual(request.end_time, DataCollector().local.clock.time)
+        request.save()
+        self.assertEqual(request.time_taken, request.time_taken_us / 1000)
+
+    def _register_timed_query(self, request, milliseconds):
+        DataCollector().register_query(collected_query('SELECT %d' % milliseconds, milliseconds, request=request))
+
+    def test_max_recorded_queries_keeps_slowest(self):
+        request = RequestMinFactory()
+        DataCollector().configure(request, should_profile=False)
+        with patch.object(SilkyConfig(), 'SILKY_MAX_RECORDED_QUERIES', 2, create=True):
+            for milliseconds in (3, 1, 5, 2, 4):
+                self._register_timed_query(request, milliseconds)
+        self.assertEqual(sorted(q.query for q in DataCollector().queries.values()), ['SELECT 4', 'SELECT 5'])
+        self.assertEqual(request.num_dropped_queries, 3)
+        self.assertAlmostEqual(request.dropped_queries_time, 6)
+        DataCollector().finalise()
+        self.assertEqual(SQLQuery.objects.filter(request=request).count(), 2)
+
+    def test_max_recorded_queries_drops_profiled_query(self):
+        request = RequestMinFactory()
+        DataCollector().configure(request, should_profile=False)
+        with patch.object(SilkyConfig(), 'SILKY_MAX_RECORDED_QUERIES', 1, create=True):
+            self._register_profiled_queries(request, 1)
+            self._register_timed_query(request, 10)
+        DataCollector().finalise()
+        self.assertFalse(Profile.objects.get(request=request).queries.exists())
+
+    def test_max_recorded_profiles(self):
+        request = RequestMinFactory()
+        DataCollector().configure(request, should_profile=False)
+        with patch.object(SilkyConfig(), 'SILKY_MAX_RECORDED_PROFILES', 1, create=True):
+            self._register_profiled_queries(request, 3)
+        self.assertEqual(len(DataCollector().profiles), 1)
+        self.assertEqual(request.num_dropped_profiles, 2)
+
+    def test_finalise_without_returned_primary_keys(self):
+        request = RequestMinFactory()
+        DataCollector().configure(request, should_profile=False)
+        self._register_profiled_queries(request, 2)
+        with patch.object(
+            type(connection.features), 'can_return_rows_from_bulk_insert', new_callable=PropertyMock, return_value=False
+        ):
+            DataCollector().finalise()
+        for profile in Profile.objects.filter(request=request):
+            self.assertEqual(list(profile.queries.values_list('query', flat=True)), ['SELECT 1'])
+
+    def test_finalise_formats_captured_stacks(self):
+        request = RequestMinFactory()
+        DataCollector().configure(request, should_profile=False)
+        stack = (('/app/views.py', 10, 'view'), ('/app/urls.py', 5, 'dispatch'))
+        DataCollector().register_query(collected_query(request=request, traceback=stack))
+        DataCollector().finalise()
+        self.assertEqual(
+            SQLQuery.objects.get(request=request).traceback,
+            '  File "/app/views.py", line 10, in view\n  File "/app/urls.py", line 5, in dispatch',
+        )
+
+    def test_finalise_stores_each_stack_once(self):
+        request = RequestMinFactory()
+        DataCollector().configure(request, should_profile=False)
+        stacks = [(('/app/views.py', 10, 'view'),), (('/app/views.py', 12, 'view'),)]
+        for stack in stacks * 3:
+            DataCollector().register_query(collected_query(request=request, traceback=stack))
+        DataCollector().finalise()
+        self.assertEqual(SQLQuery.objects.filter(request=request).count(), 6)
+        self.assertEqual(Traceback.objects.count(), 2)
+
+    def _register_repeated_queries(self, request, stack, count, query='SELECT 1'):
+        for _ in range(count):
+            DataCollector().register_query(
+                collected_query(query, request=request, traceback=stack, fingerprint=query)
+            )
+
+    def test_finalise_detects_n_plus_one(self):
+        request = RequestMinFactory()
+        DataCollector().configure(request, should_profile=False)
+        loop = (('/app/views.py', 10, 'view'),)
+        self._register_repeated_queries(request, loop, 5)
+        self._register_repeated_queries(request, (('/app/views.py', 20, 'view'),), 4)
+        self._register_repeated_queries(request, loop, 4, query='SELECT 2')
+        DataCollector().finalise()
+        finding = NPlusOneFinding.objects.get(request=request)
+        self.assertEqual(
+            (finding.file_path, finding.line_num, finding.func_name, finding.num_queries),
+            ('/app/views.py', 10, 'view', 5),
+        )
+        self.assertEqual(request.num_n_plus_one, 1)
+
+    def test_n_plus_one_disabled(self):
+        request = RequestMinFactory()
+        DataCollector().configure(request, should_profile=False)
+        self._register_repeated_queries(request, (('/app/views.py', 10, 'view'),), 10)
+        with patch.object(SilkyConfig(), 'SILKY_N_PLUS_ONE_THRESHOLD', None, create=True):
+            DataCollector().finalise()
+        self.assertFalse(NPlusOneFinding.objects.exists())
+        self.assertEqual(request.num_n_plus_one, 0)
+
+    def test_state_is_isolated_between_coroutines(self):
+        requests = [RequestMinFactory.build() for _ in range(2)]
+
+        async def handle(request):
+            DataCollector().configure(request, should_profile=False)
+            await asyncio.sleep(0)
+            DataCollector().register_query(collected_query(request.path))
+            await asyncio.sleep(0)
+            return DataCollector().request, [query.query for query in DataCollector().queries.values()]
+
+        async def main():
+            return await asyncio.gather(*(handle(request) for request in requests))
+
+        for request, (seen_request, queries) in zip(requests, asyncio.run(main())):
+            self.assertIs(seen_request, request)
+            self.assertEqual(queries, [request.path])
+
+    def test_state_follows_sync_to_async(self):
+        request = RequestMinFactory.build()
+
+        async def main():
+            DataCollector().configure(request, should_profile=False)
+            await sync_to_async(DataCollector().register_query)(collected_query())
+            return DataCollector().queries
+
+        self.assertEqual([query.query for query in asyncio.run(main()).values()], ['SELECT 1'])
+
     def test_configure_exception(self):
         other_profiler = cProfile.Profile()
         other_profiler.enable()
@@ -79,6 +259,30 @@ class TestCollector(TestCase):
             self.assertIsNotNone(collector.local.pythonprofiler)
             collector.stop_python_profiler()
 
+    def test_sampling_profiler(self):
+        request = RequestMinFactory()
+        with patch.object(SilkyConfig(), 'SILKY_PYTHON_PROFILER_MODE', 'sampling', create=True):
+            DataCollector().configure(request)
+        self.assertIsNone(DataCollector().local.pythonprofiler)
+        sampling = DataCollector().local.sampling
+        Sampler().sample()
+        DataCollector().stop_python_profiler()
+        DataCollector().finalise()
+        self.assertGreaterEqual(sampling.num_samples, 1)
+        self.assertIn('test_sampling_profiler (%s:' % __file__, request.collapsed_stacks)
+        self.assertIsNotNone(request.sampling_overhead)
+        self.assertEqual(request.pyprofile, '')
+
+    def test_python_profilers_skip_asynchronous_requests(self):
+        for mode in ('cprofile', 'sampling'):
+            with self.subTest(mode=mode):
+                with patch.object(SilkyConfig(), 'SILKY_PYTHON_PROFILER_MODE', mode, create=True):
+                    DataCollector().configure(RequestMinFactory(), asynchronous=True)
+                self.assertIsNone(DataCollector().local.sampling)
+                self.assertIsNone(DataCollector().local.pythonprofiler)
+                self.assertFalse(Sampler()._samplings)
+                DataCollector().stop_python_profiler()
+
     def test_profile_file_name_with_disabled_extended_file_name(self):
         SilkyConfig().SILKY_PYTHON_PROFILER_EXTENDED_FILE_NAME = False
         request_path = 'normal/uri/'
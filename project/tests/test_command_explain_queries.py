@@ -0,0 +1,24 @@
+from django.core import management
+from django.test import TestCase
+
+from silk import models
+
+from .factories import RequestMinFactory, SQLQueryFactory
+
+
+class TestExplainQueriesCommand(TestCase):
+    def test_slowest_queries_per_view(self):
+        for view_name in ('app:a', 'app:b'):
+            request = RequestMinFactory.create(view_name=view_name)
+            for time_taken in (1, 2, 3):
+                SQLQueryFactory.create(
+                    request=request,
+                    raw_query='SELECT id FROM silk_request WHERE path = %s',
+                    params='["/%s/"]' % time_taken,
+                    using='default',
+                    time_taken=time_taken,
+                )
+        management.call_command("silk_explain_queries", per_view=2)
+        explained = models.SQLQuery.objects.filter(analysis__isnull=False)
+        self.assertEqual(explained.count(), 4)
+        self.assertFalse(explained.filter(time_taken=1).exists())
@@ -1,10 +1,15 @@
+import threading
+from datetime import timedelta
+from unittest.mock import patch
+
 from django.core import management
 from django.test import TestCase
+from django.utils import timezone
 
-from silk import models
+from silk import garbage_collection, models
 from silk.config import SilkyConfig
 
-from .factories import RequestMinFactory
+from .factories import RequestMinFactory, ResponseFactory, SQLQueryFactory
 
 
 class TestViewClearDB(TestCase):
@@ -20,3 +25,104 @@ class TestViewClearDB(TestCase):
             "silk_request_garbage_collect", max_requests=0, verbosity=2
         )
         self.assertEqual(models.Request.objects.count(), 0)
+
+    def test_garbage_collect_by_age(self):
+        SilkyConfig().SILKY_MAX_RECORDED_REQUESTS = 10**4
+        old = RequestMinFactory.create_batch(3, start_time=timezone.now() - timedelta(hours=3))
+        new = RequestMinFactory()
+        for request in old + [new]:
+            ResponseFactory(request=request)
+            query = SQLQueryFactory(request=request)
+            profile = models.Profile.objects.create(request=request)
+            profile.queries.add(query)
+            models.NPlusOneFinding.objects.create(request=request, fingerprint='', query='', num_queries=5)
+        models.RequestRollup.objects.create(
+            bucket=timezone.now(), max_time_taken_request=old[0], max_db_time_request=new,
+        )
+        try:
+            management.call_command("silk_request_garbage_collect", max_age=2, chunk_size=2)
+        finally:
+            SilkyConfig().SILKY_MAX_REQUEST_AGE = None
+        self.assertEqual(list(models.Request.objects.values_list('pk', flat=True)), [str(new.pk)])
+        for model in (models.Response, models.SQLQuery, models.Profile, models.NPlusOneFinding):
+            self.assertEqual(list(model.objects.values_list('request_id', flat=True)), [str(new.pk)])
+        self.assertEqual(models.Profile.queries.through.objects.count(), 1)
+        rollup = models.RequestRollup.objects.get()
+        self.assertIsNone(rollup.max_time_taken_request_id)
+        self.assertEqual(rollup.max_db_time_request_id, str(new.pk))
+
+
+class TestGarbageCollection(TestCase):
+    def setUp(self):
+        SilkyConfig().SILKY_MAX_RECORDED_REQUESTS = 0
+        RequestMinFactory.create_batch(3)
+
+    def test_collect_metrics(self):
+        metrics = garbage_collection.collect()
+        self.assertEqual(metrics['requests'], 3)
+        self.assertEqual(metrics['rows'], 3)
+        self.assertTrue(metrics['complete'])
+        self.assertGreaterEqual(metrics['rows_per_second'], 0)
+        self.assertFalse(models.Lease.objects.exists())
+
+    def test_only_one_process_collects(self):
+        models.Lease.objects.create(
+            name=models.GARBAGE_COLLECT_LEASE, holder='elsewhere', expires=timezone.now() + timedelta(minutes=1),
+        )
+        self.assertIsNone(garbage_collection.collect())
+        self.assertEqual(models.Request.objects.count(), 3)
+
+    def test_expired_lease_is_taken_over(self):
+        models.Lease.objects.create(
+            name=models.GARBAGE_COLLECT_LEASE, holder='elsewhere', expires=timezone.now() - timedelta(minutes=1),
+        )
+        self.assertIsNotNone(garbage_collection.collect())
+        self.assertEqual(models.Request.objects.count(), 0)
+
+    def test_lease_renewed_after_each_chunk(self):
+        acquire = models.Lease.acquire
+        with patch.object(SilkyConfig(), 'SILKY_GARBAGE_COLLECT_CHUNK_SIZE', 1), \
+                patch.object(models.Lease, 'acquire', side_effect=acquire) as renewals:
+            metrics = garbage_collection.collect()
+        self.assertEqual(metrics['requests'], 3)
+        self.assertGreaterEqual(renewals.call_count, 4)
+        self.assertEqual(len({call.args[1] for call in renewals.call_args_list}), 1)
+
+    def test_collection_stops_when_lease_is_lost(self):
+        acquire = models.Lease.acquire
+
+        def take_over_after_first_chunk(name, holder, seconds):
+            if models.Request.objects.count() < 3:
+                models.Lease.objects.filter(name=name).update(holder='elsewhere')
+            return acquire(name, holder, seconds)
+
+        with patch.object(SilkyConfig(), 'SILKY_GARBAGE_COLLECT_CHUNK_SIZE', 1), \
+                patch.object(models.Lease, 'acquire', side_effect=take_over_after_first_chunk):
+            metrics = garbage_collection.collect()
+        self.assertEqual(metrics['requests'], 1)
+        self.assertFalse(metrics['complete'])
+        self.assertEqual(models.Request.objects.count(), 2)
+        self.assertEqual(models.Lease.objects.get().holder, 'elsewhere')
+
+    def test_time_budget(self):
+        metrics = garbage_collection.collect(time_budget=1e-9)
+        self.assertEqual(metrics['requests'], 0)
+        self.assertFalse(metrics['complete'])
+        self.assertTrue(garbage_collection.collect()['complete'])
+
+    def test_run_until_stopped(self):
+        runs = []
+        stop_event = threading.Event()
+
+        def on_collect(metrics):
+            runs.append(metrics)
+            # Lift the time budget for the second run, then stop
+            SilkyConfig().SILKY_GARBAGE_COLLECT_TIME_BUDGET = None
+            if len(runs) == 2:
+                stop_event.set()
+
+        SilkyConfig().SILKY_GARBAGE_COLLECT_TIME_BUDGET = 1e-9
+        # The time limited first run is followed by the next one without waiting for the interval
+        garbage_collection.run(3600, stop_event=stop_event, on_collect=on_collect)
+        self.assertEqual([m['complete'] for m in runs], [False, True])
+        self.assertEqual(models.Request.objects.count(), 0)
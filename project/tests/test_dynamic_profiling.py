@@ -9,7 +9,6 @@ from silk.profiling.dynamic import (
     profile_function_or_method,
 )
 
-from .test_lib.assertion import dict_contains
 from .util import mock_data_collector
 
 
@@ -72,14 +71,11 @@ class TestProfileFunction(TestCase):
             with patch('silk.profiling.profiler.DataCollector', return_value=dc) as mock_DataCollector:
                 MyClass().foo()
                 self.assertEqual(mock_DataCollector.return_value.register_profile.call_count, 1)
-                call_args = mock_DataCollector.return_value.register_profile.call_args[0][0]
-                self.assertTrue(dict_contains({
-                    'func_name': foo.__name__,
-                    'dynamic': True,
-                    'file_path': source_file_name(),
-                    'name': 'test',
-                    'line_num': foo.__code__.co_firstlineno
-                }, call_args))
+                profile = mock_DataCollector.return_value.register_profile.call_args[0][0]
+                self.assertEqual(
+                    (profile.func_name, profile.dynamic, profile.file_path, profile.name, profile.line_num),
+                    (foo.__name__, True, source_file_name(), 'test', foo.__code__.co_firstlineno),
+                )
 
     def test_func_as_str(self):
         name = foo.__name__
@@ -89,11 +85,8 @@ class TestProfileFunction(TestCase):
         with patch('silk.profiling.profiler.DataCollector', return_value=dc) as mock_DataCollector:
             foo()
             self.assertEqual(mock_DataCollector.return_value.register_profile.call_count, 1)
-            call_args = mock_DataCollector.return_value.register_profile.call_args[0][0]
-            self.assertTrue(dict_contains({
-                'func_name': name,
-                'dynamic': True,
-                'file_path': source_file_name(),
-                'name': 'test',
-                'line_num': line_num
-            }, call_args))
+            profile = mock_DataCollector.return_value.register_profile.call_args[0][0]
+            self.assertEqual(
+                (profile.func_name, profile.dynamic, profile.file_path, profile.name, profile.line_num),
+                (name, True, source_file_name(), 'test', line_num),
+            )
@@ -73,6 +73,16 @@ class TestEndPoints(TestCase):
         response = self.client.get(base_url + "?per_page=notanumber")
         self.assertTrue(response.status_code == 200)
 
+    def test_request_sql_load_more(self):
+        request = models.Request.objects.annotate(n=Count('queries')).filter(n__gt=1).first()
+        base_url = silky_reverse('request_sql', kwargs={'request_id': request.pk})
+        response = self.client.get(base_url + "?per_page=1")
+        seen = [q.pk for q in response.context['items']]
+        while response.context['items'].has_next:
+            response = self.client.get(base_url, {'per_page': 1, 'cursor': response.context['items'].next_cursor})
+            seen += [q.pk for q in response.context['items']]
+        self.assertEqual(sorted(seen), sorted(request.queries.values_list('pk', flat=True)))
+
     def test_request_sql_detail(self):
         kwargs = random.choice(
             models.SQLQuery.objects
@@ -180,3 +190,15 @@ class TestEndPoints(TestCase):
     def test_profiling(self):
         response = self.client.get(silky_reverse('profiling'))
         self.assertTrue(response.status_code == 200)
+
+    def test_cprofile_flame_graph(self):
+        request = models.Request.objects.first()
+        request.collapsed_stacks = 'main (app.py:1);view (views.py:10) 3\nmain (app.py:1) 1\n'
+        request.sampling_overhead = 0.5
+        request.save()
+        response = self.client.get(silky_reverse('cprofile', kwargs={'request_id': request.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'id="flameGraphURL"')
+        response = self.client.get(silky_reverse('request_flamegraph', kwargs={'request_id': request.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['tree']['value'], 4)
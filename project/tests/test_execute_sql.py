@@ -1,13 +1,22 @@
 from unittest.mock import Mock, NonCallableMagicMock, NonCallableMock, patch
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils.encoding import force_str
 
 from silk.collector import DataCollector
-from silk.models import Request, SQLQuery
-from silk.sql import execute_sql
+from silk.config import SilkyConfig
+from silk.models import QueryPlan, Request, SQLQuery
+from silk.sql import (
+    execute_wrapper,
+    explain_query,
+    install_execute_wrapper,
+    silk_own_queries,
+)
+from silk.utils.sql_fingerprint import fingerprint
 
-from .util import delete_all_models
+from .factories import SQLQueryFactory
 
 _simple_mock_query_sql = 'SELECT * FROM table_name WHERE column1 = %s'
 _simple_mock_query_params = ('asdf',)
@@ -15,15 +24,12 @@ _non_unicode_binary_mock_query_params = (b'\x0a\x00\x00\xff',)
 _unicode_binary_mock_query_params = ('🫠'.encode(),)
 
 
-def mock_sql(mock_query_params):
-    mock_sql_query = Mock(spec_set=['_execute_sql', 'query', 'as_sql', 'connection'])
-    mock_sql_query._execute_sql = Mock()
-    mock_sql_query.query = NonCallableMock(spec_set=['model'])
-    mock_sql_query.query.model = Mock()
-    mock_sql_query.as_sql = Mock(return_value=(_simple_mock_query_sql, mock_query_params))
-
-    mock_sql_query.connection = NonCallableMock(
-        spec_set=['cursor', 'features', 'ops'],
+def mock_context(rowcount=-1):
+    """The context execute wrappers are called with, for a mock connection and cursor"""
+    mock_connection = NonCallableMock(
+        spec_set=['alias', 'vendor', 'cursor', 'features', 'ops'],
+        alias='default',
+        vendor='sqlite',
         cursor=Mock(
             spec_set=['__call__'],
             return_value=NonCallableMagicMock(spec_set=['__enter__', '__exit__', 'execute'])
@@ -35,122 +41,283 @@ def mock_sql(mock_query_params):
         ops=NonCallableMock(spec_set=['explain_query_prefix'],
                             explain_query_prefix=Mock(return_value='')),
     )
-
-    return mock_sql_query, mock_query_params
+    return {'connection': mock_connection, 'cursor': NonCallableMock(spec_set=['rowcount'], rowcount=rowcount)}
 
 
 class BaseTestCase(TestCase):
     def tearDown(self):
         DataCollector().stop_python_profiler()
 
-    def call_execute_sql(self, request, mock_query_params):
-        DataCollector().configure(request=request)
-        delete_all_models(SQLQuery)
-        self.query_string = _simple_mock_query_sql
-        self.mock_sql, self.query_params = mock_sql(mock_query_params)
-        self.kwargs = {
-            'one': 1,
-            'two': 2
-        }
-        self.args = [1, 2]
-        execute_sql(self.mock_sql, *self.args, **self.kwargs)
+    def call_execute_wrapper(self, sql=_simple_mock_query_sql, params=_simple_mock_query_params, many=False,
+                             context=None):
+        self.execute = Mock(return_value='result')
+        self.context = context or mock_context()
+        self.result = execute_wrapper(self.execute, sql, params, many, self.context)
+        return self.context
+
+    def _query(self):
+        try:
+            return list(DataCollector().queries.values())[0]
+        except IndexError:
+            self.fail('No queries created')
 
 
 class TestCallNoRequest(BaseTestCase):
     def setUp(self):
         super().setUp()
-        self.call_execute_sql(None, _simple_mock_query_params)
+        DataCollector().configure(request=None)
+        self.call_execute_wrapper()
 
     def test_called(self):
-        self.mock_sql._execute_sql.assert_called_once_with(*self.args, **self.kwargs)
+        self.execute.assert_called_once_with(_simple_mock_query_sql, _simple_mock_query_params, False, self.context)
+        self.assertEqual(self.result, 'result')
 
     def test_count(self):
         self.assertEqual(0, len(DataCollector().queries))
 
 
 class TestCallRequest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        DataCollector().configure(request=Request())
+
     def test_query_simple(self):
-        self.call_execute_sql(Request(), _simple_mock_query_params)
-        self.mock_sql._execute_sql.assert_called_once_with(*self.args, **self.kwargs)
+        self.call_execute_wrapper()
+        self.execute.assert_called_once_with(_simple_mock_query_sql, _simple_mock_query_params, False, self.context)
         self.assertEqual(1, len(DataCollector().queries))
-        query = list(DataCollector().queries.values())[0]
-        expected = self.query_string % tuple(force_str(param) for param in self.query_params)
-        self.assertEqual(query['query'], expected)
+        expected = _simple_mock_query_sql % tuple(force_str(param) for param in _simple_mock_query_params)
+        self.assertEqual(self._query().query, expected)
 
     def test_query_unicode(self):
-        self.call_execute_sql(Request(), _unicode_binary_mock_query_params)
-        self.mock_sql._execute_sql.assert_called_once_with(*self.args, **self.kwargs)
+        self.call_execute_wrapper(params=_unicode_binary_mock_query_params)
         self.assertEqual(1, len(DataCollector().queries))
-        query = list(DataCollector().queries.values())[0]
-        expected = self.query_string % tuple(force_str(param) for param in self.query_params)
-        self.assertEqual(query['query'], expected)
+        expected = _simple_mock_query_sql % tuple(force_str(param) for param in _unicode_binary_mock_query_params)
+        self.assertEqual(self._query().query, expected)
 
     def test_query_non_unicode(self):
-        self.call_execute_sql(Request(), _non_unicode_binary_mock_query_params)
-        self.mock_sql._execute_sql.assert_called_once_with(*self.args, **self.kwargs)
+        self.call_execute_wrapper(params=_non_unicode_binary_mock_query_params)
+        self.execute.assert_called_once()
+        self.assertEqual(0, len(DataCollector().queries))
+
+    def test_query_without_params(self):
+        self.call_execute_wrapper(sql="SELECT '100%'", params=None)
+        self.assertEqual(self._query().query, "SELECT '100%'")
+
+    def test_query_named_params(self):
+        self.call_execute_wrapper(sql='SELECT %(value)s', params={'value': 1})
+        self.assertEqual(self._query().query, 'SELECT 1')
+
+    def test_max_query_length(self):
+        with patch.object(SilkyConfig(), 'SILKY_MAX_QUERY_LENGTH', 10, create=True):
+            self.call_execute_wrapper()
+        self.assertEqual(self._query().query, 'SELECT * F...')
+
+    def test_rowcount(self):
+        self.call_execute_wrapper(sql='UPDATE table_name SET column1 = %s', context=mock_context(rowcount=3))
+        self.assertEqual(self._query().rowcount, 3)
+
+    def test_unknown_rowcount(self):
+        self.call_execute_wrapper()
+        self.assertIsNone(self._query().rowcount)
+
+    def test_executemany(self):
+        params = (row for row in [('a',), ('b',), ('c',)])
+        self.call_execute_wrapper(sql='INSERT INTO table_name VALUES (%s)', params=params, many=True)
+        query = self._query()
+        self.assertEqual(query.batch_size, 3)
+        self.assertEqual(query.query, 'INSERT INTO table_name VALUES (a)')
+        self.assertIsNone(query.analysis)
+        # the parameters are still passed on after being counted
+        self.assertEqual(self.execute.call_args[0][1], [('a',), ('b',), ('c',)])
+
+    def test_failed_query_is_recorded(self):
+        execute = Mock(side_effect=ValueError)
+        context = mock_context()
+        with self.assertRaises(ValueError):
+            execute_wrapper(execute, _simple_mock_query_sql, _simple_mock_query_params, False, context)
+        self.assertIsNotNone(self._query().end_ns)
+        self.assertFalse(context['connection'].cursor.called)
+
+    def test_ignored_queries(self):
+        with patch.object(SilkyConfig(), 'SILKY_IGNORE_QUERIES', ['table_name'], create=True):
+            self.call_execute_wrapper()
+        self.execute.assert_called_once()
         self.assertEqual(0, len(DataCollector().queries))
 
 
 class TestCallSilky(BaseTestCase):
     def test_no_effect(self):
-        DataCollector().configure()
-        sql, _ = mock_sql(_simple_mock_query_params)
-        sql.query.model = NonCallableMagicMock(spec_set=['__module__'])
-        sql.query.model.__module__ = 'silk.models'
-        # No SQLQuery models should be created for silk requests for obvious reasons
-        with patch('silk.sql.DataCollector', return_value=Mock()) as mock_DataCollector:
-            execute_sql(sql)
-            self.assertFalse(mock_DataCollector().register_query.call_count)
+        DataCollector().configure(request=Request())
+        # No SQLQuery models should be created for silk's own queries for obvious reasons
+        with silk_own_queries():
+            self.call_execute_wrapper()
+        self.execute.assert_called_once()
+        self.assertFalse(DataCollector().queries)
+
+    def test_meta(self):
+        DataCollector().configure(request=Request())
+        with patch.object(SilkyConfig(), 'SILKY_META', True, create=True), silk_own_queries():
+            self.call_execute_wrapper()
+        self.assertEqual(len(DataCollector().silk_queries), 1)
 
 
 class TestCollectorInteraction(BaseTestCase):
-    def _query(self):
-        try:
-            query = list(DataCollector().queries.values())[0]
-        except IndexError:
-            self.fail('No queries created')
-        return query
+    def setUp(self):
+        super().setUp()
+        DataCollector().configure(request=Request.objects.create(path='/path/to/somewhere'))
 
     def test_request(self):
-        DataCollector().configure(request=Request.objects.create(path='/path/to/somewhere'))
-        sql, _ = mock_sql(_simple_mock_query_params)
-        execute_sql(sql)
-        query = self._query()
-        self.assertEqual(query['request'], DataCollector().request)
+        self.call_execute_wrapper()
+        self.assertEqual(self._query().request, DataCollector().request)
 
     def test_registration(self):
-        DataCollector().configure(request=Request.objects.create(path='/path/to/somewhere'))
-        sql, _ = mock_sql(_simple_mock_query_params)
-        execute_sql(sql)
-        query = self._query()
-        self.assertIn(query, DataCollector().queries.values())
+        self.call_execute_wrapper()
+        self.assertIn(self._query(), DataCollector().queries.values())
+
+    def test_alias(self):
+        self.call_execute_wrapper()
+        self.assertEqual(self._query().using, 'default')
+
+    def test_vendor(self):
+        self.call_execute_wrapper()
+        self.assertEqual(self._query().vendor, 'sqlite')
 
     def test_explain_simple(self):
-        DataCollector().configure(request=Request.objects.create(path='/path/to/somewhere'))
-        sql, params = mock_sql(_simple_mock_query_params)
+        context = mock_context()
         prefix = "EXPLAIN"
-        mock_cursor = sql.connection.cursor.return_value.__enter__.return_value
-        sql.connection.ops.explain_query_prefix.return_value = prefix
-        execute_sql(sql)
-        self.assertNotIn(prefix, params)
-        mock_cursor.execute.assert_called_once_with(f"{prefix} {_simple_mock_query_sql}", params)
+        mock_cursor = context['connection'].cursor.return_value.__enter__.return_value
+        context['connection'].ops.explain_query_prefix.return_value = prefix
+        self.call_execute_wrapper(context=context)
+        mock_cursor.execute.assert_called_once_with(f"{prefix} {_simple_mock_query_sql}", _simple_mock_query_params)
 
     def test_explain_unicode(self):
-        DataCollector().configure(request=Request.objects.create(path='/path/to/somewhere'))
-        sql, params = mock_sql(_unicode_binary_mock_query_params)
+        context = mock_context()
         prefix = "EXPLAIN"
-        mock_cursor = sql.connection.cursor.return_value.__enter__.return_value
-        sql.connection.ops.explain_query_prefix.return_value = prefix
-        execute_sql(sql)
-        self.assertNotIn(prefix, params)
-        mock_cursor.execute.assert_called_once_with(f"{prefix} {_simple_mock_query_sql}", params)
+        mock_cursor = context['connection'].cursor.return_value.__enter__.return_value
+        context['connection'].ops.explain_query_prefix.return_value = prefix
+        self.call_execute_wrapper(params=_unicode_binary_mock_query_params, context=context)
+        mock_cursor.execute.assert_called_once_with(
+            f"{prefix} {_simple_mock_query_sql}", _unicode_binary_mock_query_params
+        )
 
     def test_explain_non_unicode(self):
-        DataCollector().configure(request=Request.objects.create(path='/path/to/somewhere'))
-        sql, params = mock_sql(_non_unicode_binary_mock_query_params)
-        prefix = "EXPLAIN"
-        mock_cursor = sql.connection.cursor.return_value.__enter__.return_value
-        sql.connection.ops.explain_query_prefix.return_value = prefix
-        execute_sql(sql)
-        self.assertNotIn(prefix, params)
+        context = mock_context()
+        mock_cursor = context['connection'].cursor.return_value.__enter__.return_value
+        self.call_execute_wrapper(params=_non_unicode_binary_mock_query_params, context=context)
         self.assertFalse(mock_cursor.execute.called)
+
+    def test_statements_that_cannot_be_explained(self):
+        context = mock_context()
+        self.call_execute_wrapper(sql='SAVEPOINT "s1"', params=None, context=context)
+        self.assertFalse(context['connection'].cursor.called)
+        self.assertIsNone(self._query().analysis)
+
+    def test_writes_not_explained(self):
+        for sql in ('INSERT INTO table_name VALUES (%s)', 'UPDATE table_name SET column1 = %s'):
+            context = mock_context()
+            self.call_execute_wrapper(sql=sql, context=context)
+            self.assertFalse(context['connection'].cursor.called)
+        self.assertTrue(all(query.analysis is None for query in DataCollector().queries.values()))
+
+    def test_fingerprint(self):
+        self.call_execute_wrapper()
+        self.assertEqual(self._query().fingerprint, fingerprint(_simple_mock_query_sql))
+
+    def test_traceback_captured(self):
+        self.call_execute_wrapper()
+        filename, _, name = self._query().traceback[0]
+        self.assertEqual(filename, __file__)
+        self.assertEqual(name, 'call_execute_wrapper')
+
+    def test_traceback_interned(self):
+        for _ in range(2):
+            self.call_execute_wrapper()
+        first, second = [query.traceback for query in DataCollector().queries.values()]
+        self.assertIs(first, second)
+
+    def test_traceback_max_depth(self):
+        with patch.object(SilkyConfig(), 'SILKY_TRACEBACK_MAX_DEPTH', 2, create=True):
+            self.call_execute_wrapper()
+        self.assertEqual(len(self._query().traceback), 2)
+
+
+class TestInstalledWrapper(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        install_execute_wrapper(connection)
+        DataCollector().configure(request=Request.objects.create(path='/path/to/somewhere'))
+
+    def test_installed_once(self):
+        install_execute_wrapper(connection)
+        self.assertEqual(connection.execute_wrappers.count(execute_wrapper), 1)
+
+    def test_raw_cursor(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT %s', [1])
+        self.assertEqual([query.query for query in DataCollector().queries.values()], ['SELECT 1'])
+
+    def test_orm_and_raw_queryset(self):
+        list(Request.objects.filter(path='/a/'))
+        list(Request.objects.raw('SELECT id FROM silk_request'))
+        Request.objects.filter(path='/path/to/somewhere').update(method='PUT')
+        queries = list(DataCollector().queries.values())
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(queries[-1].rowcount, 1)
+
+    def test_each_statement_once(self):
+        with CaptureQueriesContext(connection) as ctx:
+            Request.objects.bulk_create([Request(path='/%d/' % n) for n in range(3)])
+        # everything but the EXPLAIN silk runs itself
+        statements = [q for q in ctx.captured_queries if not q['sql'].startswith('EXPLAIN')]
+        self.assertEqual(len(DataCollector().queries), len(statements))
+
+
+class TestDeferredExplain(BaseTestCase):
+    def setUp(self):
+        SilkyConfig().SILKY_DEFERRED_EXPLAIN = True
+        DataCollector().configure(request=Request.objects.create(path='/path/to/somewhere'))
+
+    def tearDown(self):
+        super().tearDown()
+        SilkyConfig().SILKY_DEFERRED_EXPLAIN = False
+
+    def test_explain_not_run(self):
+        context = self.call_execute_wrapper()
+        query = self._query()
+        self.assertFalse(context['connection'].cursor.called)
+        self.assertIsNone(query.analysis)
+        self.assertEqual(query.raw_query, _simple_mock_query_sql)
+        self.assertEqual(query.params, '["asdf"]')
+        self.assertEqual(query.using, 'default')
+
+    def test_only_select_kept(self):
+        self.call_execute_wrapper(sql='DELETE FROM table_name WHERE column1 = %s')
+        self.assertFalse(self._query().raw_query)
+
+
+class TestExplainQuery(TestCase):
+    def _query(self, param):
+        return SQLQueryFactory.create(
+            raw_query='SELECT id FROM silk_request WHERE path = %s',
+            params='["%s"]' % param,
+            using='default',
+        )
+
+    def test_plan_stored(self):
+        query = self._query('/a/')
+        plan = explain_query(query)
+        self.assertTrue(plan)
+        self.assertEqual(SQLQuery.objects.get(pk=query.pk).analysis, plan)
+
+    def test_plan_cached_by_fingerprint(self):
+        plan = explain_query(self._query('/a/'))
+        query = self._query('/b/')
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(explain_query(query), plan)
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('EXPLAIN')])
+        self.assertEqual(QueryPlan.objects.count(), 1)
+
+    def test_not_deferred(self):
+        query = SQLQueryFactory.create(analysis='plan')
+        self.assertEqual(explain_query(query), 'plan')
+        self.assertIsNone(explain_query(SQLQueryFactory.create()))
@@ -11,10 +11,12 @@ from silk import models
 from silk.request_filters import (
     AfterDateFilter,
     BeforeDateFilter,
+    DatabaseAliasFilter,
     FiltersManager,
     FunctionNameFilter,
     MethodFilter,
     NameFilter,
+    NPlusOneFilter,
     NumQueriesFilter,
     OverallTimeFilter,
     PathFilter,
@@ -137,6 +139,22 @@ class TestRequestFilters(TestCase):
             filtered = query_set.filter(method_filter)
             self.assertEqual(len(list(expected)), filtered.count())
 
+    def test_n_plus_one_filter(self):
+        flagged = mock_suite.mock_request()
+        flagged.num_n_plus_one = 2
+        flagged.save()
+        mock_suite.mock_request()
+        filtered = models.Request.objects.filter(NPlusOneFilter('on'))
+        self.assertEqual(list(filtered.values_list('pk', flat=True)), [str(flagged.pk)])
+
+    def test_database_alias_filter(self):
+        replica = mock_suite.mock_request()
+        replica.queries_by_alias = {'replica': {'vendor': 'sqlite', 'num_queries': 1, 'time': 1.0}}
+        replica.save()
+        mock_suite.mock_request()
+        filtered = models.Request.objects.filter(DatabaseAliasFilter('replica'))
+        self.assertEqual(list(filtered.values_list('pk', flat=True)), [str(replica.pk)])
+
 
 class TestRequestAfterDateFilter(TestCase):
     def assertFilter(self, dt, f):
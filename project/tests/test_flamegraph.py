@@ -0,0 +1,159 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from silk.collector import DataCollector
+from silk.config import SilkyConfig
+from silk.middleware import silky_reverse
+from silk.models import Request
+from silk.utils.data_deletion import delete_requests
+from silk.utils.flamegraph import (
+    diff_flame_tree,
+    flame_tree,
+    parse_collapsed,
+    stats_flame_tree,
+)
+from silk.utils.profile_cache import (
+    _request_generation_key,
+    get_or_compute,
+    invalidate,
+    invalidate_all,
+)
+
+from .factories import RequestMinFactory
+
+A = ('app.py', 1, 'a')
+B = ('app.py', 5, 'b')
+C = ('app.py', 9, 'c')
+
+
+class TestFlameGraph(TestCase):
+    def test_parse_collapsed(self):
+        self.assertEqual(
+            list(parse_collapsed('a (x.py:1);b (x.py:5) 3\n\nbroken\n')),
+            [(['a (x.py:1)', 'b (x.py:5)'], 3)],
+        )
+
+    def test_flame_tree(self):
+        tree = flame_tree('a;c 2\na;b 3\nd 1\n')
+        self.assertEqual(tree, {'name': 'all', 'value': 6, 'unit': 'samples', 'children': [
+            {'name': 'a', 'value': 5, 'children': [
+                {'name': 'b', 'value': 3, 'children': []},
+                {'name': 'c', 'value': 2, 'children': []},
+            ]},
+            {'name': 'd', 'value': 1, 'children': []},
+        ]})
+
+    def test_stats_flame_tree(self):
+        # a calls b directly and through c, which it also calls
+        stats = {
+            A: (1, 1, 0.001, 0.010, {}),
+            B: (2, 2, 0.004, 0.004, {A: (1, 1, 0.002, 0.002), C: (1, 1, 0.002, 0.002)}),
+            C: (1, 1, 0.003, 0.005, {A: (1, 1, 0.003, 0.005)}),
+        }
+        self.assertEqual(stats_flame_tree(stats), {'name': 'all', 'value': 10.0, 'unit': 'ms', 'children': [
+            {'name': 'a (app.py:1)', 'value': 10.0, 'children': [
+                {'name': 'b (app.py:5)', 'value': 2.0, 'children': []},
+                {'name': 'c (app.py:9)', 'value': 5.0, 'children': [
+                    {'name': 'b (app.py:5)', 'value': 2.0, 'children': []},
+                ]},
+            ]},
+        ]})
+
+    def test_stats_flame_tree_roots_and_recursion(self):
+        # a and b were called by frames running before the profiler was enabled, b recursively
+        stats = {
+            A: (1, 1, 0.002, 0.002, {}),
+            B: (1, 3, 0.006, 0.006, {B: (2, 2, 0.004, 0.004)}),
+            ('~', 0, '<built-in method len>'): (1, 1, 0.00000001, 0.00000001, {}),
+        }
+        tree = stats_flame_tree(stats)
+        self.assertEqual(tree['value'], 8.0)
+        self.assertEqual(
+            [(child['name'], child['value'], child['children']) for child in tree['children']],
+            [('a (app.py:1)', 2.0, []), ('b (app.py:5)', 6.0, [])],
+        )
+
+    def test_diff_flame_tree(self):
+        tree = diff_flame_tree(flame_tree('a;b 3\na 1\n'), flame_tree('a;b 1\na;c 1\n'))
+        self.assertEqual(tree['delta'], 0)
+        a = tree['children'][0]
+        self.assertEqual(a['delta'], 0)
+        self.assertEqual(a['children'][0]['delta'], 0.25)
+
+
+class TestFlameGraphView(TestCase):
+    def setUp(self):
+        cache.clear()
+        SilkyConfig().SILKY_AUTHORISATION = False
+        SilkyConfig().SILKY_AUTHENTICATION = False
+
+    def _get(self, request, **params):
+        return self.client.get(silky_reverse('request_flamegraph', kwargs={'request_id': request.pk}), params)
+
+    def test_binary_profile(self):
+        request = RequestMinFactory()
+        DataCollector().configure(request)
+        DataCollector().finalise()
+        request.save()
+        response = self._get(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['tree']['unit'], 'ms')
+
+    def test_cached_per_request(self):
+        request = RequestMinFactory(collapsed_stacks='a;b 2\n')
+        with patch('silk.views.flamegraph.flame_tree', wraps=flame_tree) as build:
+            for _ in range(2):
+                self.assertEqual(self._get(request).json()['tree']['value'], 2)
+        self.assertEqual(build.call_count, 1)
+
+    def test_cache_disabled(self):
+        request = RequestMinFactory(collapsed_stacks='a;b 2\n')
+        with patch.object(SilkyConfig(), 'SILKY_PROFILE_CACHE', None, create=True):
+            with patch('silk.views.flamegraph.flame_tree', wraps=flame_tree) as build:
+                for _ in range(2):
+                    self._get(request)
+        self.assertEqual(build.call_count, 2)
+
+    def test_compare(self):
+        request = RequestMinFactory(collapsed_stacks='a;b 3\na 1\n')
+        other = RequestMinFactory(collapsed_stacks='a;b 1\na 1\n')
+        tree = self._get(request, compare=other.pk).json()['tree']
+        self.assertEqual(tree['children'][0]['children'][0]['delta'], 0.25)
+
+    def test_no_profile(self):
+        self.assertEqual(self._get(RequestMinFactory()).status_code, 404)
+
+    def test_invalidated_when_request_deleted(self):
+        request = RequestMinFactory(collapsed_stacks='a;b 2\n')
+        self._get(request)
+        self.assertTrue(cache.get(_request_generation_key(request.pk)))
+        delete_requests(Request.objects.filter(pk=request.pk))
+        self.assertIsNone(cache.get(_request_generation_key(request.pk)))
+        self.assertEqual(self._get(request).status_code, 404)
+
+
+class TestProfileCache(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidate_all(self):
+        computed = []
+
+        def compute():
+            computed.append(1)
+            return 'dot'
+
+        for _ in range(2):
+            self.assertEqual(get_or_compute(compute, 'dot', 'id', 5), 'dot')
+        invalidate_all()
+        get_or_compute(compute, 'dot', 'id', 5)
+        self.assertEqual(len(computed), 2)
+
+    def test_keyed_by_arguments(self):
+        self.assertEqual(get_or_compute(lambda: 'five', 'dot', 'id', 5), 'five')
+        self.assertEqual(get_or_compute(lambda: 'ten', 'dot', 'id', 10), 'ten')
+        self.assertEqual(get_or_compute(lambda: 'other', 'dot', 'id', 5), 'five')
+        invalidate(['id'])
+        self.assertEqual(get_or_compute(lambda: 'other', 'dot', 'id', 5), 'other')
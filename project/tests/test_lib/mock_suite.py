@@ -8,6 +8,7 @@ from django.core import management
 from django.utils import timezone
 
 from silk import models
+from silk.collector import CollectedQuery
 from silk.models import Profile, SQLQuery
 
 
@@ -77,29 +78,26 @@ class MockSuite:
     def _random_query(self):
         return random.choice(self.sql_queries)
 
-    def mock_sql_queries(self, request=None, profile=None, n=1, as_dict=False):
+    def mock_sql_queries(self, request=None, profile=None, n=1, collected=False):
+        """SQLQuery models, or CollectedQuery records as the collector holds them if collected is set"""
         start_time, end_time = self._random_time()
         queries = []
         for _ in range(0, n):
             tb = ''.join(reversed(traceback.format_stack()))
-            d = {
-                'query': self._random_query(),
-                'start_time': start_time,
-                'end_time': end_time,
-                'request': request,
-                'traceback': tb
-            }
-            if as_dict:
-                queries.append(d)
+            if collected:
+                query = CollectedQuery(self._random_query(), request=request, traceback=tb)
+                query.end_ns = query.start_ns + int((end_time - start_time).total_seconds() * 1e9)
             else:
-                query = SQLQuery.objects.create(**d)
-                queries.append(query)
-        if profile:
-            if as_dict:
-                for q in queries:
-                    profile['queries'].append(q)
-            else:
-                profile.queries.set(queries)
+                query = SQLQuery.objects.create(
+                    query=self._random_query(),
+                    start_time=start_time,
+                    end_time=end_time,
+                    request=request,
+                    traceback=tb,
+                )
+            queries.append(query)
+        if profile and not collected:
+            profile.queries.set(queries)
         return queries
 
     def mock_profile(self, request=None):
@@ -2,12 +2,16 @@ import datetime
 import uuid
 
 from django.core.management import call_command
-from django.test import TestCase, override_settings
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from freezegun import freeze_time
 
 from silk import models
 from silk.config import SilkyConfig
 from silk.storage import ProfilerResultStorage
+from silk.utils.stack import format_stack
 
 from .factories import RequestMinFactory, ResponseFactory, SQLQueryFactory
 
@@ -87,6 +91,16 @@ class RequestTest(TestCase):
 
         self.assertEqual(self.obj.time_spent_on_sql_queries, 0)
 
+    def test_db_time_follows_saved_and_deleted_queries(self):
+
+        query = SQLQueryFactory(request=self.obj, time_taken=3.5)
+        SQLQueryFactory(request=self.obj, time_taken=1.5)
+        query.delete()
+
+        self.obj.refresh_from_db()
+        self.assertEqual(self.obj.time_spent_on_sql_queries, 1.5)
+        self.assertEqual(self.obj.num_sql_queries, 1)
+
     def test_headers_if_has_no_encoded_headers(self):
 
         self.assertIsInstance(self.obj.headers, models.CaseInsensitiveDictionary)
@@ -112,13 +126,13 @@ class RequestTest(TestCase):
         self.obj.encoded_headers = '{"content-type": "some_data"}'
         self.assertEqual(self.obj.content_type, "some_data")
 
-    def test_garbage_collect(self):
+    def test_garbage_collect_skipped_in_transaction(self):
 
-        self.assertTrue(models.Request.objects.filter(id=self.obj.id).exists())
         SilkyConfig().SILKY_MAX_RECORDED_REQUESTS_CHECK_PERCENT = 100
         SilkyConfig().SILKY_MAX_RECORDED_REQUESTS = 0
-        models.Request.garbage_collect()
-        self.assertFalse(models.Request.objects.filter(id=self.obj.id).exists())
+        self.assertIsNone(models.Request.garbage_collect())
+        self.assertTrue(models.Request.objects.filter(id=self.obj.id).exists())
+        self.assertFalse(models.Lease.objects.exists())
 
     def test_probabilistic_garbage_collect(self):
 
@@ -147,6 +161,16 @@ class RequestTest(TestCase):
         models.Request.garbage_collect(force=True)
         self.assertGreater(models.Request.objects.count(), 0)
 
+    def test_lease_held_per_acquisition(self):
+
+        first, second = models.Lease.holder_id(), models.Lease.holder_id()
+        self.assertTrue(models.Lease.acquire('lease', first, 60))
+        self.assertFalse(models.Lease.acquire('lease', second, 60))
+        models.Lease.release('lease', second)
+        self.assertTrue(models.Lease.acquire('lease', first, 60))
+        models.Lease.release('lease', first)
+        self.assertTrue(models.Lease.acquire('lease', second, 60))
+
     def test_save_if_have_no_raw_body(self):
 
         obj = models.Request(path='/some/path/', method='get')
@@ -194,6 +218,29 @@ class RequestTest(TestCase):
         self.assertEqual(obj.prof_file.storage.__class__, ProfilerResultStorage)
 
 
+class RequestGarbageCollectTest(TransactionTestCase):
+
+    def setUp(self):
+
+        self.obj = RequestMinFactory.create()
+        self.max_percent = SilkyConfig().SILKY_MAX_RECORDED_REQUESTS_CHECK_PERCENT
+        self.max_requests = SilkyConfig().SILKY_MAX_RECORDED_REQUESTS
+
+    def tearDown(self):
+
+        SilkyConfig().SILKY_MAX_RECORDED_REQUESTS_CHECK_PERCENT = self.max_percent
+        SilkyConfig().SILKY_MAX_RECORDED_REQUESTS = self.max_requests
+
+    def test_garbage_collect(self):
+
+        self.assertTrue(models.Request.objects.filter(id=self.obj.id).exists())
+        SilkyConfig().SILKY_MAX_RECORDED_REQUESTS_CHECK_PERCENT = 100
+        SilkyConfig().SILKY_MAX_RECORDED_REQUESTS = 0
+        models.Request.garbage_collect()
+        self.assertFalse(models.Request.objects.filter(id=self.obj.id).exists())
+        self.assertFalse(models.Lease.objects.exists())
+
+
 class ResponseTest(TestCase):
 
     def setUp(self):
@@ -254,6 +301,24 @@ class SQLQueryManagerTest(TestCase):
     def if_not_the_objs_kw_arg_passed(self):
         pass
 
+    def test_bulk_create_updates_num_sql_queries_once(self):
+        request = RequestMinFactory.create()
+        objs = [SQLQueryFactory.build(request=request) for _ in range(5)]
+        with CaptureQueriesContext(connection) as ctx:
+            models.SQLQuery.objects.bulk_create(objs)
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(request.num_sql_queries, 5)
+        request.refresh_from_db()
+        self.assertEqual(request.num_sql_queries, 5)
+
+    def test_bulk_create_computes_time_taken(self):
+        start_time = datetime.datetime(2016, 1, 1, 12, 0, 0, tzinfo=datetime.timezone.utc)
+        end_time = datetime.datetime(2016, 1, 1, 12, 0, 5, tzinfo=datetime.timezone.utc)
+        obj = SQLQueryFactory.build(start_time=start_time, end_time=end_time)
+        models.SQLQuery.objects.bulk_create(objs=[obj])
+        self.assertEqual(models.SQLQuery.objects.get().time_taken, 5000.0)
+
 
 class SQLQueryTest(TestCase):
 
@@ -299,6 +364,18 @@ class SQLQueryTest(TestCase):
 
         self.assertEqual(self.obj.traceback_ln_only, output)
 
+    def test_traceback_ln_only_without_source_lines(self):
+
+        self.obj.traceback = format_stack((
+            ('/home/user/some_script.py', 10, 'some_func'),
+            ('/usr/lib/python3/bdb.py', 20, 'trace_dispatch'),
+        ))
+
+        output = ('  File "/home/user/some_script.py", line 10, in some_func\n'
+                  '  File "/usr/lib/python3/bdb.py", line 20, in trace_dispatch')
+
+        self.assertEqual(self.obj.traceback_ln_only, output)
+
     def test_formatted_query_if_no_query(self):
 
         self.obj.query = ""
@@ -473,6 +550,13 @@ class SQLQueryTest(TestCase):
         obj = SQLQueryFactory.create(start_time=self.start_time, end_time=self.end_time)
 
         self.assertEqual(obj.time_taken, 5000.0)
+        self.assertEqual(obj.time_taken_us, 5000000)
+
+    def test_save_prefers_measured_time(self):
+
+        obj = SQLQueryFactory.create(start_time=self.start_time, end_time=self.end_time, time_taken_us=1234)
+
+        self.assertEqual(obj.time_taken, 1.234)
 
     def test_save_if_has_pk_and_request(self):
 
@@ -509,6 +593,74 @@ class SQLQueryTest(TestCase):
 
         self.assertNotIn(self.obj, models.SQLQuery.objects.all())
 
+    def test_num_sql_queries_not_overwritten_by_stale_request(self):
+
+        request = RequestMinFactory.create()
+        stale_request = models.Request.objects.get(pk=request.pk)
+        SQLQueryFactory.create(request=request)
+        SQLQueryFactory.create(request=stale_request)
+        request.refresh_from_db()
+        self.assertEqual(request.num_sql_queries, 2)
+
+
+class TracebackTest(TestCase):
+
+    def test_identical_tracebacks_share_a_row(self):
+
+        request = RequestMinFactory.create()
+        objs = [SQLQueryFactory.build(request=request, traceback='Traceback') for _ in range(3)]
+        models.SQLQuery.objects.bulk_create(objs)
+        SQLQueryFactory.create(traceback='Traceback')
+
+        self.assertEqual(models.Traceback.objects.count(), 1)
+        for query in models.SQLQuery.objects.all():
+            self.assertEqual(query.traceback, 'Traceback')
+
+    def test_empty_traceback(self):
+
+        query = SQLQueryFactory.create(traceback='')
+
+        self.assertIsNone(query.stack)
+        self.assertEqual(query.traceback, '')
+        self.assertFalse(models.Traceback.objects.exists())
+
+    def test_garbage_collect(self):
+
+        kept = SQLQueryFactory.create()
+        models.Traceback.for_text('orphan').save()
+        models.Traceback.objects.update(created=timezone.now() - models.TRACEBACK_GRACE_PERIOD * 2)
+        self.assertEqual(models.Traceback.garbage_collect(), 1)
+
+        self.assertEqual(list(models.Traceback.objects.all()), [kept.stack])
+
+    def test_garbage_collect_keeps_recent_tracebacks(self):
+
+        models.Traceback.for_text('orphan').save()
+        self.assertEqual(models.Traceback.garbage_collect(), 0)
+        self.assertTrue(models.Traceback.objects.exists())
+
+    def test_garbage_collect_keeps_reused_tracebacks(self):
+
+        models.Traceback.for_text('Traceback').save()
+        models.Traceback.objects.update(created=timezone.now() - models.TRACEBACK_GRACE_PERIOD * 2)
+        request = RequestMinFactory.create()
+        models.SQLQuery.objects.bulk_create([SQLQueryFactory.build(request=request, traceback='Traceback')])
+        models.SQLQuery.objects.all().delete()
+        self.assertEqual(models.Traceback.garbage_collect(), 0)
+        self.assertEqual(models.Traceback.objects.count(), 1)
+
+    def test_garbage_collect_in_chunks(self):
+
+        created = timezone.now() - models.TRACEBACK_GRACE_PERIOD * 2
+        models.Traceback.objects.bulk_create(
+            [models.Traceback(hash=str(i), text=str(i), created=created) for i in range(5)]
+        )
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(models.Traceback.garbage_collect(chunk_size=2), 5)
+        deletes = [q for q in captured.captured_queries if q['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 3)
+        self.assertFalse(models.Traceback.objects.exists())
+
 
 class NoPendingMigrationsTest(TestCase):
     """
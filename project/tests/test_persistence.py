@@ -0,0 +1,197 @@
+import cProfile
+from unittest.mock import Mock, NonCallableMock, patch
+
+from django.db import DatabaseError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from silk.collector import CollectedRequest, DataCollector
+from silk.config import SilkyConfig
+from silk.middleware import SilkyMiddleware
+from silk.model_factory import RequestModelFactory
+from silk.models import Request, RequestRollup, Response, SQLQuery
+from silk.persistence import BackgroundWriter, persist
+
+from .factories import RequestMinFactory
+from .util import collected_query
+
+
+def fake_get_response():
+    def fake_response():
+        return 'hello world'
+    return fake_response
+
+
+def _mock_response():
+    response = NonCallableMock()
+    response.headers = {}
+    response.status_code = 200
+    response.get = response.headers.get
+    response.content = ''
+    return response
+
+
+class TestPersist(TestCase):
+    def test_persist_batch(self):
+        records = []
+        for _ in range(2):
+            request = RequestMinFactory()
+            records.append(CollectedRequest(
+                request=request,
+                response=Response(request=request, status_code=200),
+                queries={1: collected_query(milliseconds=2, request=request)},
+            ))
+        persist(records)
+        for record in records:
+            self.assertEqual(SQLQuery.objects.filter(request=record.request).count(), 1)
+            self.assertTrue(Response.objects.filter(request=record.request).exists())
+            self.assertAlmostEqual(Request.objects.get(pk=record.request.pk).db_time, 2)
+
+    def test_queries_by_alias(self):
+        request = RequestMinFactory()
+        queries = {
+            i: collected_query(milliseconds=time_taken, request=request, using=using, vendor='sqlite')
+            for i, (using, time_taken) in enumerate([('default', 2), ('replica', 3), ('replica', 4)])
+        }
+        persist([CollectedRequest(request=request, queries=queries)])
+        by_alias = Request.objects.get(pk=request.pk).queries_by_alias
+        self.assertEqual(by_alias, {
+            'default': {'vendor': 'sqlite', 'num_queries': 1, 'time': 2.0},
+            'replica': {'vendor': 'sqlite', 'num_queries': 2, 'time': 7.0},
+        })
+        self.assertEqual(SQLQuery.objects.filter(request=request, using='replica', vendor='sqlite').count(), 2)
+
+    def test_retry_after_rollback(self):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        profiler.disable()
+        request = RequestMinFactory.build()
+        record = CollectedRequest(request=request, pythonprofiler=profiler)
+        with patch.object(SilkyConfig(), 'SILKY_PYTHON_PROFILER_BINARY', True), \
+                patch('silk.persistence.record_rollups', side_effect=[DatabaseError, None]), \
+                patch.object(Request.prof_file.field.storage, 'open', wraps=Request.prof_file.field.storage.open) as opened:
+            with self.assertRaises(DatabaseError):
+                persist([record])
+            self.assertTrue(request._state.adding)
+            persist([record])
+        self.addCleanup(request.prof_file.delete, save=False)
+        self.assertEqual(opened.call_count, 1)
+        self.assertEqual(Request.objects.get(pk=request.pk).prof_file, request.prof_file)
+
+
+class TestBackgroundWriter(TestCase):
+    def setUp(self):
+        self.queue_size = SilkyConfig().SILKY_ASYNC_PERSISTENCE_QUEUE_SIZE
+        self.full_policy = SilkyConfig().SILKY_ASYNC_PERSISTENCE_FULL_POLICY
+        self.block_timeout = SilkyConfig().SILKY_ASYNC_PERSISTENCE_BLOCK_TIMEOUT
+        BackgroundWriter.instance = None
+
+    def tearDown(self):
+        BackgroundWriter().stop()
+        BackgroundWriter.instance = None
+        SilkyConfig().SILKY_ASYNC_PERSISTENCE_QUEUE_SIZE = self.queue_size
+        SilkyConfig().SILKY_ASYNC_PERSISTENCE_FULL_POLICY = self.full_policy
+        SilkyConfig().SILKY_ASYNC_PERSISTENCE_BLOCK_TIMEOUT = self.block_timeout
+
+    def _record(self):
+        return CollectedRequest(request=RequestMinFactory.build())
+
+    def test_drop_when_full(self):
+        SilkyConfig().SILKY_ASYNC_PERSISTENCE_QUEUE_SIZE = 1
+        SilkyConfig().SILKY_ASYNC_PERSISTENCE_FULL_POLICY = 'drop'
+        with patch.object(BackgroundWriter, 'start'):
+            writer = BackgroundWriter()
+            self.assertTrue(writer.submit(self._record()))
+            self.assertFalse(writer.submit(self._record()))
+        self.assertEqual(writer.stats['enqueued'], 1)
+        self.assertEqual(writer.stats['dropped'], 1)
+
+    def test_block_when_full(self):
+        SilkyConfig().SILKY_ASYNC_PERSISTENCE_QUEUE_SIZE = 1
+        SilkyConfig().SILKY_ASYNC_PERSISTENCE_FULL_POLICY = 'block'
+        SilkyConfig().SILKY_ASYNC_PERSISTENCE_BLOCK_TIMEOUT = 0.01
+        with patch.object(BackgroundWriter, 'start'):
+            writer = BackgroundWriter()
+            writer.submit(self._record())
+            self.assertFalse(writer.submit(self._record()))
+        self.assertEqual(writer.stats['dropped'], 1)
+
+    def test_flush(self):
+        with patch('silk.persistence.persist') as mock_persist:
+            writer = BackgroundWriter()
+            for _ in range(3):
+                writer.submit(self._record())
+            self.assertTrue(writer.flush(timeout=5))
+        persisted = sum(len(call.args[0]) for call in mock_persist.call_args_list)
+        self.assertEqual(persisted, 3)
+        self.assertEqual(writer.stats['written'], 3)
+
+    def test_write_retries_records_individually(self):
+        good, bad = self._record(), self._record()
+
+        def fake_persist(batch):
+            if bad in batch:
+                raise ValueError
+
+        with patch('silk.persistence.persist', side_effect=fake_persist) as mock_persist:
+            writer = BackgroundWriter()
+            writer.write([good, bad])
+        self.assertEqual(mock_persist.call_count, 3)
+        self.assertEqual(writer.stats['written'], 1)
+        self.assertEqual(writer.stats['failed'], 1)
+
+
+class TestAsyncMiddleware(TestCase):
+    def setUp(self):
+        SilkyConfig().SILKY_ASYNC_PERSISTENCE = True
+
+    def tearDown(self):
+        SilkyConfig().SILKY_ASYNC_PERSISTENCE = False
+        DataCollector().clear()
+
+    def test_response_is_submitted(self):
+        request = Mock(silk_is_intercepted=True)
+        silk_request = RequestMinFactory()
+        DataCollector().configure(silk_request, should_profile=False)
+        with patch.object(BackgroundWriter, 'submit') as mock_submit:
+            SilkyMiddleware(fake_get_response).process_response(request, _mock_response())
+        record = mock_submit.call_args.args[0]
+        self.assertEqual(record.request, silk_request)
+        self.assertIsNotNone(record.request.end_time)
+        self.assertEqual(record.response.request_id, silk_request.id)
+        self.assertFalse(Response.objects.filter(request=silk_request).exists())
+        self.assertIsNone(DataCollector().request)
+
+
+class TestDeferredRequestInsert(TestCase):
+    def tearDown(self):
+        DataCollector().clear()
+
+    def test_request_model_not_saved(self):
+        mock_request = Mock()
+        mock_request.headers = {'content-type': 'text/plain'}
+        mock_request.GET = {}
+        mock_request.path = '/path/'
+        mock_request.method = 'get'
+        request_model = RequestModelFactory(mock_request).construct_request_model(commit=False)
+        self.assertTrue(request_model._state.adding)
+        self.assertFalse(Request.objects.exists())
+
+    def test_request_inserted_once(self):
+        silk_request = Request(path='/path/', method='get')
+        DataCollector().configure(silk_request, should_profile=False)
+        DataCollector().register_query(collected_query(request=silk_request))
+        with CaptureQueriesContext(connection) as ctx:
+            SilkyMiddleware(fake_get_response)._process_response(Mock(), _mock_response())
+        request_writes = [
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith(('INSERT', 'UPDATE')) and '"silk_request"' in q['sql'].split('(')[0]
+        ]
+        self.assertEqual(len(request_writes), 1)
+        self.assertTrue(request_writes[0].startswith('INSERT'))
+        saved = Request.objects.get(pk=silk_request.pk)
+        self.assertEqual(saved.num_sql_queries, 1)
+        self.assertIsNotNone(saved.time_taken)
+        self.assertTrue(Response.objects.filter(request=saved).exists())
+        self.assertEqual(SQLQuery.objects.filter(request=saved).count(), 1)
+        self.assertEqual(RequestRollup.objects.get().num_requests, 1)
@@ -3,7 +3,7 @@ import cProfile
 import os
 import tempfile
 from contextlib import contextmanager
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, PropertyMock
 
 # 3rd party
 from django.test import TestCase
@@ -13,6 +13,8 @@ from networkx.drawing.nx_pydot import read_dot
 from silk.views.profile_dot import (
     _create_dot,
     _create_profile,
+    _cutoff,
+    _filename_from_file_field,
     _temp_file_from_file_field,
 )
 
@@ -106,3 +108,32 @@ class ProfileDotViewTestCase(TestCase):
 
         # file should have been removed on exit
         self.assertFalse(os.path.exists(filename))
+
+    def test_filename_from_local_file_field(self):
+        """
+        Verify that files on the local file system are parsed in place rather than copied.
+        """
+        source = MagicMock()
+        source.path = '/profiles/request.prof'
+        with _filename_from_file_field(source) as filename:
+            self.assertEqual(filename, '/profiles/request.prof')
+        source.open.assert_not_called()
+
+    def test_filename_from_pathless_file_field(self):
+        """
+        Verify that files of storages without local paths are copied to a temp file.
+        """
+        stream = self._mock_file(b'dummy data')
+        type(stream).path = PropertyMock(side_effect=NotImplementedError)
+        with _filename_from_file_field(stream) as filename:
+            with open(filename, 'rb') as f:
+                self.assertEqual(f.read(), b'dummy data')
+        self.assertFalse(os.path.exists(filename))
+
+    def test_cutoff(self):
+        """
+        Verify that the cutoff is a whole percentage, so that few graphs are cached per request.
+        """
+        for value, cutoff in (('10', 10), ('2.6', 3), ('-1', 0), ('1e9', 99), ('nan', 5), ('inf', 5), ('', 5), (None, 5)):
+            with self.subTest(value=value):
+                self.assertEqual(_cutoff(value), cutoff)
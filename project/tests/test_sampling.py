@@ -0,0 +1,63 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from django.test import TestCase
+
+from silk.profiling.sampling import Sampler, Sampling, frame_label
+
+
+def _busy(started, done):
+    started.set()
+    while not done.is_set():
+        pass
+
+
+class TestSampler(TestCase):
+    def test_singleton(self):
+        self.assertIs(Sampler(), Sampler())
+
+    def test_samples_registered_thread(self):
+        started, done = threading.Event(), threading.Event()
+        thread = threading.Thread(target=_busy, args=(started, done))
+        thread.start()
+        started.wait()
+        try:
+            sampling = Sampler().start(thread.ident)
+            for _ in range(3):
+                Sampler().sample()
+            Sampler().stop(sampling)
+        finally:
+            done.set()
+            thread.join()
+        self.assertGreaterEqual(sampling.num_samples, 3)
+        self.assertGreater(sampling.overhead, 0)
+        busy = '_busy (%s:%d)' % (__file__, _busy.__code__.co_firstlineno)
+        self.assertTrue(any(busy in stack.split(';') for stack in sampling.stacks))
+
+    def test_stopped_sampling_is_not_sampled(self):
+        sampling = Sampler().start()
+        Sampler().stop(sampling)
+        num_samples = sampling.num_samples
+        Sampler().sample()
+        self.assertEqual(sampling.num_samples, num_samples)
+        self.assertIsNotNone(sampling.end_time)
+
+    def test_background_thread(self):
+        sampling = Sampler().start()
+        deadline = time.monotonic() + 5
+        while not sampling.num_samples and time.monotonic() < deadline:
+            time.sleep(0.01)
+        Sampler().stop(sampling)
+        self.assertTrue(sampling.num_samples)
+        # overhead stays a small fraction of the time spent sampling
+        self.assertLess(sampling.overhead, sampling.duration / 2)
+
+    def test_collapsed(self):
+        sampling = Sampling(threading.get_ident())
+        sampling.stacks.update({'a;b': 2, 'a': 1})
+        self.assertEqual(sampling.collapsed(), 'a 1\na;b 2\n')
+
+    def test_frame_label_is_sanitised(self):
+        code = SimpleNamespace(co_name='f', co_filename='/odd;dir\nname.py', co_firstlineno=3)
+        self.assertEqual(frame_label(code), 'f (/odd,dir name.py:3)')
@@ -1,12 +1,16 @@
+import asyncio
 from unittest.mock import patch
 
-from django.test import TestCase, override_settings
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse, set_script_prefix
 
 from silk.config import SilkyConfig
 from silk.errors import SilkNotConfigured
 from silk.middleware import SilkyMiddleware, _should_intercept
 from silk.models import Request
+from silk.profiling.sampling import Sampler
 
 from .util import mock_data_collector
 
@@ -117,6 +121,50 @@ class TestApplyDynamicMappings(TestCase):
                 SilkyMiddleware(fake_get_response)
 
 
+class TestAsyncMiddleware(TestCase):
+    def test_async_capable(self):
+        async def get_response(request):
+            return HttpResponse('hello world')
+
+        self.assertTrue(SilkyMiddleware.async_capable)
+        self.assertTrue(iscoroutinefunction(SilkyMiddleware(get_response)))
+        self.assertFalse(iscoroutinefunction(SilkyMiddleware(fake_get_response)))
+
+    def test_async_request_is_recorded(self):
+        async def get_response(request):
+            return HttpResponse('hello world')
+
+        middleware = SilkyMiddleware(get_response)
+        response = async_to_sync(middleware)(RequestFactory().get('/async/path/'))
+        self.assertEqual(response.status_code, 200)
+        silk_request = Request.objects.get(path='/async/path/')
+        self.assertEqual(silk_request.response.status_code, 200)
+        self.assertIsNotNone(silk_request.time_taken)
+
+    def test_async_requests_are_not_profiled(self):
+        async def get_response(request):
+            await asyncio.sleep(0.01)
+            return HttpResponse('hello world')
+
+        async def concurrently(middleware, *paths):
+            return await asyncio.gather(*(middleware(RequestFactory().get(path)) for path in paths))
+
+        for mode in ('cprofile', 'sampling'):
+            with self.subTest(mode=mode), patch.object(SilkyConfig(), 'SILKY_PYTHON_PROFILER', True), \
+                    patch.object(SilkyConfig(), 'SILKY_PYTHON_PROFILER_MODE', mode):
+                with self.assertLogs('silk.middleware', 'WARNING'):
+                    middleware = SilkyMiddleware(get_response)
+                with self.assertNoLogs('silk.collector', 'ERROR'):
+                    responses = async_to_sync(concurrently)(middleware, f'/async/{mode}/1/', f'/async/{mode}/2/')
+                self.assertEqual([response.status_code for response in responses], [200, 200])
+                for silk_request in Request.objects.filter(path__startswith=f'/async/{mode}/'):
+                    self.assertEqual(silk_request.pyprofile, '')
+                    self.assertEqual(silk_request.collapsed_stacks, '')
+                    self.assertFalse(silk_request.prof_file)
+                self.assertEqual(Request.objects.filter(path__startswith=f'/async/{mode}/').count(), 2)
+                self.assertFalse(Sampler()._samplings)
+
+
 class TestShouldIntercept(TestCase):
     def test_should_intercept_non_silk_request(self):
         request = Request()
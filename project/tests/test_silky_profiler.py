@@ -1,9 +1,10 @@
+import asyncio
 from time import sleep
 
 from django.test import TestCase
 
 from silk.collector import DataCollector
-from silk.models import Request, _time_taken
+from silk.models import Request
 from silk.profiling.profiler import silk_profile
 
 from .test_lib.mock_suite import MockSuite
@@ -25,14 +26,14 @@ class TestProfilerRequests(TestCase):
 
         func()
         profile = list(DataCollector().profiles.values())[0]
-        self.assertFalse(profile['request'])
+        self.assertFalse(profile.request)
 
     def test_context_manager_request(self):
         DataCollector().configure(Request.objects.create(path='/to/somewhere'))
         with silk_profile(name='test_profile'):
             sleep(0.1)
         profile = list(DataCollector().profiles.values())[0]
-        self.assertEqual(DataCollector().request, profile['request'])
+        self.assertEqual(DataCollector().request, profile.request)
 
     def test_decorator_request(self):
         DataCollector().configure(Request.objects.create(path='/to/somewhere'))
@@ -43,7 +44,34 @@ class TestProfilerRequests(TestCase):
 
         func()
         profile = list(DataCollector().profiles.values())[0]
-        self.assertEqual(DataCollector().request, profile['request'])
+        self.assertEqual(DataCollector().request, profile.request)
+
+
+class TestProfilerAsync(TestCase):
+    def test_decorator_coroutine_function(self):
+        DataCollector().configure(Request(path='/to/somewhere'))
+
+        @silk_profile()
+        async def func():
+            await asyncio.sleep(0.1)
+
+        asyncio.run(func())
+        profile = list(DataCollector().profiles.values())[0]
+        self.assertEqual(profile.func_name, 'func')
+        self.assertGreaterEqual(profile.time_taken, 100)
+
+    def test_async_context_manager(self):
+        DataCollector().configure(Request(path='/to/somewhere'))
+
+        async def func():
+            async with silk_profile(name='test_profile'):
+                await asyncio.sleep(0.1)
+
+        asyncio.run(func())
+        profile = list(DataCollector().profiles.values())[0]
+        self.assertEqual(profile.name, 'test_profile')
+        self.assertEqual(profile.file_path, __file__)
+        self.assertGreaterEqual(profile.time_taken, 100)
 
 
 class TestProfilertContextManager(TestCase):
@@ -60,11 +88,11 @@ class TestProfilertContextManager(TestCase):
 
     def test_name(self):
         profile = list(DataCollector().profiles.values())[0]
-        self.assertEqual(profile['name'], 'test_profile')
+        self.assertEqual(profile.name, 'test_profile')
 
     def test_time_taken(self):
         profile = list(DataCollector().profiles.values())[0]
-        time_taken = _time_taken(start_time=profile['start_time'], end_time=profile['end_time'])
+        time_taken = profile.time_taken
         self.assertGreaterEqual(time_taken, 100)
         self.assertLess(time_taken, 110)
 
@@ -86,11 +114,11 @@ class TestProfilerDecorator(TestCase):
 
     def test_name(self):
         profile = list(DataCollector().profiles.values())[0]
-        self.assertEqual(profile['name'], 'func')
+        self.assertEqual(profile.name, 'func')
 
     def test_time_taken(self):
         profile = list(DataCollector().profiles.values())[0]
-        time_taken = _time_taken(start_time=profile['start_time'], end_time=profile['end_time'])
+        time_taken = profile.time_taken
         self.assertGreaterEqual(time_taken, 100)
         self.assertLess(time_taken, 115)
 
@@ -99,11 +127,11 @@ class TestQueries(TestCase):
     def test_no_queries_before(self):
         DataCollector().configure(Request.objects.create())
         with silk_profile(name='test_no_queries_before_profile'):
-            mock_queries = MockSuite().mock_sql_queries(n=5, as_dict=True)
+            mock_queries = MockSuite().mock_sql_queries(n=5, collected=True)
             DataCollector().register_query(*mock_queries)
         profile = list(DataCollector().profiles.values())[0]
-        self.assertEqual(profile['name'], 'test_no_queries_before_profile')
-        queries = profile['queries']
+        self.assertEqual(profile.name, 'test_no_queries_before_profile')
+        queries = profile.queries
         self.assertEqual(len(queries), 5)
         for query in DataCollector().queries:
             self.assertIn(query, queries)
@@ -111,14 +139,14 @@ class TestQueries(TestCase):
     def test_queries_before(self):
         """test that any queries registered before profiling begins are ignored"""
         DataCollector().configure(Request.objects.create())
-        DataCollector().register_query(*MockSuite().mock_sql_queries(n=2, as_dict=True))
+        DataCollector().register_query(*MockSuite().mock_sql_queries(n=2, collected=True))
         before = [x for x in DataCollector().queries]
         with silk_profile(name='test_no_queries_before_profile'):
-            mock_queries = MockSuite().mock_sql_queries(n=5, as_dict=True)
+            mock_queries = MockSuite().mock_sql_queries(n=5, collected=True)
             DataCollector().register_query(*mock_queries)
         profile = list(DataCollector().profiles.values())[0]
-        self.assertEqual(profile['name'], 'test_no_queries_before_profile')
-        queries = profile['queries']
+        self.assertEqual(profile.name, 'test_no_queries_before_profile')
+        queries = profile.queries
         self.assertEqual(len(queries), 5)
         for query in set(DataCollector().queries).difference(before):
             self.assertIn(query, queries)
@@ -1,10 +1,26 @@
+from unittest.mock import patch
+
+from django.core.files.base import ContentFile
 from django.test import TestCase
 
 from silk import models
 from silk.config import SilkyConfig
 from silk.middleware import silky_reverse
+from silk.utils.data_deletion import ClearJob, delete_model, delete_profile_files
+
+from .factories import RequestMinFactory, SQLQueryFactory
+
+
+class SynchronousThread:
+    def __init__(self, target, args=(), **kwargs):
+        self.target = target
+        self.args = args
+
+    def start(self):
+        self.target(*self.args)
 
-from .factories import RequestMinFactory
+    def is_alive(self):
+        return False
 
 
 class TestViewClearDB(TestCase):
@@ -36,3 +52,50 @@ class TestViewClearDBAndDeleteProfiles(TestCase):
         response = self.client.post(silky_reverse("cleardb"), {"clear_all": "on"})
         self.assertTrue(response.status_code == 200)
         self.assertEqual(models.Request.objects.count(), 0)
+
+
+class TestDataDeletion(TestCase):
+    def test_delete_model_in_chunks(self):
+        request = RequestMinFactory()
+        for _ in range(5):
+            profile = models.Profile.objects.create(request=request)
+            profile.queries.add(SQLQueryFactory(request=request))
+        progress = []
+        delete_model(models.Profile.queries.through, chunk_size=2, progress=lambda *args: progress.append(args))
+        self.assertEqual(progress, [('silk_profile_queries', 2), ('silk_profile_queries', 4), ('silk_profile_queries', 5)])
+        self.assertEqual(delete_model(models.Profile, chunk_size=2), 5)
+        self.assertFalse(models.Profile.objects.exists())
+        self.assertEqual(models.SQLQuery.objects.count(), 5)
+
+    def test_delete_profile_files(self):
+        request = RequestMinFactory()
+        request.prof_file.save('test_delete_profile_files.prof', ContentFile(b'profile'))
+        storage = request.prof_file.storage
+        name = request.prof_file.name
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(delete_profile_files(), 1)
+        self.assertFalse(storage.exists(name))
+
+
+class TestClearDBInBackground(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        SilkyConfig().SILKY_AUTHENTICATION = False
+        SilkyConfig().SILKY_AUTHORISATION = False
+
+    def setUp(self):
+        ClearJob.instance = None
+
+    def tearDown(self):
+        ClearJob.instance = None
+
+    def test_clear_all_in_background(self):
+        RequestMinFactory.create()
+        with patch('silk.utils.data_deletion.threading.Thread', SynchronousThread), \
+                patch('silk.utils.data_deletion.connections.close_all'):
+            response = self.client.post(silky_reverse("cleardb"), {"clear_all": "on", "background": "1"})
+        self.assertTrue(response.json()['started'])
+        self.assertEqual(models.Request.objects.count(), 0)
+        status = self.client.get(silky_reverse("cleardb_status")).json()
+        self.assertEqual(status, {'running': False, 'step': 'silk_request', 'deleted': 1, 'error': None})
@@ -0,0 +1,69 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from silk import models
+from silk.middleware import silky_reverse
+from silk.utils import histogram
+from silk.views.latency import LatencyView
+
+from .factories import RequestMinFactory
+
+
+class TestHistogram(TestCase):
+    def test_relative_accuracy(self):
+        for value in (0.5, 3, 42, 999, 123456):
+            estimate = histogram.bin_value(histogram.bin_for(value))
+            self.assertLessEqual(abs(estimate - value) / value, histogram.RELATIVE_ACCURACY)
+
+    def test_percentiles(self):
+        counts = Counter(histogram.bin_for(value) for value in range(1, 101))
+        p50, p99 = histogram.percentiles(counts.items(), (0.5, 0.99))
+        self.assertAlmostEqual(p50, 50, delta=50 * histogram.RELATIVE_ACCURACY)
+        self.assertAlmostEqual(p99, 99, delta=99 * histogram.RELATIVE_ACCURACY)
+
+    def test_merge(self):
+        first = Counter(histogram.bin_for(value) for value in range(1, 51))
+        second = Counter(histogram.bin_for(value) for value in range(51, 101))
+        merged = Counter(histogram.bin_for(value) for value in range(1, 101))
+        self.assertEqual(first + second, merged)
+
+    def test_empty(self):
+        self.assertEqual(histogram.percentiles([], (0.5,)), [None])
+
+
+class TestLatencyView(TestCase):
+    def _requests(self, view_name, times, minutes_ago=0):
+        start_time = timezone.now() - timedelta(minutes=minutes_ago)
+        requests = [
+            RequestMinFactory.create(
+                view_name=view_name, start_time=start_time, end_time=start_time + timedelta(milliseconds=time_taken),
+            )
+            for time_taken in times
+        ]
+        models.LatencyHistogram.record_requests(requests)
+
+    def test_histograms_merged_per_bin(self):
+        self._requests('a', [10, 10, 10])
+        self.assertEqual(models.LatencyHistogram.objects.get().count, 3)
+        p50, = models.LatencyHistogram.percentiles(models.LatencyHistogram.objects.all(), (0.5,))
+        self.assertAlmostEqual(p50, 10, delta=10 * histogram.RELATIVE_ACCURACY)
+
+    def test_views(self):
+        self._requests('a', range(1, 101))
+        self._requests('b', [500])
+        self._requests('b', [5000], minutes_ago=120)
+        views = LatencyView()._get_views('60')
+        self.assertEqual([view['view_name'] for view in views], ['b', 'a'])
+        self.assertEqual(views[0]['num_requests'], 1)
+        self.assertAlmostEqual(views[1]['p90_time'], 90, delta=90 * histogram.RELATIVE_ACCURACY)
+        self.assertEqual(LatencyView()._get_views('')[0]['num_requests'], 2)
+
+    def test_get(self):
+        self._requests('a', [10])
+        response = self.client.get(silky_reverse('latency'), {'window': 'nonsense'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['window'], LatencyView.default_window)
+        self.assertEqual(len(response.context['views']), 1)
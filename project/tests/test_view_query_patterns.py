@@ -0,0 +1,91 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from silk.middleware import silky_reverse
+from silk.utils.sql_fingerprint import fingerprint, normalize_sql
+from silk.views.query_patterns import QueryPatternsView
+
+from .factories import RequestMinFactory, SQLQueryFactory
+
+
+class TestFingerprint(TestCase):
+    def test_literals_stripped(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE id = 1 AND name = 'it''s'  AND x = %s"),
+            'SELECT * FROM t WHERE id = ? AND name = ? AND x = ?',
+        )
+
+    def test_value_lists_collapsed(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s)'),
+        )
+        self.assertEqual(normalize_sql('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)'), 'INSERT INTO t (a, b) VALUES (...)')
+
+    def test_identifiers_kept(self):
+        self.assertNotEqual(fingerprint('SELECT * FROM t1'), fingerprint('SELECT * FROM t2'))
+
+
+class TestQueryPatternsView(TestCase):
+    def _create_queries(self, query_fingerprint, times, request=None):
+        request = request or RequestMinFactory.create()
+        for time_taken in times:
+            SQLQueryFactory.create(request=request, fingerprint=query_fingerprint, time_taken=time_taken)
+
+    def test_aggregates(self):
+        self._create_queries('a', range(1, 21))
+        self._create_queries('a', [100])
+        self._create_queries('b', [1000])
+        self._create_queries('', [5000])
+        patterns = QueryPatternsView()._get_patterns(show=10, order_by='total_time')
+        self.assertEqual([p['fingerprint'] for p in patterns], ['b', 'a'])
+        pattern = patterns[1]
+        self.assertEqual(pattern['count'], 21)
+        self.assertEqual(pattern['num_requests'], 2)
+        self.assertEqual(pattern['total_time'], 310)
+        self.assertEqual(pattern['p95_time'], 20)
+        self.assertEqual(pattern['example'].fingerprint, 'a')
+
+    def test_queries_do_not_depend_on_rows(self):
+        num_queries = []
+        for num_rows in (1, 10):
+            self._create_queries('a', range(num_rows))
+            with CaptureQueriesContext(connection) as ctx:
+                QueryPatternsView()._get_patterns(show=10, order_by='count')
+            num_queries.append(len(ctx.captured_queries))
+        self.assertEqual(num_queries[0], num_queries[1])
+
+    def test_queries_do_not_depend_on_patterns(self):
+        num_queries = []
+        for query_fingerprints in (['a'], ['b', 'c', 'd', 'e']):
+            for query_fingerprint in query_fingerprints:
+                self._create_queries(query_fingerprint, [1, 2, 3])
+            with CaptureQueriesContext(connection) as ctx:
+                patterns = QueryPatternsView()._get_patterns(show=250, order_by='count')
+            num_queries.append(len(ctx.captured_queries))
+        self.assertEqual(len(patterns), 5)
+        self.assertEqual({p['p95_time'] for p in patterns}, {3})
+        self.assertEqual(num_queries[0], num_queries[1])
+
+    def test_percentile_of_untimed_pattern(self):
+        SQLQueryFactory.create(request=RequestMinFactory.create(), fingerprint='a', time_taken=None)
+        self.assertIsNone(QueryPatternsView()._get_patterns(show=10, order_by='count')[0]['p95_time'])
+
+    def test_get(self):
+        self._create_queries('a', [1, 2])
+        response = self.client.get(silky_reverse('query_patterns'), {'order_by': 'nonsense'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['order_by'], 'total_time')
+        self.assertEqual(len(response.context['patterns']), 1)
+
+    def test_show_limited_to_options(self):
+        response = self.client.get(silky_reverse('query_patterns'), {'show': 100000000})
+        self.assertEqual(response.context['show'], QueryPatternsView.default_show)
+
+    def test_untimed_patterns_last(self):
+        SQLQueryFactory.create(request=RequestMinFactory.create(), fingerprint='untimed', time_taken=None)
+        self._create_queries('timed', [1])
+        for order_by in ('total_time', 'avg_time'):
+            patterns = QueryPatternsView()._get_patterns(show=10, order_by=order_by)
+            self.assertEqual([p['fingerprint'] for p in patterns], ['timed', 'untimed'])
@@ -1,9 +1,10 @@
 import random
 import unittest
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 from django.test import TestCase
 
+from silk.config import SilkyConfig
 from silk.middleware import silky_reverse
 from silk.views.requests import RequestsView
 
@@ -87,6 +88,35 @@ class TestContext(TestCase):
         self.assertQuerySetEqual(context['options_paths'], RequestsView()._get_paths())
         self.assertIn('results', context)
 
+    def test_n_plus_one_filter_and_badge(self):
+        RequestMinFactory(num_n_plus_one=1)
+        RequestMinFactory()
+        response = self.client.post(silky_reverse('requests'), {
+            'filter-nplusone-value': 'on',
+            'filter-nplusone-typ': 'NPlusOneFilter',
+        })
+        self.assertEqual(len(response.context['results']), 1)
+        self.assertContains(response, 'n-plus-one-badge')
+
+    def test_load_more(self):
+        requests = [RequestMinFactory() for _ in range(3)]
+        self.client.get(silky_reverse('requests'), {'show': 5})
+        response = self.client.get(silky_reverse('requests'))
+        self.assertNotContains(response, 'load-more')
+        for _ in range(3):
+            requests.append(RequestMinFactory())
+        response = self.client.get(silky_reverse('requests'))
+        self.assertContains(response, 'class="load-more"')
+        response = self.client.get(silky_reverse('requests'), {'cursor': response.context['results'].next_cursor})
+        self.assertEqual([r.pk for r in response.context['results']], [str(requests[0].pk)])
+        self.assertNotIn('count', response.context)
+
+    def test_estimated_count(self):
+        RequestMinFactory()
+        with patch.object(SilkyConfig(), 'SILKY_ESTIMATED_COUNTS', True):
+            response = self.client.get(silky_reverse('requests'))
+        self.assertEqual(response.context['count'], 1)
+
     def test_view_without_session_and_auth_middlewares(self):
         """
         Filters are not present because there is no `session` to store them.
@@ -156,6 +186,33 @@ class TestGetObjects(TestCase):
         for r in objects:
             self.assertEqual(r.path, request.path)
 
+    def test_keyset_pages(self):
+        seen = []
+        cursor = None
+        while True:
+            page = RequestsView()._get_objects(show=10, cursor=cursor)
+            seen += [r.pk for r in page]
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(len(seen), 50)
+        self.assertEqual(set(seen), {str(r.pk) for r in self.requests})
+
+    def test_keyset_pages_with_ties(self):
+        page = RequestsView()._get_objects(order_by='path', order_dir='ASC', show=7)
+        seen = [r.pk for r in page]
+        while page.has_next:
+            page = RequestsView()._get_objects(order_by='path', order_dir='ASC', show=7, cursor=page.next_cursor)
+            seen += [r.pk for r in page]
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), 50)
+
+    def test_invalid_cursor_shows_first_page(self):
+        first_page = RequestsView()._get_objects(show=10)
+        for cursor in ('not a cursor', RequestsView()._get_objects(order_by='path', show=10).next_cursor):
+            page = RequestsView()._get_objects(show=10, cursor=cursor)
+            self.assertEqual([r.pk for r in page], [r.pk for r in first_page])
+
     @unittest.skip("Flaky")
     def test_time_spent_db_with_path(self):
         request = random.choice(self.requests)
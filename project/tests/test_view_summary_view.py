@@ -1,8 +1,22 @@
+from datetime import timedelta
+from importlib import import_module
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.apps import apps
+from django.conf import settings
+from django.core import management
+from django.db import connection
+from django.db.models import Sum
 from django.test import TestCase
+from django.utils import timezone
 
+from silk import models
 from silk.middleware import silky_reverse
+from silk.request_filters import PathFilter, SecondsFilter
 from silk.views.summary import SummaryView
 
+from .factories import RequestMinFactory
 from .test_lib.assertion import dict_contains
 from .test_lib.mock_suite import MockSuite
 
@@ -14,6 +28,20 @@ class TestSummaryView(TestCase):
         [mock_suite.mock_request() for _ in range(0, 10)]
         print([x.time_taken for x in SummaryView()._longest_query_by_view([])])
 
+    def test_queries_by_alias(self):
+        RequestMinFactory.create(queries_by_alias={
+            'default': {'vendor': 'sqlite', 'num_queries': 1, 'time': 1},
+            'replica': {'vendor': 'sqlite', 'num_queries': 1, 'time': 5},
+        })
+        RequestMinFactory.create(queries_by_alias={'default': {'vendor': 'sqlite', 'num_queries': 1, 'time': 1}})
+        RequestMinFactory.create()
+        with patch.dict(settings.DATABASES, {'replica': {}}), self.assertNumQueries(1):
+            by_alias = SummaryView()._queries_by_alias([])
+        self.assertEqual([(db['using'], db['num_queries']) for db in by_alias], [('replica', 1), ('default', 2)])
+        self.assertAlmostEqual(by_alias[1]['time'], 2)
+        self.assertEqual(by_alias[0]['vendor'], 'sqlite')
+        self.assertEqual(SummaryView()._queries_by_alias([PathFilter('/elsewhere/')]), [])
+
     def test_view_without_session_and_auth_middlewares(self):
         """
         Filters are not present because there is no `session` to store them.
@@ -37,3 +65,86 @@ class TestSummaryView(TestCase):
                     'seconds': {'typ': 'SecondsFilter', 'value': seconds, 'str': f'>{seconds} seconds ago'}
                 }
             }, context))
+
+
+class TestSummaryFromRollups(TestCase):
+    def _request(self, view_name, time_taken, num_queries, db_time, minutes_ago=0, queries_by_alias=None):
+        start_time = timezone.now() - timedelta(minutes=minutes_ago)
+        request = RequestMinFactory.create(
+            view_name=view_name,
+            start_time=start_time,
+            end_time=start_time + timedelta(milliseconds=time_taken),
+            num_sql_queries=num_queries,
+            db_time=db_time,
+            queries_by_alias=queries_by_alias or {},
+        )
+        models.RequestRollup.record_requests([request])
+        return request
+
+    def test_rollups_accumulate(self):
+        fast = self._request('a', 10, 1, 5)
+        slow = self._request('a', 30, 3, 1)
+        rollup = models.RequestRollup.objects.get()
+        self.assertEqual(rollup.num_requests, 2)
+        self.assertAlmostEqual(rollup.time_taken, 40)
+        self.assertEqual(rollup.num_queries, 4)
+        self.assertAlmostEqual(rollup.max_time_taken, 30)
+        self.assertEqual(rollup.max_time_taken_request_id, str(slow.pk))
+        self.assertEqual(rollup.max_num_queries_request_id, str(slow.pk))
+        self.assertEqual(rollup.max_db_time_request_id, str(fast.pk))
+
+    def test_summary(self):
+        slowest_a = self._request('a', 50, 1, 1, minutes_ago=5)
+        self._request('a', 10, 9, 1)
+        most_queries_b = self._request('b', 20, 10, 15)
+        summary = SummaryView()._summary_from_rollups([])
+        self.assertEqual(summary['num_requests'], 3)
+        self.assertAlmostEqual(summary['avg_overall_time'], 80 / 3)
+        self.assertAlmostEqual(summary['avg_num_queries'], 20 / 3)
+        self.assertEqual(
+            [r.pk for r in summary['longest_queries_by_view']], [str(slowest_a.pk), str(most_queries_b.pk)]
+        )
+        self.assertEqual(summary['most_queries'][0].pk, str(most_queries_b.pk))
+        self.assertEqual(summary['most_time_spent_in_db'][0].pk, str(most_queries_b.pk))
+
+    def test_queries_by_alias(self):
+        self._request('a', 10, 2, 2, queries_by_alias={
+            'default': {'vendor': 'sqlite', 'num_queries': 1, 'time': 1},
+            'replica': {'vendor': 'sqlite', 'num_queries': 1, 'time': 1},
+        })
+        self._request('b', 10, 1, 3, queries_by_alias={'replica': {'vendor': 'sqlite', 'num_queries': 1, 'time': 3}})
+        self._request('b', 10, 1, 3, minutes_ago=120, queries_by_alias={'default': {'vendor': 'sqlite', 'num_queries': 1, 'time': 3}})
+        self.assertEqual(models.DatabaseRollup.objects.count(), 3)
+        by_alias = SummaryView()._queries_by_alias_from_rollups(SummaryView._rollup_filters([SecondsFilter(3600)]))
+        self.assertEqual(
+            [(db['using'], db['vendor'], db['num_queries'], db['time']) for db in by_alias],
+            [('replica', 'sqlite', 2, 4), ('default', 'sqlite', 1, 1)],
+        )
+
+    def test_filters(self):
+        self._request('a', 10, 1, 1, minutes_ago=120)
+        self._request('a', 10, 1, 1)
+        rollup_filters = SummaryView._rollup_filters([SecondsFilter(3600)])
+        self.assertEqual(SummaryView()._summary_from_rollups(rollup_filters)['num_requests'], 1)
+        self.assertIsNone(SummaryView._rollup_filters([PathFilter('/path/')]))
+
+    def test_rebuild_command(self):
+        self._request('a', 10, 1, 1)
+        self._request('b', 10, 1, 1, minutes_ago=10)
+        models.RequestRollup.objects.all().delete()
+        management.call_command('silk_rebuild_rollups', batch_size=1)
+        self.assertEqual(models.RequestRollup.objects.count(), 2)
+        self.assertEqual(SummaryView()._summary_from_rollups([])['num_requests'], 2)
+
+    def test_backfill_migration(self):
+        old = self._request('a', 10, 1, 1, minutes_ago=10)
+        models.RequestRollup.objects.all().delete()
+        models.LatencyHistogram.objects.all().delete()
+        self._request('a', 30, 2, 1)
+        migration = import_module('silk.migrations.0027_requestrollup_data')
+        migration.backfill_rollups(apps, SimpleNamespace(connection=connection))
+        rollup = models.RequestRollup.objects.get(bucket=models.RequestRollup.bucket_for(old.start_time))
+        self.assertEqual(rollup.num_requests, 1)
+        self.assertEqual(rollup.max_time_taken_request_id, str(old.pk))
+        self.assertEqual(SummaryView()._summary_from_rollups([])['num_requests'], 2)
+        self.assertEqual(models.LatencyHistogram.objects.aggregate(n=Sum('count'))['n'], 2)
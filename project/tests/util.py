@@ -4,6 +4,7 @@ from unittest.mock import Mock
 from django.core.files import File
 from django.core.files.storage import Storage
 
+from silk.collector import CollectedQuery
 from silk.models import Request
 
 
@@ -17,6 +18,13 @@ def mock_data_collector():
     return mock
 
 
+def collected_query(query='SELECT 1', milliseconds=0, **kwargs):
+    """A finished CollectedQuery that took the given time"""
+    collected = CollectedQuery(query, **kwargs)
+    collected.end_ns = collected.start_ns + int(milliseconds * 1e6)
+    return collected
+
+
 def delete_all_models(model_class):
     """
     A sqlite3-safe deletion function to avoid "django.db.utils.OperationalError: too many SQL variables"
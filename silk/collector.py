@@ -1,24 +1,52 @@
+import contextvars
 import cProfile
+import heapq
 import logging
 import marshal
 import pstats
 import re
+import time
 import unicodedata
+from contextlib import contextmanager
+from datetime import timedelta
 from io import StringIO
-from threading import local
+from types import SimpleNamespace
+
+from django.db import connections, router
+from django.utils import timezone
 
 from silk import models
 from silk.config import SilkyConfig
 from silk.errors import SilkInternalInconsistency, SilkNotConfigured
-from silk.models import _time_taken
+from silk.profiling.sampling import Sampler
 from silk.singleton import Singleton
+from silk.utils.stack import first_app_frame, format_stack
 
 TYP_SILK_QUERIES = 'silk_queries'
 TYP_PROFILES = 'profiles'
 TYP_QUERIES = 'queries'
 
+PROFILER_MODE_CPROFILE = 'cprofile'
+PROFILER_MODE_SAMPLING = 'sampling'
+
 Logger = logging.getLogger('silk.collector')
 
+_own_queries = contextvars.ContextVar('silk_own_queries', default=False)
+
+
+@contextmanager
+def silk_own_queries():
+    """Statements run inside this block are Silk's own and only count towards meta profiling"""
+    token = _own_queries.set(True)
+    try:
+        yield
+    finally:
+        _own_queries.reset(token)
+
+
+def running_own_queries():
+    return _own_queries.get()
+
 
 def raise_middleware_error():
     raise RuntimeError(
@@ -27,6 +55,36 @@ def raise_middleware_error():
         'these methods, Silk will not have the chance to inspect the request/response objects.')
 
 
+class ContextLocal:
+    """
+    Replacement for threading.local that stores attributes per execution
+    context. Concurrent coroutines running on one thread each get their own
+    state, and the state follows a request through sync_to_async and
+    async_to_sync, which copy the context across threads.
+    """
+
+    def __init__(self):
+        object.__setattr__(self, '_state', contextvars.ContextVar('silk_collector_state', default=None))
+
+    def reset(self):
+        """Install fresh state for the current context, shared with any context copied from it afterwards"""
+        state = SimpleNamespace()
+        self._state.set(state)
+        return state
+
+    def __getattr__(self, item):
+        state = self._state.get()
+        if state is None:
+            raise AttributeError(item)
+        return getattr(state, item)
+
+    def __setattr__(self, key, value):
+        state = self._state.get()
+        if state is None:
+            state = self.reset()
+        setattr(state, key, value)
+
+
 class DataCollector(metaclass=Singleton):
     """
     Provides the ability to save all models at the end of the request. We
@@ -36,7 +94,7 @@ class DataCollector(metaclass=Singleton):
 
     def __init__(self):
         super().__init__()
-        self.local = local()
+        self.local = ContextLocal()
         self._configure()
 
     def ensure_middleware_installed(self):
@@ -57,10 +115,17 @@ class DataCollector(metaclass=Singleton):
         self.local.request = value
 
     def _configure(self):
+        self.stop_python_profiler()
+        self.local.reset()
         self.local.objects = {}
         self.local.temp_identifier = 0
-        self.stop_python_profiler()
+        self.local.stacks = {}
+        self.local.clock = WallClock()
+        # heaps of (microseconds taken, identifier) of the kept objects of the types
+        # with a SILKY_MAX_RECORDED_* limit, the quickest first
+        self.local.kept = {}
         self.local.pythonprofiler = None
+        self.local.sampling = None
 
     @property
     def objects(self):
@@ -88,10 +153,19 @@ class DataCollector(metaclass=Singleton):
     def profiles(self):
         return self._get_objects(TYP_PROFILES)
 
-    def configure(self, request=None, should_profile=True):
-        self.request = request
+    def configure(self, request=None, should_profile=True, asynchronous=False):
+        """
+        Start collecting for a request. Both Python profilers work per thread,
+        which under ASGI runs the coroutines of concurrent requests and not
+        necessarily the view, so asynchronous requests are not profiled.
+        """
         self._configure()
-        if should_profile:
+        self.request = request
+        if asynchronous:
+            return
+        if should_profile and SilkyConfig().SILKY_PYTHON_PROFILER_MODE == PROFILER_MODE_SAMPLING:
+            self.local.sampling = Sampler().start()
+        elif should_profile:
             self.local.pythonprofiler = cProfile.Profile()
             try:
                 self.local.pythonprofiler.enable()
@@ -102,8 +176,8 @@ class DataCollector(metaclass=Singleton):
                 self.local.pythonprofiler = None
 
     def clear(self):
-        self.request = None
         self._configure()
+        self.request = None
 
     def _raise_not_configured(self, err):
         raise SilkNotConfigured(err + ' Is the middleware installed correctly?')
@@ -111,102 +185,442 @@ class DataCollector(metaclass=Singleton):
     def register_objects(self, typ, *args):
         self.ensure_middleware_installed()
         for arg in args:
-            ident = self.get_identifier()
-            objects = self.objects
-            if objects is None:
-                # This can happen if the SilkyMiddleware.process_request is not
-                # called for whatever reason. Perhaps if another piece of
-                # middleware is not playing ball.
-                self._raise_not_configured(
-                    'Attempt to register object of type %s without initialisation. '
-                )
-            if typ not in objects:
-                self.objects[typ] = {}
-            self.objects[typ][ident] = arg
+            self._register(typ, arg)
+
+    def _register(self, typ, obj):
+        ident = self.get_identifier()
+        objects = self.objects
+        if objects is None:
+            # This can happen if the SilkyMiddleware.process_request is not
+            # called for whatever reason. Perhaps if another piece of
+            # middleware is not playing ball.
+            self._raise_not_configured(
+                'Attempt to register object of type %s without initialisation. '
+            )
+        if typ not in objects:
+            self.objects[typ] = {}
+        self.objects[typ][ident] = obj
+        return ident
+
+    def register_bounded_objects(self, typ, limit, *args):
+        """
+        Register objects keeping at most `limit` of them, the ones that took
+        the longest. Objects that are left out are only counted on the request.
+        """
+        if limit is None:
+            self.register_objects(typ, *args)
+            return
+        self.ensure_middleware_installed()
+        kept = self.local.kept.setdefault(typ, [])
+        for arg in args:
+            time_taken_us = arg.time_taken_us or 0
+            if len(kept) >= limit:
+                if not kept or time_taken_us <= kept[0][0]:
+                    self._record_dropped(typ, time_taken_us)
+                    continue
+                dropped_time_us, dropped = heapq.heappop(kept)
+                del self.objects[typ][dropped]
+                self._record_dropped(typ, dropped_time_us)
+            heapq.heappush(kept, (time_taken_us, self._register(typ, arg)))
+
+    def _record_dropped(self, typ, time_taken_us):
+        request = self.request
+        if request is None:
+            return
+        if typ == TYP_QUERIES:
+            request.num_dropped_queries += 1
+            request.dropped_queries_time += time_taken_us / 1000
+        elif typ == TYP_PROFILES:
+            request.num_dropped_profiles += 1
+
+    def intern_stack(self, stack):
+        """Share a single copy of identical stacks captured during the request"""
+        stacks = getattr(self.local, 'stacks', None)
+        if stacks is None:
+            return stack
+        return stacks.setdefault(stack, stack)
 
     def register_query(self, *args):
-        self.register_objects(TYP_QUERIES, *args)
+        self.register_bounded_objects(TYP_QUERIES, SilkyConfig().SILKY_MAX_RECORDED_QUERIES, *args)
 
     def register_profile(self, *args):
-        self.register_objects(TYP_PROFILES, *args)
+        self.register_bounded_objects(TYP_PROFILES, SilkyConfig().SILKY_MAX_RECORDED_PROFILES, *args)
 
     def _record_meta_profiling(self):
         if SilkyConfig().SILKY_META:
             num_queries = len(self.silk_queries)
-            query_time = sum(_time_taken(x['start_time'], x['end_time']) for _, x in self.silk_queries.items())
+            query_time = sum(query.time_taken_us or 0 for query in self.silk_queries.values()) / 1000
             self.request.meta_num_queries = num_queries
             self.request.meta_time_spent_queries = query_time
 
+    def finish_request(self):
+        """
+        Set the end time of the current request, timing it with
+        perf_counter_ns() from when the collector was configured for it
+        """
+        end_ns = time.perf_counter_ns()
+        clock = self.local.clock
+        self.request.end_time = clock.at(end_ns)
+        self.request.time_taken_us = (end_ns - clock.ns) // 1000
+
     def stop_python_profiler(self):
         if getattr(self.local, 'pythonprofiler', None):
             self.local.pythonprofiler.disable()
+        if getattr(self.local, 'sampling', None):
+            Sampler().stop(self.local.sampling)
+
+    def snapshot(self, response=None):
+        """
+        Detach everything collected for the current request into a
+        CollectedRequest so that it can be persisted independently of the
+        collector's thread local state, e.g. by the background writer.
+        """
+        return CollectedRequest(
+            request=self.request,
+            response=response,
+            queries=dict(self.queries),
+            profiles=dict(self.profiles),
+            pythonprofiler=getattr(self.local, 'pythonprofiler', None),
+            sampling=getattr(self.local, 'sampling', None),
+            clock=self.local.clock,
+        )
 
     def finalise(self):
-        if getattr(self.local, 'pythonprofiler', None):
-            s = StringIO()
-            ps = pstats.Stats(self.local.pythonprofiler, stream=s).sort_stats('cumulative')
-            ps.print_stats()
-            profile_text = s.getvalue()
-            profile_text = "\n".join(
-                profile_text.split("\n")[0:256])  # don't record too much because it can overflow the field storage size
-            self.request.pyprofile = profile_text
-
-            if SilkyConfig().SILKY_PYTHON_PROFILER_BINARY:
-                proposed_file_name = self._get_proposed_file_name()
-                file_name = self.request.prof_file.storage.get_available_name(proposed_file_name)
-                with self.request.prof_file.storage.open(file_name, 'w+b') as f:
-                    marshal.dump(ps.stats, f)
-                self.request.prof_file = f.name
-
-        sql_queries = []
-        for identifier, query in self.queries.items():
-            query['identifier'] = identifier
-            sql_query = models.SQLQuery(**{k: v for k, v in query.items() if k != 'model'})
-            sql_queries += [sql_query]
-
-        models.SQLQuery.objects.bulk_create(sql_queries)
-        sql_queries = models.SQLQuery.objects.filter(request=self.request)
-        for sql_query in sql_queries.all():
-            query = self.queries.get(sql_query.identifier)
-            if query:
-                query['model'] = sql_query
-
-        for profile in self.profiles.values():
-            profile_query_models = []
-            if TYP_QUERIES in profile:
-                profile_queries = profile[TYP_QUERIES]
-                del profile[TYP_QUERIES]
-                for query_temp_id in profile_queries:
-                    try:
-                        query = self.queries[query_temp_id]
-                        try:
-                            profile_query_models.append(query['model'])
-                        except KeyError:
-                            raise SilkInternalInconsistency(
-                                'Profile references a query dictionary that has not '
-                                'been converted into a Django model. This should '
-                                'never happen, please file a bug report'
-                            )
-                    except KeyError:
-                        raise SilkInternalInconsistency(
-                            'Profile references a query temp_id that does not exist. '
-                            'This should never happen, please file a bug report'
-                        )
-            profile = models.Profile.objects.create(**profile)
-            if profile_query_models:
-                profile.queries.set(profile_query_models)
+        record = self.snapshot()
+        with silk_own_queries():
+            write_python_profile(record)
+            detect_n_plus_one(record)
+            record.request.queries_by_alias = queries_by_alias(record.queries.values())
+            save_queries_and_profiles([record])
         self._record_meta_profiling()
+        return record
 
     def register_silk_query(self, *args):
         self.register_objects(TYP_SILK_QUERIES, *args)
 
-    def _get_proposed_file_name(self) -> str:
-        """Retrieve the profile file name to be proposed to the storage"""
 
-        if SilkyConfig().SILKY_PYTHON_PROFILER_EXTENDED_FILE_NAME:
-            slugified_path = slugify_path(self.request.path)
-            return f"{slugified_path}_{str(self.request.id)}.prof"
-        return f"{str(self.request.id)}.prof"
+class CollectedRequest:
+    """Plain record of the data collected for a single request"""
+
+    __slots__ = ('request', 'response', 'queries', 'profiles', 'pythonprofiler', 'sampling', 'findings', 'clock')
+
+    def __init__(self, request, response=None, queries=None, profiles=None, pythonprofiler=None, sampling=None,
+                 clock=None):
+        self.request = request
+        self.response = response
+        self.queries = queries if queries is not None else {}
+        self.profiles = profiles if profiles is not None else {}
+        self.pythonprofiler = pythonprofiler
+        self.sampling = sampling
+        self.findings = []
+        self.clock = clock or WallClock()
+
+
+class WallClock:
+    """
+    A time.perf_counter_ns() reading paired with the wall-clock time it was
+    taken at. Collected records are timed with perf_counter_ns() and only
+    turned into datetimes when they are saved.
+    """
+
+    __slots__ = ('time', 'ns')
+
+    def __init__(self):
+        self.time = timezone.now()
+        self.ns = time.perf_counter_ns()
+
+    def at(self, ns):
+        return self.time + timedelta(microseconds=(ns - self.ns) // 1000)
+
+
+class CollectedQuery:
+    """A query run during a request, saved as a SQLQuery"""
+
+    __slots__ = (
+        'query', 'request', 'start_ns', 'end_ns', 'traceback', 'using', 'vendor', 'fingerprint',
+        'batch_size', 'rowcount', 'analysis', 'raw_query', 'params', 'model',
+    )
+
+    def __init__(self, query, request=None, traceback='', using='', vendor='', fingerprint='', batch_size=None):
+        self.query = query
+        self.request = request
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = None
+        # a stack captured by silk.utils.stack.capture_stack, or formatted text
+        self.traceback = traceback
+        self.using = using
+        self.vendor = vendor
+        self.fingerprint = fingerprint
+        self.batch_size = batch_size
+        self.rowcount = None
+        self.analysis = None
+        # Parameterized SQL and JSON encoded params, kept for SILKY_DEFERRED_EXPLAIN
+        self.raw_query = ''
+        self.params = ''
+        self.model = None  # the SQLQuery, once saved
+
+    def finish(self):
+        self.end_ns = time.perf_counter_ns()
+
+    @property
+    def time_taken_us(self):
+        """Whole microseconds, None until finished"""
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) // 1000
+
+    @property
+    def time_taken(self):
+        """Milliseconds, None until finished"""
+        if self.end_ns is None:
+            return None
+        return self.time_taken_us / 1000
+
+    def to_model(self, clock, identifier, stack):
+        self.model = models.SQLQuery(
+            query=self.query,
+            request=self.request,
+            start_time=clock.at(self.start_ns),
+            end_time=clock.at(self.end_ns) if self.end_ns is not None else None,
+            time_taken_us=self.time_taken_us,
+            identifier=identifier,
+            stack=stack,
+            using=self.using,
+            vendor=self.vendor,
+            fingerprint=self.fingerprint,
+            batch_size=self.batch_size,
+            rowcount=self.rowcount,
+            analysis=self.analysis,
+            raw_query=self.raw_query,
+            params=self.params,
+        )
+        return self.model
+
+
+class CollectedProfile:
+    """A block of code profiled with silk_profile during a request, saved as a Profile"""
+
+    __slots__ = (
+        'name', 'request', 'file_path', 'line_num', 'func_name', 'dynamic', 'exception_raised',
+        'start_ns', 'end_ns', 'queries',
+    )
+
+    def __init__(self, name, request=None, file_path='', line_num=None, func_name='', dynamic=False):
+        self.name = name
+        self.request = request
+        self.file_path = file_path
+        self.line_num = line_num
+        self.func_name = func_name
+        self.dynamic = dynamic
+        self.exception_raised = False
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = None
+        self.queries = ()  # identifiers of the queries run inside the block
+
+    def finish(self):
+        self.end_ns = time.perf_counter_ns()
+
+    @property
+    def time_taken_us(self):
+        """Whole microseconds, None until finished"""
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) // 1000
+
+    @property
+    def time_taken(self):
+        """Milliseconds, None until finished"""
+        if self.end_ns is None:
+            return None
+        return self.time_taken_us / 1000
+
+    def to_model(self, clock):
+        profile = models.Profile(
+            name=self.name,
+            request=self.request,
+            file_path=self.file_path,
+            line_num=self.line_num,
+            func_name=self.func_name,
+            dynamic=self.dynamic,
+            exception_raised=self.exception_raised,
+            start_time=clock.at(self.start_ns),
+            end_time=clock.at(self.end_ns) if self.end_ns is not None else None,
+            time_taken_us=self.time_taken_us,
+        )
+        profile.compute_time_taken()
+        return profile
+
+
+def detect_n_plus_one(record):
+    """
+    Flag queries of the same shape (fingerprint) that were run from the same
+    line of application code at least SILKY_N_PLUS_ONE_THRESHOLD times, the
+    typical result of accessing a relation inside a loop. The findings are
+    saved along with the queries.
+    """
+    threshold = SilkyConfig().SILKY_N_PLUS_ONE_THRESHOLD
+    if not threshold:
+        return
+    groups = {}
+    for query in record.queries.values():
+        if not query.fingerprint:
+            continue
+        stack = query.traceback
+        frame = first_app_frame(stack) if isinstance(stack, tuple) else None
+        groups.setdefault((query.fingerprint, frame), []).append(query)
+    record.findings = []
+    for (query_fingerprint, frame), queries in groups.items():
+        if len(queries) < threshold:
+            continue
+        file_path, line_num, func_name = frame or ('', None, '')
+        record.findings.append(models.NPlusOneFinding(
+            request=record.request,
+            fingerprint=query_fingerprint,
+            query=queries[0].query,
+            file_path=file_path,
+            line_num=line_num,
+            func_name=func_name,
+            num_queries=len(queries),
+            time_taken=sum(query.time_taken_us or 0 for query in queries) / 1000,
+        ))
+    record.request.num_n_plus_one = len(record.findings)
+
+
+def queries_db_time(queries):
+    """Total time in milliseconds taken by CollectedQuery records, before they are saved"""
+    return sum(query.time_taken_us or 0 for query in queries) / 1000
+
+
+def queries_by_alias(queries):
+    """Number of queries and their time in milliseconds on each database alias, from CollectedQuery records"""
+    by_alias = {}
+    for query in queries:
+        stats = by_alias.setdefault(query.using, {'vendor': query.vendor, 'num_queries': 0, 'time_us': 0})
+        stats['num_queries'] += 1
+        stats['time_us'] += query.time_taken_us or 0
+    for stats in by_alias.values():
+        stats['time'] = stats.pop('time_us') / 1000
+    return by_alias
+
+
+def write_python_profile(record):
+    """
+    Render the python profiler output of a request onto its request model.
+    The profiler is then dropped from the record so that a retried write does
+    not store the binary profile again.
+    """
+    if record.sampling:
+        record.request.collapsed_stacks = record.sampling.collapsed()
+        record.request.sampling_overhead = record.sampling.overhead * 1000
+    if not record.pythonprofiler:
+        return
+    s = StringIO()
+    ps = pstats.Stats(record.pythonprofiler, stream=s).sort_stats('cumulative')
+    record.pythonprofiler = None
+    ps.print_stats()
+    profile_text = s.getvalue()
+    profile_text = "\n".join(
+        profile_text.split("\n")[0:256])  # don't record too much because it can overflow the field storage size
+    record.request.pyprofile = profile_text
+
+    if SilkyConfig().SILKY_PYTHON_PROFILER_BINARY:
+        proposed_file_name = _get_proposed_file_name(record.request)
+        file_name = record.request.prof_file.storage.get_available_name(proposed_file_name)
+        with record.request.prof_file.storage.open(file_name, 'w+b') as f:
+            marshal.dump(ps.stats, f)
+        record.request.prof_file = f.name
+
+
+def save_queries_and_profiles(records, update_num_sql_queries=True):
+    """
+    Insert the queries and profiles of one or more requests. Queries, profiles
+    and the links between them are each inserted with a single statement on
+    backends that return primary keys from bulk inserts.
+    """
+    using = router.db_for_write(models.SQLQuery)
+    can_return_pks = connections[using].features.can_return_rows_from_bulk_insert
+
+    sql_queries = []
+    tracebacks = {}
+    for record in records:
+        for identifier, query in record.queries.items():
+            # Format and hash each distinct stack once, the queries share a
+            # single Traceback row
+            stack = query.traceback
+            if stack not in tracebacks:
+                text = format_stack(stack) if isinstance(stack, tuple) else stack
+                tracebacks[stack] = models.Traceback.for_text(text) if text else None
+            sql_queries.append(query.to_model(record.clock, identifier, tracebacks[stack]))
+    models.SQLQuery.objects.bulk_create(sql_queries, update_num_sql_queries=update_num_sql_queries)
+
+    profiles = []
+    for record in records:
+        for profile in record.profiles.values():
+            profile_query_models = []
+            for query_temp_id in profile.queries:
+                try:
+                    profile_query_models.append(record.queries[query_temp_id].model)
+                except KeyError:
+                    if record.request.num_dropped_queries:
+                        # Left out because of SILKY_MAX_RECORDED_QUERIES
+                        continue
+                    raise SilkInternalInconsistency(
+                        'Profile references a query temp_id that does not exist. '
+                        'This should never happen, please file a bug report'
+                    )
+            profile_model = profile.to_model(record.clock)
+            profile_model.db_time = sum(query.time_taken_us or 0 for query in profile_query_models) / 1000
+            profiles.append((profile_model, profile_query_models))
+
+    if can_return_pks:
+        models.Profile.objects.bulk_create([profile for profile, _ in profiles])
+    else:
+        for profile, _ in profiles:
+            profile.save()
+
+        if any(profile_query_models for _, profile_query_models in profiles):
+            _fetch_query_pks(records)
+
+    through_model = models.Profile.queries.through
+    through_model.objects.bulk_create([
+        through_model(profile_id=profile.pk, sqlquery_id=query.pk)
+        for profile, profile_query_models in profiles
+        for query in profile_query_models
+    ])
+
+    models.NPlusOneFinding.objects.bulk_create([
+        finding for record in records for finding in record.findings
+    ])
+
+
+def record_rollups(records):
+    """Add the requests of saved records to the summary rollups"""
+    models.RequestRollup.record_requests(record.request for record in records)
+
+
+def _fetch_query_pks(records):
+    """Backfill the primary keys of bulk inserted queries on backends that do not return them"""
+    query_models = {
+        (str(record.request.pk), identifier): query.model
+        for record in records
+        for identifier, query in record.queries.items()
+    }
+    values = models.SQLQuery.objects.filter(
+        request__in=[record.request for record in records]
+    ).values_list('request_id', 'identifier', 'pk')
+    for request_id, identifier, pk in values:
+        query_model = query_models.get((request_id, identifier))
+        if query_model is not None:
+            query_model.pk = pk
+
+
+def _get_proposed_file_name(request) -> str:
+    """Retrieve the profile file name to be proposed to the storage"""
+
+    if SilkyConfig().SILKY_PYTHON_PROFILER_EXTENDED_FILE_NAME:
+        slugified_path = slugify_path(request.path)
+        return f"{slugified_path}_{str(request.id)}.prof"
+    return f"{str(request.id)}.prof"
 
 
 def slugify_path(request_path: str) -> str:
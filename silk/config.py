@@ -21,20 +21,43 @@ class SilkyConfig(metaclass=Singleton):
         'SILKY_PERMISSIONS': default_permissions,
         'SILKY_MAX_RECORDED_REQUESTS': 10**4,
         'SILKY_MAX_RECORDED_REQUESTS_CHECK_PERCENT': 10,
+        'SILKY_MAX_REQUEST_AGE': None,
+        'SILKY_GARBAGE_COLLECT_CHUNK_SIZE': 1000,
+        'SILKY_GARBAGE_COLLECT_TIME_BUDGET': None,
+        'SILKY_GARBAGE_COLLECT_LEASE_SECONDS': 300,
         'SILKY_MAX_REQUEST_BODY_SIZE': -1,
         'SILKY_MAX_RESPONSE_BODY_SIZE': -1,
         'SILKY_INTERCEPT_PERCENT': 100,
         'SILKY_INTERCEPT_FUNC': None,
         'SILKY_PYTHON_PROFILER': False,
         'SILKY_PYTHON_PROFILER_FUNC': None,
+        'SILKY_PYTHON_PROFILER_MODE': 'cprofile',
+        'SILKY_SAMPLING_INTERVAL': 0.005,
+        'SILKY_PROFILE_CACHE': 'default',
         'SILKY_STORAGE_CLASS': 'silk.storage.ProfilerResultStorage',
         'SILKY_PYTHON_PROFILER_EXTENDED_FILE_NAME': False,
         'SILKY_MIDDLEWARE_CLASS': 'silk.middleware.SilkyMiddleware',
         'SILKY_JSON_ENSURE_ASCII': True,
         'SILKY_ANALYZE_QUERIES': False,
         'SILKY_EXPLAIN_FLAGS': None,
+        'SILKY_DEFERRED_EXPLAIN': False,
+        'SILKY_N_PLUS_ONE_THRESHOLD': 5,
+        'SILKY_ESTIMATED_COUNTS': False,
         'SILKY_SENSITIVE_KEYS': {'username', 'api', 'token', 'key', 'secret', 'password', 'signature'},
-        'SILKY_DELETE_PROFILES': False
+        'SILKY_DELETE_PROFILES': False,
+        'SILKY_MAX_RECORDED_QUERIES': None,
+        'SILKY_MAX_RECORDED_PROFILES': None,
+        'SILKY_MAX_QUERY_LENGTH': None,
+        'SILKY_TRACEBACK_MAX_DEPTH': None,
+        'SILKY_TRACEBACK_APP_FRAMES_ONLY': False,
+        'SILKY_DEFER_REQUEST_INSERT': False,
+        'SILKY_ASYNC_PERSISTENCE': False,
+        'SILKY_ASYNC_PERSISTENCE_QUEUE_SIZE': 1000,
+        'SILKY_ASYNC_PERSISTENCE_FULL_POLICY': 'drop',
+        'SILKY_ASYNC_PERSISTENCE_BLOCK_TIMEOUT': 0.1,
+        'SILKY_ASYNC_PERSISTENCE_BATCH_SIZE': 100,
+        'SILKY_ASYNC_PERSISTENCE_WORKERS': 1,
+        'SILKY_ASYNC_PERSISTENCE_FLUSH_TIMEOUT': 5,
     }
 
     def _setup(self):
@@ -0,0 +1,51 @@
+import logging
+import threading
+import time
+
+from silk import models
+
+Logger = logging.getLogger('silk.garbage_collection')
+
+
+def collect(time_budget=None):
+    """
+    Run one garbage collection outside of the request/response cycle, e.g.
+    from a periodic task scheduler such as Celery beat. Returns the metrics
+    of the run, or None if another process is collecting.
+    """
+    start = time.monotonic()
+    deleted = models.Request.garbage_collect(force=True, time_budget=time_budget)
+    if deleted is None:
+        Logger.debug('Garbage collection is running elsewhere')
+        return None
+    seconds = time.monotonic() - start
+    metrics = dict(
+        deleted,
+        seconds=seconds,
+        rows_per_second=deleted['rows'] / seconds if seconds else 0.0,
+    )
+    Logger.info(
+        'Garbage collected %(requests)d requests, %(rows)d rows in %(seconds).2fs (%(rows_per_second).0f rows/s)'
+        % metrics
+    )
+    return metrics
+
+
+def run(interval, time_budget=None, stop_event=None, on_collect=None):
+    """
+    Collect every `interval` seconds until stop_event is set. When a
+    collection runs out of its time budget the next one starts straight away.
+    on_collect is called with the metrics of each collection.
+    """
+    if stop_event is None:
+        stop_event = threading.Event()
+    while not stop_event.is_set():
+        try:
+            metrics = collect(time_budget)
+        except Exception:
+            Logger.exception('Garbage collection failed')
+            metrics = None
+        if on_collect is not None:
+            on_collect(metrics)
+        if metrics is None or metrics['complete']:
+            stop_event.wait(interval)
@@ -1,16 +1,18 @@
 from django.core.management.base import BaseCommand
 
-import silk.models
-from silk.utils.data_deletion import delete_model
+from silk.config import SilkyConfig
+from silk.utils.data_deletion import clear_all
 
 
 class Command(BaseCommand):
     help = "Clears silk's log of requests."
 
     def handle(self, *args, **options):
-        # Django takes a long time to traverse foreign key relations,
-        # so delete in the order that makes it easy.
-        delete_model(silk.models.Profile)
-        delete_model(silk.models.SQLQuery)
-        delete_model(silk.models.Response)
-        delete_model(silk.models.Request)
+        progress = self._progress if options["verbosity"] >= 2 else None
+        clear_all(SilkyConfig().SILKY_DELETE_PROFILES, progress=progress)
+
+    def _progress(self, step, deleted):
+        if deleted is None:
+            self.stdout.write(f"Truncated {step}.")
+        else:
+            self.stdout.write(f"Deleted {deleted} from {step}.")
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+import silk.models
+from silk.sql import explain_query
+
+
+class Command(BaseCommand):
+    help = "Explains the slowest queries of each view recorded with SILKY_DEFERRED_EXPLAIN."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-n",
+            "--per-view",
+            default=10,
+            type=int,
+            help="Number of slowest unexplained queries to explain per view.",
+        )
+
+    def handle(self, *args, **options):
+        pending = silk.models.SQLQuery.objects.filter(analysis__isnull=True).exclude(raw_query='')
+        view_names = pending.order_by().values_list('request__view_name', flat=True).distinct()
+        explained = 0
+        for view_name in view_names:
+            queries = pending.filter(request__view_name=view_name).order_by('-time_taken')[:options["per_view"]]
+            for query in queries:
+                if explain_query(query) is not None:
+                    explained += 1
+        if options["verbosity"] >= 2:
+            self.stdout.write(f"Explained {explained} queries.")
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+import silk.models
+from silk.utils.data_deletion import delete_model
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the summary rollups and latency histograms from the recorded requests, e.g. for requests recorded before rollups existed."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-b",
+            "--batch-size",
+            default=1000,
+            type=int,
+            help="Number of requests to read at a time.",
+        )
+
+    def handle(self, *args, **options):
+        delete_model(silk.models.RequestRollup)
+        delete_model(silk.models.LatencyHistogram)
+        delete_model(silk.models.DatabaseRollup)
+        requests = silk.models.Request.objects.filter(end_time__isnull=False).order_by('start_time', 'id')
+        num_requests = 0
+        last = None
+        while True:
+            batch = requests
+            if last is not None:
+                batch = batch.filter(
+                    Q(start_time__gt=last.start_time) | Q(start_time=last.start_time, id__gt=last.id)
+                )
+            batch = list(batch[:options["batch_size"]])
+            if not batch:
+                break
+            silk.models.RequestRollup.record_requests(batch)
+            num_requests += len(batch)
+            last = batch[-1]
+        if options["verbosity"] >= 2:
+            self.stdout.write(f"Rolled up {num_requests} requests.")
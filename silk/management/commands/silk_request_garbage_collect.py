@@ -1,6 +1,11 @@
+import signal
+import threading
+from datetime import timedelta
+
 from django.core.management.base import BaseCommand
 
 import silk.models
+from silk import garbage_collection
 from silk.config import SilkyConfig
 
 
@@ -15,15 +20,77 @@ class Command(BaseCommand):
             type=int,
             help="Maximum number of requests to keep after garbage collection.",
         )
+        parser.add_argument(
+            "-a",
+            "--max-age",
+            default=None,
+            type=float,
+            help="Remove requests older than this many hours, defaults to SILKY_MAX_REQUEST_AGE.",
+        )
+        parser.add_argument(
+            "-c",
+            "--chunk-size",
+            default=SilkyConfig().SILKY_GARBAGE_COLLECT_CHUNK_SIZE,
+            type=int,
+            help="Number of requests to delete per transaction.",
+        )
+        parser.add_argument(
+            "-t",
+            "--time-budget",
+            default=None,
+            type=float,
+            help="Stop deleting after this many seconds, defaults to SILKY_GARBAGE_COLLECT_TIME_BUDGET.",
+        )
+        parser.add_argument(
+            "-d",
+            "--daemon",
+            action="store_true",
+            help="Keep running and collect every --interval seconds.",
+        )
+        parser.add_argument(
+            "-i",
+            "--interval",
+            default=60,
+            type=float,
+            help="Seconds between garbage collections in --daemon mode.",
+        )
 
     def handle(self, *args, **options):
         if "max_requests" in options:
             max_requests = options["max_requests"]
             SilkyConfig().SILKY_MAX_RECORDED_REQUESTS = max_requests
+        if options.get("max_age") is not None:
+            SilkyConfig().SILKY_MAX_REQUEST_AGE = timedelta(hours=options["max_age"])
+        SilkyConfig().SILKY_GARBAGE_COLLECT_CHUNK_SIZE = options["chunk_size"]
         if options["verbosity"] >= 2:
             max_requests = SilkyConfig().SILKY_MAX_RECORDED_REQUESTS
             request_count = silk.models.Request.objects.count()
             self.stdout.write(
                 f"Keeping up to {max_requests} of {request_count} requests."
             )
-        silk.models.Request.garbage_collect(force=True)
+        if options["daemon"]:
+            stop_event = threading.Event()
+            signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+            try:
+                garbage_collection.run(
+                    options["interval"],
+                    time_budget=options["time_budget"],
+                    stop_event=stop_event,
+                    on_collect=lambda metrics: self._report(metrics, options["verbosity"]),
+                )
+            except KeyboardInterrupt:
+                pass
+        else:
+            self._report(garbage_collection.collect(options["time_budget"]), options["verbosity"])
+
+    def _report(self, metrics, verbosity):
+        if verbosity < 2:
+            return
+        if metrics is None:
+            self.stdout.write("Garbage collection is running elsewhere.")
+        else:
+            self.stdout.write(
+                "Deleted {requests} requests, {rows} rows in {seconds:.2f}s ({rows_per_second:.0f} rows/s).".format(
+                    **metrics
+                )
+            )
@@ -1,21 +1,22 @@
 import logging
 import random
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.conf import settings
 from django.db import DatabaseError, router, transaction
-from django.db.models.sql.compiler import SQLCompiler
+from django.db.backends.signals import connection_created
 from django.urls import NoReverseMatch, reverse
-from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from silk import models
-from silk.collector import DataCollector
+from silk.collector import DataCollector, record_rollups, silk_own_queries
 from silk.config import SilkyConfig
 from silk.errors import SilkNotConfigured
 from silk.model_factory import RequestModelFactory, ResponseModelFactory
+from silk.persistence import BackgroundWriter, persist
 from silk.profiling import dynamic
 from silk.profiling.profiler import silk_meta_profiler
-from silk.sql import execute_sql
+from silk.sql import install_execute_wrapper, install_execute_wrappers
 
 Logger = logging.getLogger('silk.middleware')
 
@@ -83,6 +84,9 @@ class TestMiddleware:
 
 
 class SilkyMiddleware:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         if config.SILKY_AUTHENTICATION and not (
             set(AUTH_AND_SESSION_MIDDLEWARES) & set(settings.MIDDLEWARE)
@@ -93,8 +97,19 @@ class SilkyMiddleware:
             )
 
         self.get_response = get_response
+        # Connections opened later, e.g. by the threads sync_to_async runs
+        # views in, get the wrapper as they are created
+        connection_created.connect(install_execute_wrapper, dispatch_uid='silk_execute_wrapper')
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            if config.SILKY_PYTHON_PROFILER or config.SILKY_PYTHON_PROFILER_FUNC:
+                Logger.warning('The Python profiler does not profile asynchronous requests')
 
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
         self.process_request(request)
 
         # To be able to persist filters when Session and Authentication
@@ -109,6 +124,33 @@ class SilkyMiddleware:
 
         return response
 
+    async def __acall__(self, request):
+        # Only hop to a thread when Silk has to touch the database, collection
+        # itself is context local and safe to run on the event loop.
+        if self._process_request_is_async_safe():
+            self.process_request(request)
+        else:
+            await sync_to_async(self.process_request)(request)
+
+        request.silk_filters = {}
+
+        response = await self.get_response(request)
+
+        if config.SILKY_ASYNC_PERSISTENCE:
+            response = self.process_response(request, response)
+        else:
+            response = await sync_to_async(self.process_response)(request, response)
+
+        return response
+
+    def _process_request_is_async_safe(self):
+        """process_request only queries the database to insert the request or from user supplied callbacks"""
+        return (
+            config.SILKY_DEFER_REQUEST_INSERT
+            and not config.SILKY_INTERCEPT_FUNC
+            and not config.SILKY_PYTHON_PROFILER_FUNC
+        )
+
     def _apply_dynamic_mappings(self):
         dynamic_profile_configs = config.SILKY_DYNAMIC_PROFILING
         for conf in dynamic_profile_configs:
@@ -141,9 +183,7 @@ class SilkyMiddleware:
         Logger.debug('process_request')
         request.silk_is_intercepted = True
         self._apply_dynamic_mappings()
-        if not hasattr(SQLCompiler, '_execute_sql'):
-            SQLCompiler._execute_sql = SQLCompiler.execute_sql
-            SQLCompiler.execute_sql = execute_sql
+        install_execute_wrappers()
 
         silky_config = SilkyConfig()
 
@@ -151,22 +191,29 @@ class SilkyMiddleware:
         if silky_config.SILKY_PYTHON_PROFILER_FUNC:
             should_profile = silky_config.SILKY_PYTHON_PROFILER_FUNC(request)
 
-        request_model = RequestModelFactory(request).construct_request_model()
-        DataCollector().configure(request_model, should_profile=should_profile)
+        request_model = RequestModelFactory(request).construct_request_model(
+            commit=not silky_config.SILKY_DEFER_REQUEST_INSERT
+        )
+        DataCollector().configure(request_model, should_profile=should_profile, asynchronous=self.async_mode)
 
     def _process_response(self, request, response):
         # Use a context manager instead of a decorator so db_for_write is evaluated at runtime,
         # which is important for dynamic database configurations (e.g., multitenancy).
-        with transaction.atomic(using=router.db_for_write(models.SQLQuery)):
+        # The statements run here are Silk's own and not collected as queries of the request.
+        with silk_own_queries(), transaction.atomic(using=router.db_for_write(models.SQLQuery)):
             Logger.debug('Process response')
             with silk_meta_profiler():
                 collector = DataCollector()
                 collector.stop_python_profiler()
                 silk_request = collector.request
+                # With SILKY_DEFER_REQUEST_INSERT the request has not been
+                # inserted yet and is written once together with everything else
+                deferred = silk_request is not None and silk_request._state.adding
                 if silk_request:
-                    ResponseModelFactory(response).construct_response_model()
-                    silk_request.end_time = timezone.now()
-                    collector.finalise()
+                    silk_response = ResponseModelFactory(response).construct_response_model(commit=not deferred)
+                    collector.finish_request()
+                    if not deferred:
+                        record = collector.finalise()
                 else:
                     Logger.error(
                         'No request model was available when processing response. '
@@ -176,14 +223,43 @@ class SilkyMiddleware:
             # Need to save the data outside the silk_meta_profiler
             # Otherwise the  meta time collected in the context manager
             # is not taken in account
-            if silk_request:
+            if silk_request and deferred:
+                persist([collector.snapshot(response=silk_response)])
+            elif silk_request:
                 silk_request.save()
+                record_rollups([record])
             Logger.debug('Process response done.')
+        if silk_request:
+            # Saving the request above skips garbage collection inside the transaction
+            with silk_own_queries():
+                models.Request.garbage_collect(force=False)
+
+    def _submit_response(self, request, response):
+        """Hand the collected data over to the background writer instead of saving it"""
+        Logger.debug('Submit response')
+        with silk_meta_profiler():
+            collector = DataCollector()
+            collector.stop_python_profiler()
+            silk_request = collector.request
+            if not silk_request:
+                Logger.error(
+                    'No request model was available when processing response. '
+                    'Did something go wrong in process_request/process_view?'
+                    '\n' + str(request) + '\n\n' + str(response)
+                )
+                return
+            silk_response = ResponseModelFactory(response).construct_response_model(commit=False)
+            collector.finish_request()
+            record = collector.snapshot(response=silk_response)
+        collector.clear()
+        BackgroundWriter().submit(record)
 
     def process_response(self, request, response):
         max_attempts = 2
         attempts = 1
-        if getattr(request, 'silk_is_intercepted', False):
+        if getattr(request, 'silk_is_intercepted', False) and config.SILKY_ASYNC_PERSISTENCE:
+            self._submit_response(request, response)
+        elif getattr(request, 'silk_is_intercepted', False):
             while attempts <= max_attempts:
                 if attempts > 1:
                     Logger.debug('Retrying _process_response; attempt %s' % attempts)
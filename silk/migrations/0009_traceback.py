@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silk', '0008_sqlquery_analysis'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Traceback',
+            fields=[
+                ('hash', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('text', models.TextField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='sqlquery',
+            name='stack',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='queries', to='silk.traceback'),
+        ),
+    ]
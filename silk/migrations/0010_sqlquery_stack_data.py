@@ -0,0 +1,50 @@
+import hashlib
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def move_tracebacks(apps, schema_editor):
+    """Replace the traceback text of each query with a shared Traceback row"""
+    SQLQuery = apps.get_model('silk', 'SQLQuery')
+    Traceback = apps.get_model('silk', 'Traceback')
+    db_alias = schema_editor.connection.alias
+    queries = SQLQuery.objects.using(db_alias).filter(stack__isnull=True).exclude(traceback='')
+    last_pk = 0
+    while True:
+        batch = list(queries.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'traceback')[:BATCH_SIZE])
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+        pks_by_hash = {}
+        texts = {}
+        for pk, text in batch:
+            digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+            texts[digest] = text
+            pks_by_hash.setdefault(digest, []).append(pk)
+        Traceback.objects.using(db_alias).bulk_create(
+            [Traceback(hash=digest, text=text) for digest, text in texts.items()],
+            ignore_conflicts=True,
+        )
+        for digest, pks in pks_by_hash.items():
+            SQLQuery.objects.using(db_alias).filter(pk__in=pks).update(stack_id=digest)
+
+
+def restore_tracebacks(apps, schema_editor):
+    SQLQuery = apps.get_model('silk', 'SQLQuery')
+    Traceback = apps.get_model('silk', 'Traceback')
+    db_alias = schema_editor.connection.alias
+    for traceback in Traceback.objects.using(db_alias).iterator():
+        SQLQuery.objects.using(db_alias).filter(stack=traceback).update(traceback=traceback.text)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silk', '0009_traceback'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_tracebacks, restore_tracebacks),
+    ]
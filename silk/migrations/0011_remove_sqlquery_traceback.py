@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silk', '0010_sqlquery_stack_data'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sqlquery',
+            name='traceback',
+            field=models.TextField(default=''),
+        ),
+        migrations.RemoveField(
+            model_name='sqlquery',
+            name='traceback',
+        ),
+    ]
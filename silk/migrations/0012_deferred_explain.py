@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:46
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silk', '0011_remove_sqlquery_traceback'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryPlan',
+            fields=[
+                ('key', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('plan', models.TextField()),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='sqlquery',
+            name='params',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='sqlquery',
+            name='raw_query',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='sqlquery',
+            name='using',
+            field=models.CharField(blank=True, default='', max_length=190),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silk', '0012_deferred_explain'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sqlquery',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.AddIndex(
+            model_name='sqlquery',
+            index=models.Index(fields=['fingerprint', 'time_taken'], name='silk_sqlque_fingerp_32ee40_idx'),
+        ),
+    ]
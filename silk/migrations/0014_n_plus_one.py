@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silk', '0013_sqlquery_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='request',
+            name='num_n_plus_one',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='NPlusOneFinding',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=40)),
+                ('query', models.TextField()),
+                ('file_path', models.CharField(blank=True, default='', max_length=300)),
+                ('line_num', models.IntegerField(blank=True, null=True)),
+                ('func_name', models.CharField(blank=True, default='', max_length=300)),
+                ('num_queries', models.IntegerField()),
+                ('time_taken', models.FloatField(blank=True, null=True)),
+                ('request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='n_plus_one_findings', to='silk.request')),
+            ],
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silk', '0014_n_plus_one'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('view_name', models.CharField(blank=True, default='', max_length=190)),
+                ('num_requests', models.IntegerField(default=0)),
+                ('time_taken', models.FloatField(default=0)),
+                ('max_time_taken', models.FloatField(default=0)),
+                ('num_queries', models.IntegerField(default=0)),
+                ('max_num_queries', models.IntegerField(default=0)),
+                ('db_time', models.FloatField(default=0)),
+                ('max_db_time', models.FloatField(default=0)),
+                ('max_db_time_request', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='silk.request')),
+                ('max_num_queries_request', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='silk.request')),
+                ('max_time_taken_request', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='silk.request')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('bucket', 'view_name'), name='silk_requestrollup_bucket_view_name')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silk', '0015_requestrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatencyHistogram',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('view_name', models.CharField(blank=True, default='', max_length=190)),
+                ('bin', models.IntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('bucket', 'view_name', 'bin'), name='silk_latencyhistogram_bucket_view_name_bin')],
+            },
+        ),
+    ]
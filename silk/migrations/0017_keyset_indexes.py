@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silk', '0016_latencyhistogram'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['start_time', 'id'], name='silk_reques_start_t_6f78be_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['path', 'id'], name='silk_reques_path_aef695_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['num_sql_queries', 'id'], name='silk_reques_num_sql_0e9e8e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['time_taken', 'id'], name='silk_reques_time_ta_dbf530_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sqlquery',
+            index=models.Index(fields=['request', 'start_time', 'id'], name='silk_sqlque_request_a33efa_idx'),
+        ),
+    ]
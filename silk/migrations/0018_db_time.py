@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silk', '0017_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='db_time',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='db_time',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['db_time', 'id'], name='silk_reques_db_time_7c8f9d_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations
+from django.db.models import FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def _backfill(model, queries, db_alias):
+    """Set db_time of each row of model to the total time_taken of its queries, BATCH_SIZE rows at a time"""
+    db_time = Coalesce(
+        Subquery(queries.values('t')[:1], output_field=FloatField()), Value(0.0), output_field=FloatField(),
+    )
+    objects = model.objects.using(db_alias).order_by('pk')
+    last_pk = None
+    while True:
+        batch = objects if last_pk is None else objects.filter(pk__gt=last_pk)
+        pks = list(batch.values_list('pk', flat=True)[:BATCH_SIZE])
+        if not pks:
+            break
+        last_pk = pks[-1]
+        model.objects.using(db_alias).filter(pk__in=pks).update(db_time=db_time)
+
+
+def compute_db_time(apps, schema_editor):
+    Request = apps.get_model('silk', 'Request')
+    Profile = apps.get_model('silk', 'Profile')
+    SQLQuery = apps.get_model('silk', 'SQLQuery')
+    db_alias = schema_editor.connection.alias
+    _backfill(
+        Request,
+        SQLQuery.objects.using(db_alias).filter(request=OuterRef('pk'))
+        .order_by().values('request').annotate(t=Sum('time_taken')),
+        db_alias,
+    )
+    _backfill(
+        Profile,
+        Profile.queries.through.objects.using(db_alias).filter(profile=OuterRef('pk'))
+        .order_by().values('profile').annotate(t=Sum('sqlquery__time_taken')),
+        db_alias,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silk', '0018_db_time'),
+    ]
+
+    operations = [
+        migrations.RunPython(compute_db_time, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silk', '0019_db_time_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lease',
+            fields=[
+                ('name', models.CharField(max_length=190, primary_key=True, serialize=False)),
+                ('holder', models.CharField(max_length=190)),
+                ('expires', models.DateTimeField()),
+            ],
+        ),
+    ]
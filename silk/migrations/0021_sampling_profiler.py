@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silk', '0020_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='request',
+            name='collapsed_stacks',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='sampling_overhead',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silk', '0022_sqlquery_rowcount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='request',
+            name='queries_by_alias',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='sqlquery',
+            name='vendor',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silk', '0023_queries_by_alias'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='request',
+            name='dropped_queries_time',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='num_dropped_profiles',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='num_dropped_queries',
+            field=models.IntegerField(default=0),
+        ),
+    ]
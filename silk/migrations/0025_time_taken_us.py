@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silk', '0024_dropped_objects'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='time_taken_us',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='time_taken_us',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sqlquery',
+            name='time_taken_us',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:51
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silk', '0025_time_taken_us'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='traceback',
+            name='created',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,93 @@
+from collections import Counter
+
+from django.db import migrations
+from django.db.models import Min, Q
+
+from silk.utils import histogram
+
+BATCH_SIZE = 1000
+
+MAXIMA = ('time_taken', 'num_queries', 'db_time')
+
+
+def _requests(Request, db_alias, before):
+    """Yield the finished requests that started before `before`, BATCH_SIZE at a time"""
+    requests = Request.objects.using(db_alias).filter(end_time__isnull=False).order_by('start_time', 'id')
+    if before is not None:
+        requests = requests.filter(start_time__lt=before)
+    requests = requests.only('id', 'start_time', 'view_name', 'time_taken', 'num_sql_queries', 'db_time')
+    last = None
+    while True:
+        batch = requests
+        if last is not None:
+            batch = batch.filter(Q(start_time__gt=last.start_time) | Q(start_time=last.start_time, id__gt=last.id))
+        batch = list(batch[:BATCH_SIZE])
+        if not batch:
+            return
+        yield from batch
+        last = batch[-1]
+
+
+def _bucket(dt):
+    return dt.replace(second=0, microsecond=0)
+
+
+def backfill_rollups(apps, schema_editor):
+    """
+    Roll up the requests recorded before rollups and histograms existed.
+    Requests are only rolled up if they started before the earliest existing
+    rollup (histogram), so those recorded since are not counted twice.
+    """
+    Request = apps.get_model('silk', 'Request')
+    RequestRollup = apps.get_model('silk', 'RequestRollup')
+    LatencyHistogram = apps.get_model('silk', 'LatencyHistogram')
+    db_alias = schema_editor.connection.alias
+    rollups_from = RequestRollup.objects.using(db_alias).aggregate(b=Min('bucket'))['b']
+    histograms_from = LatencyHistogram.objects.using(db_alias).aggregate(b=Min('bucket'))['b']
+    before = max(rollups_from, histograms_from) if rollups_from and histograms_from else None
+
+    rollups = {}
+    counts = Counter()
+    for request in _requests(Request, db_alias, before):
+        bucket = _bucket(request.start_time)
+        view_name = request.view_name or ''
+        values = {
+            'time_taken': request.time_taken or 0,
+            'num_queries': request.num_sql_queries,
+            'db_time': request.db_time or 0,
+        }
+        if rollups_from is None or bucket < rollups_from:
+            rollup = rollups.get((bucket, view_name))
+            if rollup is None:
+                rollup = rollups[bucket, view_name] = RequestRollup(bucket=bucket, view_name=view_name, num_requests=0)
+                for field in MAXIMA:
+                    setattr(rollup, f'max_{field}', values[field])
+                    setattr(rollup, f'max_{field}_request_id', request.pk)
+            rollup.num_requests += 1
+            for field in MAXIMA:
+                setattr(rollup, field, getattr(rollup, field) + values[field])
+                if values[field] > getattr(rollup, f'max_{field}'):
+                    setattr(rollup, f'max_{field}', values[field])
+                    setattr(rollup, f'max_{field}_request_id', request.pk)
+        if request.time_taken is not None and (histograms_from is None or bucket < histograms_from):
+            counts[bucket, view_name, histogram.bin_for(request.time_taken)] += 1
+
+    RequestRollup.objects.using(db_alias).bulk_create(rollups.values(), batch_size=BATCH_SIZE)
+    LatencyHistogram.objects.using(db_alias).bulk_create(
+        [
+            LatencyHistogram(bucket=bucket, view_name=view_name, bin=bin_index, count=count)
+            for (bucket, view_name, bin_index), count in counts.items()
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silk', '0026_traceback_created'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silk', '0027_requestrollup_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatabaseRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('using', models.CharField(blank=True, default='', max_length=190)),
+                ('vendor', models.CharField(blank=True, default='', max_length=50)),
+                ('num_queries', models.IntegerField(default=0)),
+                ('time', models.FloatField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('bucket', 'using'), name='silk_databaserollup_bucket_using')],
+            },
+        ),
+    ]
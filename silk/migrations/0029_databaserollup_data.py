@@ -0,0 +1,47 @@
+from django.db import migrations
+from django.db.models import Q
+
+BATCH_SIZE = 1000
+
+
+def backfill_database_rollups(apps, schema_editor):
+    """Sum the queries_by_alias of the recorded requests into per-minute database rollups"""
+    Request = apps.get_model('silk', 'Request')
+    DatabaseRollup = apps.get_model('silk', 'DatabaseRollup')
+    db_alias = schema_editor.connection.alias
+    requests = (
+        Request.objects.using(db_alias).filter(end_time__isnull=False).exclude(queries_by_alias={})
+        .order_by('start_time', 'id').only('id', 'start_time', 'queries_by_alias')
+    )
+    sums = {}
+    last = None
+    while True:
+        batch = requests
+        if last is not None:
+            batch = batch.filter(Q(start_time__gt=last.start_time) | Q(start_time=last.start_time, id__gt=last.id))
+        batch = list(batch[:BATCH_SIZE])
+        if not batch:
+            break
+        for request in batch:
+            bucket = request.start_time.replace(second=0, microsecond=0)
+            for using, stats in request.queries_by_alias.items():
+                row = sums.get((bucket, using))
+                if row is None:
+                    row = sums[bucket, using] = DatabaseRollup(
+                        bucket=bucket, using=using, vendor=stats.get('vendor', ''), num_queries=0, time=0,
+                    )
+                row.num_queries += stats.get('num_queries', 0)
+                row.time += stats.get('time') or 0
+        last = batch[-1]
+    DatabaseRollup.objects.using(db_alias).bulk_create(sums.values(), batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('silk', '0028_databaserollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_database_rollups, migrations.RunPython.noop),
+    ]
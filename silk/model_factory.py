@@ -224,19 +224,21 @@ class RequestModelFactory:
 
         return resolved.view_name
 
-    def construct_request_model(self):
+    def construct_request_model(self, commit=True):
         body, raw_body = self.body()
         query_params = self.query_params()
         path = self.request.path
         view_name = self.view_name()
 
-        request_model = models.Request.objects.create(
+        request_model = models.Request(
             path=path,
             encoded_headers=self.encoded_headers(),
             method=self.request.method,
             query_params=query_params,
             view_name=view_name,
             body=body)
+        if commit:
+            request_model.save()
         # Text fields are encoded as UTF-8 in Django and hence will try to coerce
         # anything to we pass to UTF-8. Some stuff like binary will fail.
         try:
@@ -292,7 +294,7 @@ class ResponseModelFactory:
                         )
         return body, content
 
-    def construct_response_model(self):
+    def construct_response_model(self, commit=True):
         assert self.request, 'Cant construct a response model if there is no request model'
         Logger.debug(
             'Creating response model for request model with pk %s'
@@ -319,5 +321,6 @@ class ResponseModelFactory:
         except TypeError:
             raw_body = base64.b64encode(content.encode('utf-8'))
         silky_response.raw_body = raw_body.decode('ascii')
-        silky_response.save()
+        if commit:
+            silky_response.save()
         return silky_response
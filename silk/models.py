@@ -1,31 +1,49 @@
 import base64
+import hashlib
 import json
+import os
 import random
 import re
+import socket
+import time
+from collections import Counter
+from datetime import timedelta
 from uuid import uuid4
 
 import sqlparse
 from django.conf import settings
 from django.core.files.storage import storages
 from django.core.files.storage.handler import InvalidStorageError
-from django.db import models, router, transaction
+from django.db import IntegrityError, connections, models, router, transaction
 from django.db.models import (
+    BigIntegerField,
     BooleanField,
+    Case,
     CharField,
     DateTimeField,
+    Exists,
+    F,
     FileField,
     FloatField,
     ForeignKey,
     IntegerField,
+    JSONField,
     ManyToManyField,
     OneToOneField,
+    OuterRef,
+    Q,
     Sum,
     TextField,
+    UniqueConstraint,
+    Value,
+    When,
 )
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from django.utils.safestring import mark_safe
 
 from silk.config import SilkyConfig
+from silk.utils import histogram
 from silk.utils.profile_parser import parse_profile
 
 try:
@@ -37,9 +55,25 @@ except InvalidStorageError:
 
 
 # Seperated out so can use in tests w/o models
+def _duration_us(start_time, end_time):
+    """Whole microseconds between two datetimes"""
+    return (end_time - start_time) // timedelta(microseconds=1)
+
+
 def _time_taken(start_time, end_time):
-    d = end_time - start_time
-    return d.seconds * 1000 + d.microseconds / 1000
+    return _duration_us(start_time, end_time) / 1000
+
+
+def _compute_time_taken(obj):
+    """
+    Set time_taken in milliseconds from time_taken_us, the duration measured
+    with time.perf_counter_ns() by the collector, or else from the start and
+    end times.
+    """
+    if obj.time_taken_us is None and obj.end_time and obj.start_time:
+        obj.time_taken_us = _duration_us(obj.start_time, obj.end_time)
+    if obj.time_taken_us is not None:
+        obj.time_taken = obj.time_taken_us / 1000
 
 
 def time_taken(self):
@@ -79,12 +113,16 @@ class Request(models.Model):
     )
     end_time = DateTimeField(null=True, blank=True)
     time_taken = FloatField(blank=True, null=True)  # milliseconds
+    time_taken_us = BigIntegerField(blank=True, null=True)  # microseconds, see _compute_time_taken
     encoded_headers = TextField(blank=True, default='')  # stores json
     meta_time = FloatField(null=True, blank=True)
     meta_num_queries = IntegerField(null=True, blank=True)
     meta_time_spent_queries = FloatField(null=True, blank=True)
     pyprofile = TextField(blank=True, default='')
     prof_file = FileField(max_length=300, blank=True, storage=silk_storage)
+    # stacks sampled by the sampling profiler, in the collapsed stack format
+    collapsed_stacks = TextField(blank=True, default='')
+    sampling_overhead = FloatField(null=True, blank=True)  # milliseconds
 
     # Useful method to create shortened copies of strings without losing start and end context
     # Used to ensure path and view_name don't exceed 190 characters
@@ -116,16 +154,47 @@ class Request(models.Model):
     # as in bulk_create of SQLQueryManager
     # TODO: This is probably a bad way to do this, .count() will prob do?
     num_sql_queries = IntegerField(default=0)  # TODO replace with count()
+    # total time_taken of the queries, maintained alongside num_sql_queries
+    db_time = FloatField(default=0)  # milliseconds
+    # {alias: {'vendor', 'num_queries', 'time'}} of the queries on each database,
+    # written by the collector along with num_sql_queries and db_time
+    queries_by_alias = JSONField(default=dict, blank=True)
+
+    # queries and profiles left out because of SILKY_MAX_RECORDED_QUERIES and
+    # SILKY_MAX_RECORDED_PROFILES, which keep the slowest ones
+    num_dropped_queries = IntegerField(default=0)
+    dropped_queries_time = FloatField(default=0)  # milliseconds
+    num_dropped_profiles = IntegerField(default=0)
+
+    # number of NPlusOneFinding of the request, kept here for filtering and display
+    num_n_plus_one = IntegerField(default=0)
+
+    class Meta:
+        # Back keyset pagination of RequestsView for each of its orderings,
+        # see silk.utils.pagination._keyset_page
+        indexes = [
+            models.Index(fields=['start_time', 'id']),
+            models.Index(fields=['path', 'id']),
+            models.Index(fields=['num_sql_queries', 'id']),
+            models.Index(fields=['time_taken', 'id']),
+            models.Index(fields=['db_time', 'id']),
+        ]
+
+    def _add_queries(self, count, db_time):
+        """Adjust num_sql_queries and db_time in the database without overwriting concurrent changes"""
+        self.num_sql_queries += count
+        self.db_time += db_time
+        Request.objects.filter(pk=self.pk).update(
+            num_sql_queries=F('num_sql_queries') + count,
+            db_time=F('db_time') + db_time,
+        )
 
     @property
     def time_spent_on_sql_queries(self):
-        """"
-        Calculate the total time spent in milliseconds on SQL queries using Django aggregates.
         """
-        result = SQLQuery.objects.filter(request=self).aggregate(
-            total_time=Sum('time_taken', output_field=FloatField())
-        )
-        return result['total_time'] or 0.0
+        The total time spent in milliseconds on SQL queries.
+        """
+        return self.db_time
 
     @property
     def headers(self):
@@ -141,39 +210,103 @@ class Request(models.Model):
         return self.headers.get('content-type', None)
 
     @classmethod
-    def garbage_collect(cls, force=False):
-        """ Remove Request/Responses when we are at the SILKY_MAX_RECORDED_REQUESTS limit
-        Note that multiple in-flight requests may call this at once causing a
-        double collection """
-        check_percent = SilkyConfig().SILKY_MAX_RECORDED_REQUESTS_CHECK_PERCENT
-        check_percent /= 100.0
-        if check_percent < random.random() and not force:
-            return
+    def _target_count(cls):
         target_count = SilkyConfig().SILKY_MAX_RECORDED_REQUESTS
+        check_percent = SilkyConfig().SILKY_MAX_RECORDED_REQUESTS_CHECK_PERCENT / 100.0
 
         # Since garbage collection is probabilistic, the target count should
         # be lowered to account for requests before the next garbage collection
         if check_percent != 0:
             target_count -= int(1 / check_percent)
+        return target_count
 
-        # Make sure we can delete everything if needed by settings
-        if target_count <= 0:
-            cls.objects.all().delete()
-            return
+    @classmethod
+    def expiry_cutoff(cls, target_count):
+        """
+        The start_time up to which (inclusive) requests have expired, either
+        because they are older than SILKY_MAX_REQUEST_AGE or because only the
+        target_count most recent requests are kept. None if no request has.
+        """
+        cutoffs = []
+        max_age = SilkyConfig().SILKY_MAX_REQUEST_AGE
+        if max_age is not None:
+            if not isinstance(max_age, timedelta):
+                max_age = timedelta(seconds=max_age)
+            cutoffs.append(timezone.now() - max_age)
+        # Walks the start_time index rather than counting the table
+        count_cutoff = cls.objects.order_by(
+            '-start_time'
+        ).values_list(
+            'start_time',
+            flat=True
+        )[target_count:target_count + 1].first()
+        if count_cutoff is not None:
+            cutoffs.append(count_cutoff)
+        return max(cutoffs, default=None)
 
+    @classmethod
+    def garbage_collect(cls, force=False, time_budget=None):
+        """ Remove Request/Responses when we are at the SILKY_MAX_RECORDED_REQUESTS limit
+        or that are older than SILKY_MAX_REQUEST_AGE. Requests are deleted oldest
+        first in chunks of SILKY_GARBAGE_COLLECT_CHUNK_SIZE, for at most time_budget
+        seconds (SILKY_GARBAGE_COLLECT_TIME_BUDGET by default).
+        Only one process collects at a time, others return None straight away.
+        The lease is extended after every chunk and collection stops if it was lost.
+        Unless forced, nothing is collected inside a transaction, which would
+        hold the lease and the locks of the deleted rows until it commits.
+        Returns the number of requests and rows deleted and whether all
+        expired requests were deleted within the time budget. """
+        check_percent = SilkyConfig().SILKY_MAX_RECORDED_REQUESTS_CHECK_PERCENT
+        check_percent /= 100.0
+        if not force:
+            if check_percent < random.random():
+                return None
+            if connections[router.db_for_write(cls)].in_atomic_block:
+                return None
+        if time_budget is None:
+            time_budget = SilkyConfig().SILKY_GARBAGE_COLLECT_TIME_BUDGET
+        holder = Lease.holder_id()
+
+        def renew():
+            return Lease.acquire(GARBAGE_COLLECT_LEASE, holder, SilkyConfig().SILKY_GARBAGE_COLLECT_LEASE_SECONDS)
+
+        if not renew():
+            return None
         try:
-            time_cutoff = cls.objects.order_by(
-                '-start_time'
-            ).values_list(
-                'start_time',
-                flat=True
-            )[target_count]
-        except IndexError:
-            return
+            return cls._garbage_collect(time_budget, renew)
+        finally:
+            Lease.release(GARBAGE_COLLECT_LEASE, holder)
 
-        cls.objects.filter(start_time__lte=time_cutoff).delete()
+    @classmethod
+    def _garbage_collect(cls, time_budget, renew=None):
+        from silk.utils.data_deletion import delete_requests
 
-    def save(self, *args, **kwargs):
+        deadline = time.monotonic() + time_budget if time_budget else None
+        target_count = cls._target_count()
+        chunk_size = SilkyConfig().SILKY_GARBAGE_COLLECT_CHUNK_SIZE
+
+        # Make sure we can delete everything if needed by settings
+        if target_count <= 0:
+            num_requests, num_rows = delete_requests(cls.objects.all(), chunk_size, deadline, renew)
+            RequestRollup.objects.all().delete()
+            LatencyHistogram.objects.all().delete()
+            DatabaseRollup.objects.all().delete()
+            complete = not cls.objects.exists()
+        else:
+            time_cutoff = cls.expiry_cutoff(target_count)
+            if time_cutoff is None:
+                return {'requests': 0, 'rows': 0, 'complete': True}
+            expired = cls.objects.filter(start_time__lte=time_cutoff)
+            num_requests, num_rows = delete_requests(expired, chunk_size, deadline, renew)
+            RequestRollup.objects.filter(bucket__lt=RequestRollup.bucket_for(time_cutoff)).delete()
+            LatencyHistogram.objects.filter(bucket__lt=RequestRollup.bucket_for(time_cutoff)).delete()
+            DatabaseRollup.objects.filter(bucket__lt=RequestRollup.bucket_for(time_cutoff)).delete()
+            complete = not expired.exists()
+        if complete:
+            Traceback.garbage_collect(chunk_size, deadline, renew)
+        return {'requests': num_requests, 'rows': num_rows, 'complete': complete}
+
+    def prepare_save(self):
         # sometimes django requests return the body as 'None'
         if self.raw_body is None:
             self.raw_body = ''
@@ -181,9 +314,7 @@ class Request(models.Model):
         if self.body is None:
             self.body = ''
 
-        if self.end_time and self.start_time:
-            interval = self.end_time - self.start_time
-            self.time_taken = interval.total_seconds() * 1000
+        _compute_time_taken(self)
 
         # We can't save if either path or view_name exceed 190 characters
         if self.path and len(self.path) > 190:
@@ -192,10 +323,224 @@ class Request(models.Model):
         if self.view_name and len(self.view_name) > 190:
             self.view_name = self._shorten(self.view_name)
 
+    def save(self, *args, **kwargs):
+        self.prepare_save()
         super().save(*args, **kwargs)
         Request.garbage_collect(force=False)
 
 
+class RequestRollup(models.Model):
+    """
+    Requests aggregated per view and minute, maintained as requests are saved
+    (see record_requests) so that the summary page does not have to aggregate
+    the request and query tables. The slowest request, the one with the most
+    queries and the one with the most time in the database are kept with each
+    maximum.
+    """
+    bucket = DateTimeField()  # start of the minute
+    view_name = CharField(max_length=190, blank=True, default='')
+    num_requests = IntegerField(default=0)
+    time_taken = FloatField(default=0)  # milliseconds, sum over the requests
+    max_time_taken = FloatField(default=0)
+    max_time_taken_request = ForeignKey(
+        Request, related_name='+', null=True, blank=True, on_delete=models.SET_NULL,
+    )
+    num_queries = IntegerField(default=0)
+    max_num_queries = IntegerField(default=0)
+    max_num_queries_request = ForeignKey(
+        Request, related_name='+', null=True, blank=True, on_delete=models.SET_NULL,
+    )
+    db_time = FloatField(default=0)  # milliseconds, sum over the requests
+    max_db_time = FloatField(default=0)
+    max_db_time_request = ForeignKey(
+        Request, related_name='+', null=True, blank=True, on_delete=models.SET_NULL,
+    )
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['bucket', 'view_name'], name='silk_requestrollup_bucket_view_name'),
+        ]
+
+    @staticmethod
+    def bucket_for(dt):
+        return dt.replace(second=0, microsecond=0)
+
+    @classmethod
+    def record_requests(cls, requests):
+        """Add saved requests to their rollups"""
+        buckets = {}
+        for request in requests:
+            key = (cls.bucket_for(request.start_time), request.view_name or '')
+            buckets.setdefault(key, []).append((request, request.time_taken or 0, request.db_time or 0))
+        LatencyHistogram.record_requests(row[0] for rows in buckets.values() for row in rows)
+        DatabaseRollup.record_requests(row[0] for rows in buckets.values() for row in rows)
+        for (bucket, view_name), rows in buckets.items():
+            slowest, max_time_taken, _ = max(rows, key=lambda row: row[1])
+            most_queries = max(rows, key=lambda row: row[0].num_sql_queries)[0]
+            most_db_time, _, max_db_time = max(rows, key=lambda row: row[2])
+            cls._add(
+                bucket, view_name,
+                num_requests=len(rows),
+                time_taken=sum(row[1] for row in rows),
+                num_queries=sum(row[0].num_sql_queries for row in rows),
+                db_time=sum(row[2] for row in rows),
+                maxima={
+                    'max_time_taken': (max_time_taken, slowest),
+                    'max_num_queries': (most_queries.num_sql_queries, most_queries),
+                    'max_db_time': (max_db_time, most_db_time),
+                },
+            )
+
+    @classmethod
+    def _add(cls, bucket, view_name, maxima, **sums):
+        rollups = cls.objects.filter(bucket=bucket, view_name=view_name)
+        # The request columns are listed first as MySQL evaluates assignments
+        # in order, so they must compare against the previous maxima
+        changes = {
+            f'{field}_request': Case(
+                When(**{f'{field}__lt': value}, then=Value(request.pk, output_field=CharField())),
+                default=F(f'{field}_request'),
+            )
+            for field, (value, request) in maxima.items()
+        }
+        changes.update({field: Greatest(field, Value(value)) for field, (value, _) in maxima.items()})
+        changes.update({field: F(field) + value for field, value in sums.items()})
+        _update_or_insert(rollups, changes, dict(
+            bucket=bucket,
+            view_name=view_name,
+            **sums,
+            **{field: value for field, (value, _) in maxima.items()},
+            **{f'{field}_request': request for field, (_, request) in maxima.items()},
+        ))
+
+
+class LatencyHistogram(models.Model):
+    """
+    Number of requests per view and minute whose time_taken fell into a bin
+    of silk.utils.histogram. Histograms are merged by summing counts, which
+    the database does for any window with a GROUP BY on the bin.
+    """
+    bucket = DateTimeField()  # start of the minute
+    view_name = CharField(max_length=190, blank=True, default='')
+    bin = IntegerField()
+    count = IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['bucket', 'view_name', 'bin'], name='silk_latencyhistogram_bucket_view_name_bin'),
+        ]
+
+    @classmethod
+    def record_requests(cls, requests):
+        counts = Counter(
+            (RequestRollup.bucket_for(request.start_time), request.view_name or '', histogram.bin_for(request.time_taken))
+            for request in requests if request.time_taken is not None
+        )
+        for (bucket, view_name, bin_index), count in counts.items():
+            _update_or_insert(
+                cls.objects.filter(bucket=bucket, view_name=view_name, bin=bin_index),
+                {'count': F('count') + count},
+                {'bucket': bucket, 'view_name': view_name, 'bin': bin_index, 'count': count},
+            )
+
+    @classmethod
+    def percentiles(cls, histograms, quantiles):
+        """Estimate quantiles of the merged histograms of a queryset"""
+        counts = histograms.order_by().values_list('bin').annotate(Sum('count'))
+        return histogram.percentiles(counts, quantiles)
+
+
+class DatabaseRollup(models.Model):
+    """
+    Number of queries and time spent in them per database alias and minute,
+    summed from the queries_by_alias of the requests as they are saved
+    """
+    bucket = DateTimeField()  # start of the minute
+    using = CharField(max_length=190, blank=True, default='')
+    vendor = CharField(max_length=50, blank=True, default='')
+    num_queries = IntegerField(default=0)
+    time = FloatField(default=0)  # milliseconds, sum over the queries
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['bucket', 'using'], name='silk_databaserollup_bucket_using'),
+        ]
+
+    @classmethod
+    def record_requests(cls, requests):
+        sums = {}
+        for request in requests:
+            bucket = RequestRollup.bucket_for(request.start_time)
+            for using, stats in (request.queries_by_alias or {}).items():
+                row = sums.setdefault((bucket, using), {'vendor': stats.get('vendor', ''), 'num_queries': 0, 'time': 0})
+                row['num_queries'] += stats.get('num_queries', 0)
+                row['time'] += stats.get('time') or 0
+        for (bucket, using), row in sums.items():
+            _update_or_insert(
+                cls.objects.filter(bucket=bucket, using=using),
+                {'num_queries': F('num_queries') + row['num_queries'], 'time': F('time') + row['time']},
+                {'bucket': bucket, 'using': using, **row},
+            )
+
+
+def _update_or_insert(queryset, changes, values):
+    """Apply `changes` to the row matched by `queryset`, or insert `values` if there is none"""
+    for _ in range(2):
+        if queryset.update(**changes):
+            return
+        try:
+            with transaction.atomic(using=router.db_for_write(queryset.model)):
+                queryset.model.objects.create(**values)
+            return
+        except IntegrityError:
+            # Created concurrently, update it instead
+            continue
+
+
+GARBAGE_COLLECT_LEASE = 'garbage_collect'
+# Tracebacks stored or reused more recently than this are not collected, the
+# queries of a request that is still being saved may not refer to them yet
+TRACEBACK_GRACE_PERIOD = timedelta(hours=1)
+
+
+class Lease(models.Model):
+    """
+    Lock held by one process at a time, e.g. so that only one node runs
+    garbage collection. A lease expires after a while so that it is not held
+    forever by a process that died.
+    """
+    name = CharField(max_length=190, primary_key=True)
+    holder = CharField(max_length=190)
+    expires = DateTimeField()
+
+    @staticmethod
+    def holder_id():
+        """
+        Identifies a single acquisition across hosts, processes and threads.
+        Pass the same value to acquire() to extend the lease and to release().
+        """
+        return f'{socket.gethostname()}:{os.getpid()}:{uuid4().hex}'
+
+    @classmethod
+    def acquire(cls, name, holder, seconds):
+        """Take or extend the lease for `seconds`, returns False if another holder has it"""
+        now = timezone.now()
+        expires = now + timedelta(seconds=seconds)
+        if cls.objects.filter(Q(expires__lt=now) | Q(holder=holder), name=name).update(holder=holder, expires=expires):
+            return True
+        try:
+            with transaction.atomic(using=router.db_for_write(cls)):
+                cls.objects.create(name=name, holder=holder, expires=expires)
+        except IntegrityError:
+            # Held by someone else, or taken concurrently
+            return False
+        return True
+
+    @classmethod
+    def release(cls, name, holder):
+        cls.objects.filter(name=name, holder=holder).delete()
+
+
 class Response(models.Model):
     id = CharField(max_length=36, default=uuid4, primary_key=True)
     request = OneToOneField(
@@ -224,20 +569,91 @@ class Response(models.Model):
         return base64.b64decode(self.raw_body)
 
 
-# TODO rewrite docstring
+class Traceback(models.Model):
+    """A stack trace shared by every SQLQuery that was run from the same place"""
+    hash = CharField(max_length=40, primary_key=True)  # sha1 of text
+    text = TextField()
+    created = DateTimeField(default=timezone.now, db_index=True)
+
+    @classmethod
+    def for_text(cls, text):
+        return cls(hash=hashlib.sha1(text.encode('utf-8')).hexdigest(), text=text)
+
+    @classmethod
+    def save_all(cls, tracebacks):
+        """
+        Insert tracebacks, refreshing created on those already stored, so that
+        garbage collection does not delete a traceback while queries that use
+        it are being saved
+        """
+        now = timezone.now()
+        for traceback in tracebacks:
+            traceback.created = now
+        cls.objects.bulk_create(tracebacks, update_conflicts=True, unique_fields=['hash'], update_fields=['created'])
+
+    @classmethod
+    def garbage_collect(cls, chunk_size=1000, deadline=None, renew=None):
+        """
+        Remove tracebacks that are no longer referenced by any query and are
+        older than TRACEBACK_GRACE_PERIOD, chunk_size at a time with plain
+        DELETE statements that do not load the rows. No chunk is started after
+        deadline, a time.monotonic() value, nor once renew returns False.
+        Returns the number deleted.
+        """
+        from silk.utils.data_deletion import raw_delete
+
+        using = router.db_for_write(cls)
+        orphaned = cls.objects.using(using).exclude(
+            Exists(SQLQuery.objects.using(using).filter(stack=OuterRef('pk')))
+        )
+        cutoff = timezone.now() - TRACEBACK_GRACE_PERIOD
+        num_deleted = 0
+        while deadline is None or time.monotonic() < deadline:
+            pks = list(orphaned.filter(created__lt=cutoff).values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            # Check again on delete, a query may have started using one meanwhile
+            chunk = orphaned.filter(pk__in=pks)
+            num_deleted += raw_delete(chunk, using)
+            if renew is not None and not renew():
+                break
+        return num_deleted
+
+
+class QueryPlan(models.Model):
+    """EXPLAIN output cached by database alias and query fingerprint"""
+    key = CharField(max_length=40, primary_key=True)  # sha1 of alias and fingerprint
+    plan = TextField()
+    created = DateTimeField(default=timezone.now)
+
+    @staticmethod
+    def key_for(using, query_fingerprint):
+        return hashlib.sha1(f'{using}:{query_fingerprint}'.encode('utf-8')).hexdigest()
+
+
 class SQLQueryManager(models.Manager):
-    def bulk_create(self, *args, **kwargs):
-        """ensure that num_sql_queries remains consistent. Bulk create does not call
-        the model save() method and hence we must add this logic here too"""
+    def bulk_create(self, objs, *args, update_num_sql_queries=True, **kwargs):
+        """ensure that time_taken, num_sql_queries and db_time remain consistent. Bulk create does
+        not call the model save() method and hence we must add this logic here too.
+        The counters are incremented with a single UPDATE per request rather than
+        one per query. Pass update_num_sql_queries=False if the caller already
+        accounted for the new queries on the requests"""
+        objs = list(objs)
         with transaction.atomic(using=router.db_for_write(SQLQuery)):
-            if len(args):
-                objs = args[0]
-            else:
-                objs = kwargs.get('objs')
+            tracebacks = {obj.stack_id: obj.stack for obj in objs if obj.stack_id}
+            Traceback.save_all(list(tracebacks.values()))
+            new_queries = {}
             for obj in objs:
-                obj.prepare_save()
+                obj.compute_time_taken()
+                if update_num_sql_queries and not obj.pk and obj.request:
+                    request, count, db_time_us = new_queries.get(obj.request.pk, (obj.request, 0, 0))
+                    new_queries[request.pk] = (request, count + 1, db_time_us + (obj.time_taken_us or 0))
 
-            return super().bulk_create(*args, **kwargs)
+            created = super().bulk_create(objs, *args, **kwargs)
+
+            for request, count, db_time_us in new_queries.values():
+                request._add_queries(count, db_time_us / 1000)
+            return created
 
 
 class SQLQuery(models.Model):
@@ -245,19 +661,53 @@ class SQLQuery(models.Model):
     start_time = DateTimeField(null=True, blank=True, default=timezone.now)
     end_time = DateTimeField(null=True, blank=True)
     time_taken = FloatField(blank=True, null=True)  # milliseconds
+    time_taken_us = BigIntegerField(blank=True, null=True)  # microseconds, see _compute_time_taken
     identifier = IntegerField(default=-1)
     request = ForeignKey(
         Request, related_name='queries', null=True,
         blank=True, db_index=True, on_delete=models.CASCADE,
     )
-    traceback = TextField()
+    stack = ForeignKey(
+        Traceback, related_name='queries', null=True,
+        blank=True, db_index=True, on_delete=models.SET_NULL,
+    )
     analysis = TextField(null=True, blank=True)
+    # Parameterized SQL and JSON encoded params, kept for SILKY_DEFERRED_EXPLAIN
+    raw_query = TextField(blank=True, default='')
+    params = TextField(blank=True, default='')
+    using = CharField(max_length=190, blank=True, default='')
+    vendor = CharField(max_length=50, blank=True, default='')
+    rowcount = IntegerField(null=True, blank=True)
+    # number of parameter sets of an executemany() call
+    batch_size = IntegerField(null=True, blank=True)
+    # See silk.utils.sql_fingerprint, identifies queries that only differ in their parameters
+    fingerprint = CharField(max_length=40, blank=True, default='')
     objects = SQLQueryManager()
 
-    # TODO docstring
+    class Meta:
+        indexes = [
+            # Backs grouping by fingerprint and percentiles of time_taken per fingerprint
+            models.Index(fields=['fingerprint', 'time_taken']),
+            # Backs keyset pagination of the queries of a request in SQLView
+            models.Index(fields=['request', 'start_time', 'id']),
+        ]
+
+    @property
+    def traceback(self):
+        return self.stack.text if self.stack_id else ''
+
+    @traceback.setter
+    def traceback(self, text):
+        self.stack = Traceback.for_text(text) if text else None
+
     @property
     def traceback_ln_only(self):
-        return '\n'.join(self.traceback.split('\n')[::2])
+        """The 'File ..., line ..., in ...' lines of the traceback"""
+        lines = self.traceback.split('\n')
+        if all(line.startswith('  File "') for line in lines):
+            # Stacks captured by silk.sql are stored without source lines
+            return self.traceback
+        return '\n'.join(lines[::2])
 
     @property
     def formatted_query(self):
@@ -312,28 +762,40 @@ class SQLQuery(models.Model):
                     pass
         return tables
 
-    def prepare_save(self):
-        if self.end_time and self.start_time:
-            interval = self.end_time - self.start_time
-            self.time_taken = interval.total_seconds() * 1000
-
-        if not self.pk:
-            if self.request:
-                self.request.num_sql_queries += 1
-                self.request.save(update_fields=['num_sql_queries'])
+    def compute_time_taken(self):
+        _compute_time_taken(self)
 
     def save(self, *args, **kwargs):
         with transaction.atomic(using=router.db_for_write(self)):
-            self.prepare_save()
+            self.compute_time_taken()
+            is_new = not self.pk
+            if self.stack_id:
+                Traceback.save_all([self.stack])
             super().save(*args, **kwargs)
+            if is_new and self.request:
+                self.request._add_queries(1, self.time_taken or 0)
 
     def delete(self, *args, **kwargs):
         with transaction.atomic(using=router.db_for_write(self)):
-            self.request.num_sql_queries -= 1
-            self.request.save()
+            self.request._add_queries(-1, -(self.time_taken or 0))
             super().delete(*args, **kwargs)
 
 
+class NPlusOneFinding(models.Model):
+    """The same query shape run repeatedly from one place in the code during a request"""
+    request = ForeignKey(
+        Request, related_name='n_plus_one_findings', db_index=True,
+        on_delete=models.CASCADE,
+    )
+    fingerprint = CharField(max_length=40)
+    query = TextField()  # one of the repeated queries
+    file_path = CharField(max_length=300, blank=True, default='')
+    line_num = IntegerField(null=True, blank=True)
+    func_name = CharField(max_length=300, blank=True, default='')
+    num_queries = IntegerField()
+    time_taken = FloatField(blank=True, null=True)  # milliseconds, all repeated queries
+
+
 class BaseProfile(models.Model):
     name = CharField(max_length=300, blank=True, default='')
     start_time = DateTimeField(default=timezone.now)
@@ -343,14 +805,16 @@ class BaseProfile(models.Model):
         on_delete=models.CASCADE,
     )
     time_taken = FloatField(blank=True, null=True)  # milliseconds
+    time_taken_us = BigIntegerField(blank=True, null=True)  # microseconds, see _compute_time_taken
 
     class Meta:
         abstract = True
 
+    def compute_time_taken(self):
+        _compute_time_taken(self)
+
     def save(self, *args, **kwargs):
-        if self.end_time and self.start_time:
-            interval = self.end_time - self.start_time
-            self.time_taken = interval.total_seconds() * 1000
+        self.compute_time_taken()
         super().save(*args, **kwargs)
 
 
@@ -362,6 +826,8 @@ class Profile(BaseProfile):
     exception_raised = BooleanField(default=False)
     queries = ManyToManyField(SQLQuery, related_name='profiles', db_index=True)
     dynamic = BooleanField(default=False)
+    # total time_taken of the queries, computed when the profile is saved by the collector
+    db_time = FloatField(default=0, db_index=True)  # milliseconds
 
     @property
     def is_function_profile(self):
@@ -374,9 +840,6 @@ class Profile(BaseProfile):
     @property
     def time_spent_on_sql_queries(self):
         """
-        Calculate the total time spent in milliseconds on SQL queries using Django aggregates.
+        The total time spent in milliseconds on SQL queries.
         """
-        result = self.queries.aggregate(
-            total_time=Sum('time_taken', output_field=FloatField())
-        )
-        return result['total_time'] or 0.0
+        return self.db_time
@@ -0,0 +1,216 @@
+import atexit
+import contextvars
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.db import close_old_connections, router, transaction
+
+from silk import models
+from silk.collector import (
+    detect_n_plus_one,
+    queries_by_alias,
+    queries_db_time,
+    record_rollups,
+    save_queries_and_profiles,
+    silk_own_queries,
+    write_python_profile,
+)
+from silk.config import SilkyConfig
+from silk.singleton import Singleton
+
+Logger = logging.getLogger('silk.persistence')
+
+POLICY_DROP = 'drop'
+POLICY_BLOCK = 'block'
+
+
+def persist(records):
+    """
+    Write a batch of CollectedRequest records to the database. All requests in
+    the batch share a single transaction and their queries, profiles and
+    responses are inserted together. Requests that have not been inserted yet
+    (SILKY_DEFER_REQUEST_INSERT) are inserted here, once, with their final
+    values.
+    """
+    # Silk's own writes, which are not collected as queries of the request
+    with silk_own_queries():
+        for record in records:
+            write_python_profile(record)
+            detect_n_plus_one(record)
+            record.request.num_sql_queries = len(record.queries)
+            record.request.db_time = queries_db_time(record.queries.values())
+            record.request.queries_by_alias = queries_by_alias(record.queries.values())
+        pending = [record.request for record in records if record.request._state.adding]
+        existing = [record.request for record in records if not record.request._state.adding]
+        try:
+            with transaction.atomic(using=router.db_for_write(models.SQLQuery)):
+                for request in pending:
+                    request.prepare_save()
+                models.Request.objects.bulk_create(pending)
+                for request in existing:
+                    request.save()
+                models.Response.objects.bulk_create([r.response for r in records if r.response is not None])
+                save_queries_and_profiles(records, update_num_sql_queries=False)
+                record_rollups(records)
+        except Exception:
+            # bulk_create marked the requests as saved, but the transaction
+            # was rolled back so a retry must insert them again
+            for request in pending:
+                request._state.adding = True
+            raise
+        if pending:
+            models.Request.garbage_collect(force=False)
+
+
+class BackgroundWriter(metaclass=Singleton):
+    """
+    Bounded queue of CollectedRequest records drained by worker threads, used
+    when SILKY_ASYNC_PERSISTENCE is enabled so that the request thread does not
+    pay for Silk's database writes.
+
+    Counters (see `stats`):
+        enqueued: records accepted into the queue
+        written: records persisted by a worker
+        failed: records that could not be persisted
+        dropped: records discarded because the queue was full, or still
+            queued when the flush at shutdown timed out
+        late: records that were only accepted after the request thread
+            waited for room in the queue (block policy)
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._stopping = threading.Event()
+        self._counters = dict.fromkeys(('enqueued', 'written', 'failed', 'dropped', 'late'), 0)
+        self.queue = queue.Queue(maxsize=SilkyConfig().SILKY_ASYNC_PERSISTENCE_QUEUE_SIZE)
+        atexit.register(self.shutdown)
+
+    @property
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, queued=self.queue.qsize())
+
+    def _count(self, counter, n=1):
+        with self._lock:
+            self._counters[counter] += n
+
+    @property
+    def running(self):
+        return self._pid == os.getpid() and any(t.is_alive() for t in self._threads)
+
+    def start(self):
+        with self._lock:
+            if self._pid == os.getpid() and all(t.is_alive() for t in self._threads):
+                return
+            if self._pid != os.getpid():
+                # Worker threads do not survive a fork, neither should records
+                # queued by the parent process.
+                self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for _ in range(max(1, SilkyConfig().SILKY_ASYNC_PERSISTENCE_WORKERS) - len(self._threads)):
+                # Run in an empty context so the writer never inherits the
+                # collector state of the request that started it
+                thread = threading.Thread(
+                    target=contextvars.Context().run, args=(self._run,), name='silk-writer', daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, record):
+        """Queue a record for persistence, returns False if it had to be dropped"""
+        self.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if SilkyConfig().SILKY_ASYNC_PERSISTENCE_FULL_POLICY == POLICY_BLOCK:
+                try:
+                    self.queue.put(record, timeout=SilkyConfig().SILKY_ASYNC_PERSISTENCE_BLOCK_TIMEOUT)
+                except queue.Full:
+                    pass
+                else:
+                    self._count('enqueued')
+                    self._count('late')
+                    return True
+            self._count('dropped')
+            Logger.debug('Silk persistence queue is full, dropping request %s' % record.request.pk)
+            return False
+        self._count('enqueued')
+        return True
+
+    def _next_batch(self):
+        try:
+            batch = [self.queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        batch_size = SilkyConfig().SILKY_ASYNC_PERSISTENCE_BATCH_SIZE
+        while len(batch) < batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._next_batch()
+            if batch:
+                try:
+                    self.write(batch)
+                finally:
+                    for _ in batch:
+                        self.queue.task_done()
+
+    def write(self, batch):
+        close_old_connections()
+        try:
+            persist(batch)
+        except Exception:
+            if len(batch) == 1:
+                Logger.exception('Silk was unable to persist request %s' % batch[0].request.pk)
+                self._count('failed')
+                return
+            # Retry one by one so a single bad record does not lose the batch
+            for record in batch:
+                self.write([record])
+            return
+        self._count('written', len(batch))
+
+    def flush(self, timeout=None):
+        """Wait until every queued record has been written, returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                if not self.running:
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(0.5 if remaining is None else min(remaining, 0.5))
+        return True
+
+    def stop(self):
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def shutdown(self):
+        """Flush outstanding records and stop the workers, called at interpreter exit"""
+        if not self.running:
+            return
+        timeout = SilkyConfig().SILKY_ASYNC_PERSISTENCE_FLUSH_TIMEOUT
+        if not self.flush(timeout):
+            Logger.warning('Silk could not flush its persistence queue within %s seconds' % timeout)
+        self.stop()
+        lost = self.queue.qsize()
+        if lost:
+            self._count('dropped', lost)
+        Logger.debug('Silk persistence stopped: %s' % self.stats)
@@ -6,11 +6,9 @@ from functools import wraps
 
 from django.apps import apps
 from django.conf import settings
-from django.utils import timezone
 
-from silk.collector import DataCollector
+from silk.collector import CollectedProfile, DataCollector
 from silk.config import SilkyConfig
-from silk.models import _time_taken
 
 logger = logging.getLogger('silk.profiling.profiler')
 
@@ -21,7 +19,7 @@ class silk_meta_profiler:
 
     def __init__(self):
         super().__init__()
-        self.start_time = None
+        self.start_ns = None
 
     @property
     def _should_meta_profile(self):
@@ -29,11 +27,11 @@ class silk_meta_profiler:
 
     def __enter__(self):
         if self._should_meta_profile:
-            self.start_time = timezone.now()
+            self.start_ns = time.perf_counter_ns()
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self._should_meta_profile:
-            end_time = timezone.now()
+            end_ns = time.perf_counter_ns()
             exception_raised = exc_type is not None
             if exception_raised:
                 logger.error('Exception when performing meta profiling, dumping trace below')
@@ -41,18 +39,18 @@ class silk_meta_profiler:
             request = getattr(DataCollector().local, 'request', None)
             if request:
                 curr = request.meta_time or 0
-                request.meta_time = curr + _time_taken(self.start_time, end_time)
+                request.meta_time = curr + (end_ns - self.start_ns) // 1000 / 1000
 
     def __call__(self, target):
         if self._should_meta_profile:
             def wrapped_target(*args, **kwargs):
                 request = DataCollector().request
                 if request:
-                    start_time = timezone.now()
+                    start_ns = time.perf_counter_ns()
                     result = target(*args, **kwargs)
-                    end_time = timezone.now()
+                    end_ns = time.perf_counter_ns()
                     curr = request.meta_time or 0
-                    request.meta_time = curr + _time_taken(start_time, end_time)
+                    request.meta_time = curr + (end_ns - start_ns) // 1000 / 1000
                 else:
                     result = target(*args, **kwargs)
                 return result
@@ -83,25 +81,23 @@ class silk_profile:
         self._queries_after = self._query_identifiers_from_collector()
 
     def __enter__(self):
+        self._start_context_profile(inspect.currentframe().f_back)
+
+    def _start_context_profile(self, outer_frame):
         if self._silk_installed() and self._should_profile():
             with silk_meta_profiler():
                 self._start_queries()
                 if not self.name:
                     raise ValueError('silk_profile used as a context manager must have a name')
-                frame = inspect.currentframe()
-                frames = inspect.getouterframes(frame)
-                outer_frame = frames[1]
-                path = outer_frame[1]
-                line_num = outer_frame[2]
-                request = DataCollector().request
-                self.profile = {
-                    'name': self.name,
-                    'file_path': path,
-                    'line_num': line_num,
-                    'dynamic': self._dynamic,
-                    'request': request,
-                    'start_time': timezone.now(),
-                }
+                path = outer_frame.f_code.co_filename
+                line_num = outer_frame.f_lineno
+                self.profile = CollectedProfile(
+                    self.name,
+                    request=DataCollector().request,
+                    file_path=path,
+                    line_num=line_num,
+                    dynamic=self._dynamic,
+                )
         else:
             logger.warning('Cannot execute silk_profile as silk is not installed correctly.')
 
@@ -110,18 +106,23 @@ class silk_profile:
         self._end_queries()
         assert self.profile, 'no profile was created'
         diff = set(self._queries_after).difference(set(self._queries_before))
-        self.profile['queries'] = diff
+        self.profile.queries = diff
         collector.register_profile(self.profile)
 
     # noinspection PyUnusedLocal
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self._silk_installed() and self._should_profile():
             with silk_meta_profiler():
-                exception_raised = exc_type is not None
-                self.profile['exception_raised'] = exception_raised
-                self.profile['end_time'] = timezone.now()
+                self.profile.exception_raised = exc_type is not None
+                self.profile.finish()
                 self._finalise_queries()
 
+    async def __aenter__(self):
+        self._start_context_profile(inspect.currentframe().f_back)
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return self.__exit__(exc_type, exc_val, exc_tb)
+
     def _silk_installed(self):
         middlewares = getattr(settings, 'MIDDLEWARE', [])
         if not middlewares:
@@ -132,39 +133,65 @@ class silk_profile:
     def _should_profile(self):
         return DataCollector().request is not None
 
+    def _start_function_profile(self, target):
+        try:
+            func_code = target.__code__
+        except AttributeError:
+            raise NotImplementedError('Profile not implemented to decorate type %s' % target.__class__.__name__)
+        line_num = func_code.co_firstlineno
+        file_path = func_code.co_filename
+        func_name = target.__name__
+        if not self.name:
+            self.name = func_name
+        self.profile = CollectedProfile(
+            self.name,
+            request=DataCollector().request,
+            file_path=file_path,
+            line_num=line_num,
+            func_name=func_name,
+            dynamic=self._dynamic,
+        )
+        self._start_queries()
+
+    def _decorate_coroutine_function(self, target):
+        @wraps(target)
+        async def wrapped_target(*args, **kwargs):
+            # Coroutines of the same function run concurrently on one thread,
+            # so each call keeps its state on its own profiler.
+            profiler = silk_profile(name=self.name, _dynamic=self._dynamic)
+            with silk_meta_profiler():
+                profiler._start_function_profile(target)
+            try:
+                result = await target(*args, **kwargs)
+            except Exception:
+                profiler.profile.exception_raised = True
+                raise
+            finally:
+                with silk_meta_profiler():
+                    profiler.profile.finish()
+                    profiler._finalise_queries()
+            return result
+
+        return wrapped_target
+
     def __call__(self, target):
         if self._silk_installed():
+            if inspect.iscoroutinefunction(target):
+                return self._decorate_coroutine_function(target)
+
             def decorator(view_func):
                 @wraps(view_func)
                 def wrapped_target(*args, **kwargs):
                     with silk_meta_profiler():
-                        try:
-                            func_code = target.__code__
-                        except AttributeError:
-                            raise NotImplementedError('Profile not implemented to decorate type %s' % target.__class__.__name__)
-                        line_num = func_code.co_firstlineno
-                        file_path = func_code.co_filename
-                        func_name = target.__name__
-                        if not self.name:
-                            self.name = func_name
-                        self.profile = {
-                            'func_name': func_name,
-                            'name': self.name,
-                            'file_path': file_path,
-                            'line_num': line_num,
-                            'dynamic': self._dynamic,
-                            'start_time': timezone.now(),
-                            'request': DataCollector().request
-                        }
-                        self._start_queries()
+                        self._start_function_profile(target)
                     try:
                         result = target(*args, **kwargs)
                     except Exception:
-                        self.profile['exception_raised'] = True
+                        self.profile.exception_raised = True
                         raise
                     finally:
                         with silk_meta_profiler():
-                            self.profile['end_time'] = timezone.now()
+                            self.profile.finish()
                             self._finalise_queries()
                     return result
 
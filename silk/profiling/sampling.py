@@ -0,0 +1,126 @@
+import contextvars
+import sys
+import threading
+import time
+from collections import Counter
+
+from silk.config import SilkyConfig
+from silk.singleton import Singleton
+
+# After every round of samples the sampler sleeps for at least this many times
+# as long as the round took, so however deep the stacks get it never holds the
+# GIL for more than 1 / (1 + _MIN_IDLE_RATIO) of the time.
+_MIN_IDLE_RATIO = 19
+
+# Bound the cache of frame labels, which keeps the code objects it is keyed on alive
+_MAX_LABELS = 10000
+
+
+def frame_label(code):
+    """Label of a frame in collapsed stacks; ';' separates frames and ' ' precedes the count"""
+    label = '%s (%s:%d)' % (code.co_name, code.co_filename, code.co_firstlineno)
+    return label.replace(';', ',').replace('\n', ' ')
+
+
+class Sampling:
+    """The stacks sampled from one thread while it was registered with the Sampler"""
+
+    __slots__ = ('thread_id', 'stacks', 'overhead', 'start_time', 'end_time')
+
+    def __init__(self, thread_id):
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self.overhead = 0.0  # seconds the sampler spent taking these samples
+        self.start_time = time.perf_counter()
+        self.end_time = None
+
+    @property
+    def num_samples(self):
+        return sum(self.stacks.values())
+
+    @property
+    def duration(self):
+        return (self.end_time or time.perf_counter()) - self.start_time
+
+    def collapsed(self):
+        """The samples in the collapsed stack format used by flame graph tools"""
+        return ''.join('%s %d\n' % item for item in sorted(self.stacks.items()))
+
+
+class Sampler(metaclass=Singleton):
+    """
+    Statistical profiler used when SILKY_PYTHON_PROFILER_MODE is 'sampling'.
+    A single daemon thread looks at the stacks of the registered request
+    threads every SILKY_SAMPLING_INTERVAL seconds using sys._current_frames().
+    Unlike cProfile nothing runs on the request thread between samples, and
+    the time the sampler spends on each request is recorded as its overhead.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._samplings = {}
+        self._labels = {}
+        self._thread = None
+
+    def start(self, thread_id=None):
+        """Start sampling a thread, the current one by default"""
+        sampling = Sampling(thread_id or threading.get_ident())
+        with self._lock:
+            self._samplings[sampling.thread_id] = sampling
+            if self._thread is None:
+                # Run in an empty context so the sampler does not keep the
+                # starting request's context variables alive
+                self._thread = threading.Thread(
+                    target=contextvars.Context().run, args=(self._run,), name='silk-sampler', daemon=True
+                )
+                self._thread.start()
+        return sampling
+
+    def stop(self, sampling):
+        with self._lock:
+            if self._samplings.get(sampling.thread_id) is sampling:
+                del self._samplings[sampling.thread_id]
+            if sampling.end_time is None:
+                sampling.end_time = time.perf_counter()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._samplings:
+                    self._thread = None
+                    return
+            spent = self.sample()
+            time.sleep(max(SilkyConfig().SILKY_SAMPLING_INTERVAL, spent * _MIN_IDLE_RATIO))
+
+    def sample(self):
+        """Take one sample of every registered thread and return the time it took"""
+        started = time.perf_counter()
+        # Hold the lock throughout so that no samples are added once stop() returns
+        with self._lock:
+            samplings = list(self._samplings.values())
+            frames = sys._current_frames()
+            for sampling in samplings:
+                frame = frames.get(sampling.thread_id)
+                if frame is not None:
+                    sampling.stacks[self._fold(frame)] += 1
+            del frames
+            spent = time.perf_counter() - started
+            for sampling in samplings:
+                sampling.overhead += spent / len(samplings)
+        return spent
+
+    def _fold(self, frame):
+        labels = self._labels
+        if len(labels) > _MAX_LABELS:
+            labels.clear()
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            label = labels.get(code)
+            if label is None:
+                label = labels[code] = frame_label(code)
+            names.append(label)
+            frame = frame.f_back
+        names.reverse()
+        return ';'.join(names)
@@ -4,7 +4,7 @@ Django queryset filters used by the requests view
 import logging
 from datetime import datetime, timedelta
 
-from django.db.models import Count, Q, Sum
+from django.db.models import Count, Q
 from django.utils import timezone
 
 from silk.profiling.dynamic import _get_module
@@ -177,8 +177,25 @@ class TimeSpentOnQueriesFilter(BaseFilter):
     def __str__(self):
         return 'DB Time >= %s' % self.value
 
-    def contribute_to_query_set(self, query_set):
-        return query_set.annotate(db_time=Sum('queries__time_taken'))
+
+class NPlusOneFilter(BaseFilter):
+    """requests with at least one N+1 query finding"""
+
+    def __init__(self, value):
+        super().__init__(value, num_n_plus_one__gt=0)
+
+    def __str__(self):
+        return 'N+1 queries'
+
+
+class DatabaseAliasFilter(BaseFilter):
+    """requests that ran at least one query on the given database alias"""
+
+    def __init__(self, alias):
+        super().__init__(alias, queries_by_alias__has_key=alias)
+
+    def __str__(self):
+        return 'database == %s' % self.value
 
 
 class OverallTimeFilter(BaseFilter):
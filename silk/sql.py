@@ -1,12 +1,20 @@
+import json
 import logging
-import traceback
 
-from django.core.exceptions import EmptyResultSet
-from django.utils import timezone
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connections, transaction
 from django.utils.encoding import force_str
 
-from silk.collector import DataCollector
+from silk import models
+from silk.collector import (
+    CollectedQuery,
+    DataCollector,
+    running_own_queries,
+    silk_own_queries,
+)
 from silk.config import SilkyConfig
+from silk.utils.sql_fingerprint import fingerprint
+from silk.utils.stack import capture_stack
 
 Logger = logging.getLogger('silk.sql')
 
@@ -65,46 +73,148 @@ def _explain_query(connection, q, params):
     return None
 
 
-def execute_sql(self, *args, **kwargs):
-    """wrapper around real execute_sql in order to extract information"""
+def _is_explainable(q):
+    """
+    Only SELECTs are explained. EXPLAIN ANALYZE runs the statement again, which
+    would repeat the writes of INSERT, UPDATE and DELETE, and other statements
+    such as DDL or SAVEPOINT cannot be explained at all.
+    """
+    return q.lstrip()[:6].upper() == 'SELECT'
 
+
+def _defer_explain(collected_query, q, params):
+    """Keep what is needed to EXPLAIN a SELECT later, see explain_query"""
+    if not _is_explainable(q):
+        return
     try:
-        q, params = self.as_sql()
-        if not q:
-            raise EmptyResultSet
-    except EmptyResultSet:
-        try:
-            result_type = args[0]
-        except IndexError:
-            result_type = kwargs.get('result_type', 'multi')
-        if result_type == 'multi':
-            return iter([])
-        else:
-            return
+        collected_query.params = json.dumps(params, cls=DjangoJSONEncoder)
+    except TypeError:
+        return
+    collected_query.raw_query = q
+
+
+def explain_query(sql_query):
+    """
+    Return the plan of a query recorded with SILKY_DEFERRED_EXPLAIN, running
+    EXPLAIN on first use. Plans are cached by database alias and query
+    fingerprint, so a statement is explained once however often it runs.
+    """
+    if sql_query.analysis is not None or not sql_query.raw_query:
+        return sql_query.analysis
+    with silk_own_queries():
+        key = models.QueryPlan.key_for(sql_query.using, sql_query.fingerprint or fingerprint(sql_query.raw_query))
+        plan = models.QueryPlan.objects.filter(pk=key).values_list('plan', flat=True).first()
+        if plan is None:
+            connection = connections[sql_query.using]
+            try:
+                with transaction.atomic(using=connection.alias):
+                    plan = _explain_query(connection, sql_query.raw_query, json.loads(sql_query.params))
+            except DatabaseError:
+                Logger.exception('Silk was unable to explain query %s' % sql_query.pk)
+                return None
+            if plan is None:
+                return None
+            models.QueryPlan.objects.bulk_create([models.QueryPlan(key=key, plan=plan)], ignore_conflicts=True)
+        models.SQLQuery.objects.filter(pk=sql_query.pk).update(analysis=plan)
+        sql_query.analysis = plan
+        return plan
+
+
+def install_execute_wrapper(connection, **kwargs):
+    """
+    Add execute_wrapper to a database connection, once. Also connected to
+    the connection_created signal, so that the connections of every thread
+    get it.
+    """
+    if execute_wrapper not in connection.execute_wrappers:
+        # Outermost, so that wrappers pushed and popped by
+        # connection.execute_wrapper() blocks stay on top of the list
+        connection.execute_wrappers.insert(0, execute_wrapper)
+
+
+def install_execute_wrappers():
+    """Add execute_wrapper to the connections of the current thread for every configured alias"""
+    for connection in connections.all():
+        install_execute_wrapper(connection)
+
+
+def _render_query(sql, params):
+    """The statement with its parameters filled in, for display"""
+    if params is None:
+        return sql
+    if isinstance(params, dict):
+        return sql % {key: force_str(value) for key, value in params.items()}
+    return sql % tuple(force_str(param) for param in params)
+
+
+def _record_own_query(execute, sql, params, many, context):
+    if not SilkyConfig().SILKY_META:
+        return execute(sql, params, many, context)
+    collected_query = CollectedQuery(sql)
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        collected_query.finish()
+        DataCollector().register_silk_query(collected_query)
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """
+    Database execute wrapper (see connection.execute_wrapper) that records
+    every statement run while a request is being collected, whether it comes
+    from the ORM, a raw cursor or a third party library, along with its row
+    count and the number of parameter sets of executemany().
+    """
+    if not DataCollector().request:
+        return execute(sql, params, many, context)
+    if running_own_queries():
+        return _record_own_query(execute, sql, params, many, context)
+
+    if many and not isinstance(params, (list, tuple)):
+        params = list(params)
     try:
-        sql_query = q % tuple(force_str(param) for param in params)
+        sql_query = _render_query(sql, (params[0] if params else None) if many else params)
     except UnicodeDecodeError:
         # Sometimes `force_str` can still raise a UnicodeDecodeError
         # Reference: https://github.com/jazzband/django-silk/issues?q=encoding
         # This could log a warning but given this is run in the hot path, logging could be too expensive.
-        return self._execute_sql(*args, **kwargs)
-    if _should_wrap(sql_query):
-        tb = ''.join(reversed(traceback.format_stack()))
-        query_dict = {
-            'query': sql_query,
-            'start_time': timezone.now(),
-            'traceback': tb
-        }
-        try:
-            return self._execute_sql(*args, **kwargs)
-        finally:
-            query_dict['end_time'] = timezone.now()
-            request = DataCollector().request
-            if request:
-                query_dict['request'] = request
-            if getattr(self.query.model, '__module__', '') != 'silk.models':
-                query_dict['analysis'] = _explain_query(self.connection, q, params)
-                DataCollector().register_query(query_dict)
-            else:
-                DataCollector().register_silk_query(query_dict)
-    return self._execute_sql(*args, **kwargs)
+        return execute(sql, params, many, context)
+    except (TypeError, ValueError, KeyError):
+        sql_query = sql
+    if not _should_wrap(sql_query):
+        return execute(sql, params, many, context)
+    max_length = SilkyConfig().SILKY_MAX_QUERY_LENGTH
+    if max_length is not None and len(sql_query) > max_length:
+        sql_query = sql_query[:max_length] + '...'
+
+    connection = context['connection']
+    collected_query = CollectedQuery(
+        sql_query,
+        request=DataCollector().request,
+        traceback=DataCollector().intern_stack(capture_stack(
+            skip=1,
+            max_depth=SilkyConfig().SILKY_TRACEBACK_MAX_DEPTH,
+            app_frames_only=SilkyConfig().SILKY_TRACEBACK_APP_FRAMES_ONLY,
+        )),
+        using=connection.alias,
+        vendor=connection.vendor,
+        fingerprint=fingerprint(sql),
+        batch_size=len(params) if many else None,
+    )
+    succeeded = False
+    try:
+        result = execute(sql, params, many, context)
+        succeeded = True
+        return result
+    finally:
+        collected_query.finish()
+        rowcount = getattr(context.get('cursor'), 'rowcount', None)
+        if isinstance(rowcount, int) and rowcount >= 0:
+            collected_query.rowcount = rowcount
+        if succeeded and not many:
+            if SilkyConfig().SILKY_DEFERRED_EXPLAIN:
+                _defer_explain(collected_query, sql, params)
+            elif _is_explainable(sql):
+                with silk_own_queries():
+                    collected_query.analysis = _explain_query(connection, sql, params)
+        DataCollector().register_query(collected_query)
@@ -0,0 +1,69 @@
+/*
+ * Renders a tree of {name, value, children} nodes as nested boxes, the width
+ * of every frame proportional to its value. By default the root is at the
+ * top (an icicle graph); the "flame" class on the container turns it upside
+ * down. Clicking a frame zooms in on it and clicking the top frame of a
+ * zoomed graph zooms back out. Frames narrower than FLAME_GRAPH_MIN_WIDTH of
+ * the shown graph are left out. Nodes with a "delta" (see diff_flame_tree)
+ * are coloured red where they grew and blue where they shrank.
+ */
+var FLAME_GRAPH_MIN_WIDTH = 0.001;
+
+function flameGraphColour(node) {
+    if (node.delta !== undefined) {
+        var intensity = Math.min(1, Math.abs(node.delta) * 10);
+        return 'hsl(' + (node.delta > 0 ? 0 : 220) + ', 80%, ' + (95 - 40 * intensity) + '%)';
+    }
+    var hash = 0;
+    for (var i = 0; i < node.name.length; i++) {
+        hash = (hash * 31 + node.name.charCodeAt(i)) | 0;
+    }
+    return 'hsl(' + (10 + Math.abs(hash) % 40) + ', 80%, ' + (55 + Math.abs(hash >> 8) % 15) + '%)';
+}
+
+function flameGraphTitle(node, root) {
+    var unit = root.unit || 'samples';
+    var title = node.name + '\n' + node.value + ' ' + unit + ' (' + (100 * node.value / root.value).toFixed(2) + '%)';
+    if (node.delta !== undefined) {
+        title += '\n' + (node.delta > 0 ? '+' : '') + (100 * node.delta).toFixed(2) + '% of the whole profile compared to the other request';
+    }
+    return title;
+}
+
+function flameGraphNode(node, shown, root, zoom) {
+    var element = document.createElement('div');
+    element.className = 'flame-node';
+
+    var frame = document.createElement('div');
+    frame.className = 'flame-frame';
+    frame.textContent = node.name;
+    frame.title = flameGraphTitle(node, root);
+    frame.style.backgroundColor = flameGraphColour(node);
+    frame.addEventListener('click', function () {
+        zoom(node === shown ? root : node);
+    });
+    element.appendChild(frame);
+
+    var children = document.createElement('div');
+    children.className = 'flame-children';
+    node.children.forEach(function (child) {
+        if (child.value / shown.value < FLAME_GRAPH_MIN_WIDTH) {
+            return;
+        }
+        var childElement = flameGraphNode(child, shown, root, zoom);
+        childElement.style.width = (100 * child.value / node.value) + '%';
+        children.appendChild(childElement);
+    });
+    element.appendChild(children);
+    return element;
+}
+
+function renderFlameGraph(container, root, shown) {
+    shown = shown || root;
+    container.innerHTML = '';
+    if (shown.value) {
+        container.appendChild(flameGraphNode(shown, shown, root, function (node) {
+            renderFlameGraph(container, root, node);
+        }));
+    }
+}
@@ -0,0 +1,53 @@
+/*
+ * Keyset pagination: a ".load-more" link fetches the next page, appends its
+ * ".keyset-items" to the current ones and replaces itself with the link of
+ * the fetched page. The link is followed automatically once it scrolls into
+ * view.
+ */
+function loadMore($link) {
+    if ($link.data('loading')) {
+        return;
+    }
+    $link.data('loading', true);
+    $.get($link.attr('href'), function (html) {
+        var $page = $('<div>').append($.parseHTML(html));
+        var $items = $('.keyset-items').first();
+        $items.append($page.find('.keyset-items').first().children());
+        $('.keyset-count').text($items.children().length);
+        var $next = $page.find('.load-more').first();
+        if ($next.length) {
+            $link.replaceWith($next);
+            observeLoadMore($next);
+        } else {
+            $link.remove();
+        }
+        configureFontColors();
+    }).fail(function () {
+        $link.data('loading', false);
+    });
+}
+
+var loadMoreObserver = 'IntersectionObserver' in window ? new IntersectionObserver(function (entries) {
+    entries.forEach(function (entry) {
+        if (entry.isIntersecting) {
+            loadMoreObserver.unobserve(entry.target);
+            loadMore($(entry.target));
+        }
+    });
+}) : null;
+
+function observeLoadMore($link) {
+    if (loadMoreObserver) {
+        loadMoreObserver.observe($link[0]);
+    }
+}
+
+$(document).ready(function () {
+    $(document).on('click', '.load-more', function (e) {
+        e.preventDefault();
+        loadMore($(this));
+    });
+    $('.load-more').each(function () {
+        observeLoadMore($(this));
+    });
+});
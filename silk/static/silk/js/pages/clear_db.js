@@ -1,7 +1,54 @@
+function showClearStatus(status) {
+    var $msg = $('.msg');
+    if (status.error) {
+        $msg.text('Clearing failed: ' + status.error);
+    } else if (status.running) {
+        var text = 'Clearing...';
+        if (status.step) {
+            text = status.deleted === null ? 'Truncated ' + status.step : 'Deleted ' + status.deleted + ' from ' + status.step;
+        }
+        $msg.text(text);
+    } else {
+        $msg.text('Cleared all silk data.');
+    }
+}
+
+function pollClearStatus(statusUrl) {
+    $.getJSON(statusUrl, function (status) {
+        showClearStatus(status);
+        if (status.running) {
+            setTimeout(function () {
+                pollClearStatus(statusUrl);
+            }, 1000);
+        } else {
+            $('.cleardb-form .btn').prop('disabled', false);
+        }
+    });
+}
+
 $(document).ready(function () {
     initFilters();
     var $inputs = $('.resizing-input');
     $inputs.focusout(function () {
         $('#filter-form').submit();
     });
+
+    // Clear in the background and follow its progress instead of waiting on the response
+    var $form = $('.cleardb-form');
+    var statusUrl = $form.data('status-url');
+    $form.submit(function (e) {
+        if (!$form.find('input[name="clear_all"]').is(':checked')) {
+            return;
+        }
+        e.preventDefault();
+        $form.find('.btn').prop('disabled', true);
+        $.post($form.attr('action'), $form.serialize() + '&background=1', function (status) {
+            showClearStatus(status);
+            pollClearStatus(statusUrl);
+        });
+    });
+    if ($form.data('running')) {
+        $form.find('.btn').prop('disabled', true);
+        pollClearStatus(statusUrl);
+    }
 });
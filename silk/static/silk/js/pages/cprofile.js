@@ -0,0 +1,28 @@
+var flameGraphRoot = null;
+
+function loadFlameGraph() {
+    var flameGraphURL = JSON.parse(document.getElementById('flameGraphURL').textContent);
+    var compare = $('#flamegraph-compare').val();
+
+    $.get(
+        flameGraphURL,
+        compare ? { compare: compare } : {},
+        function (response) {
+            flameGraphRoot = response.tree;
+            renderFlameGraph(document.getElementById('flamegraph'), flameGraphRoot);
+        }
+    );
+}
+
+$(document).ready(function () {
+    $('#flamegraph-orientation').on('change', function () {
+        $('#flamegraph').toggleClass('flame', $(this).val() === 'flame');
+    });
+    $('#flamegraph-compare').on('change', loadFlameGraph);
+    $('#flamegraph-reset').on('click', function () {
+        if (flameGraphRoot) {
+            renderFlameGraph(document.getElementById('flamegraph'), flameGraphRoot);
+        }
+    });
+    loadFlameGraph();
+});
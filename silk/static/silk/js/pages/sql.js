@@ -1,17 +1,20 @@
 $(document).ready(function () {
-  document.querySelectorAll(".data-row").forEach((rowElement) => {
+  // Delegated so that rows appended by "load more" are handled as well
+  document.addEventListener("mouseup", (e) => {
+    let rowElement = e.target.closest(".data-row");
+    if (!rowElement) {
+      return;
+    }
     let sqlDetailUrl = rowElement.dataset.sqlDetailUrl;
-    rowElement.addEventListener("mouseup", (e) => {
-      switch (e.button) {
-        case 0:
-          window.location = sqlDetailUrl;
-          break;
-        case 1:
-          window.open(sqlDetailUrl);
-          break;
-        default:
-          break;
-      }
-    });
+    switch (e.button) {
+      case 0:
+        window.location = sqlDetailUrl;
+        break;
+      case 1:
+        window.open(sqlDetailUrl);
+        break;
+      default:
+        break;
+    }
   });
 });
@@ -1,11 +1,14 @@
 from django.urls import path
 
-from silk.views.clear_db import ClearDBView
+from silk.views.clear_db import ClearDBStatusView, ClearDBView
 from silk.views.cprofile import CProfileView
+from silk.views.flamegraph import FlameGraphView
+from silk.views.latency import LatencyView
 from silk.views.profile_detail import ProfilingDetailView
 from silk.views.profile_dot import ProfileDotView
 from silk.views.profile_download import ProfileDownloadView
 from silk.views.profiling import ProfilingView
+from silk.views.query_patterns import QueryPatternsView
 from silk.views.raw import Raw
 from silk.views.request_detail import RequestView
 from silk.views.requests import RequestsView
@@ -47,6 +50,11 @@ urlpatterns = [
         view=ProfileDotView.as_view(),
         name='request_profile_dot',
     ),
+    path(
+        route='request/<uuid:request_id>/flamegraph/',
+        view=FlameGraphView.as_view(),
+        name='request_flamegraph',
+    ),
     path(
         route='request/<uuid:request_id>/profiling/',
         view=ProfilingView.as_view(),
@@ -83,7 +91,14 @@ urlpatterns = [
         name='profile_sql_detail',
     ),
     path(route='profiling/', view=ProfilingView.as_view(), name='profiling'),
+    path(route='latency/', view=LatencyView.as_view(), name='latency'),
+    path(
+        route='query_patterns/',
+        view=QueryPatternsView.as_view(),
+        name='query_patterns',
+    ),
     path(route='cleardb/', view=ClearDBView.as_view(), name='cleardb'),
+    path(route='cleardb/status/', view=ClearDBStatusView.as_view(), name='cleardb_status'),
     path(
         route='request/<uuid:request_id>/cprofile/',
         view=CProfileView.as_view(),
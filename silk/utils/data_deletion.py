@@ -1,8 +1,37 @@
+import contextvars
+import functools
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from django.conf import settings
-from django.db import connections
+from django.db import connections, router, transaction
+
+from silk.singleton import Singleton
+from silk.utils.profile_cache import invalidate, invalidate_all
+
+Logger = logging.getLogger('silk.utils.data_deletion')
+
 
+def raw_delete(queryset, using=None):
+    """
+    Delete the rows matched by a queryset with a single DELETE statement and
+    return the number deleted. QuerySet.delete() loads every row to run the
+    deletion collector and signals, which logged data does not need, so this
+    is the one place relying on the private QuerySet._raw_delete.
+    """
+    using = using or queryset.db
+    return queryset.using(using)._raw_delete(using)
 
-def delete_model(model):
+
+def delete_model(model, chunk_size=10000, progress=None):
+    """
+    Delete every row of a model's table without loading them. Returns the
+    number of rows deleted, or None when the table was truncated. progress
+    is called with the table name and the number of rows deleted so far.
+    """
     engine = settings.DATABASES[model.objects.db]['ENGINE']
     table = model._meta.db_table
     if 'mysql' in engine or 'postgresql' in engine:
@@ -16,13 +45,180 @@ def delete_model(model):
                 cursor.execute(f"ALTER TABLE {table} DISABLE TRIGGER USER;")
                 cursor.execute(f"TRUNCATE TABLE {table} CASCADE")
                 cursor.execute(f"ALTER TABLE {table} ENABLE TRIGGER USER;")
-        return
+        if progress is not None:
+            progress(table, None)
+        return None
 
     # Manually delete rows because sqlite does not support TRUNCATE and
-    # oracle doesn't provide good support for disabling foreign key checks
+    # oracle doesn't provide good support for disabling foreign key checks.
+    # Each chunk is a single DELETE ... WHERE pk IN (SELECT pk ... LIMIT n)
+    # that bypasses Django's deletion collector and signals.
+    num_deleted = 0
     while True:
-        items_to_delete = list(
-            model.objects.values_list('pk', flat=True).all()[:800])
-        if not items_to_delete:
+        chunk = model.objects.filter(pk__in=model.objects.values('pk')[:chunk_size])
+        deleted = raw_delete(chunk)
+        if not deleted:
+            return num_deleted
+        num_deleted += deleted
+        if progress is not None:
+            progress(table, num_deleted)
+
+
+def _models_to_clear():
+    """Every model holding logged data, children before the models they refer to"""
+    from silk import models
+
+    return [
+        models.Profile.queries.through,
+        models.Profile,
+        models.NPlusOneFinding,
+        models.SQLQuery,
+        models.Traceback,
+        models.QueryPlan,
+        models.RequestRollup,
+        models.LatencyHistogram,
+        models.DatabaseRollup,
+        models.Response,
+        models.Request,
+    ]
+
+
+def _delete_file(storage, name):
+    try:
+        storage.delete(name)
+    except Exception:
+        Logger.exception('Could not delete profile %s' % name)
+        return False
+    return True
+
+
+def delete_profile_files(batch_size=1000, max_workers=8, progress=None):
+    """
+    Delete the binary profile of every request through its storage, several
+    files at a time since most of the time is spent waiting on the storage.
+    Returns the number of files deleted.
+    """
+    from silk import models
+
+    storage = models.Request._meta.get_field('prof_file').storage
+    names = models.Request.objects.exclude(prof_file='').values_list('prof_file', flat=True).iterator(
+        chunk_size=batch_size
+    )
+    num_deleted = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            batch = list(itertools.islice(names, batch_size))
+            if not batch:
+                return num_deleted
+            num_deleted += sum(executor.map(functools.partial(_delete_file, storage), batch))
+            if progress is not None:
+                progress('profile files', num_deleted)
+
+
+def clear_all(delete_profiles=False, progress=None):
+    """Delete all logged data, and the binary profiles first if delete_profiles"""
+    if delete_profiles:
+        delete_profile_files(progress=progress)
+    for model in _models_to_clear():
+        delete_model(model, progress=progress)
+    invalidate_all()
+
+
+class ClearJob(metaclass=Singleton):
+    """
+    Runs clear_all in a background thread of this process and keeps its
+    progress for ClearDBStatusView.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.RLock()
+        self._thread = None
+        self._status = {'running': False, 'step': None, 'deleted': None, 'error': None}
+
+    @property
+    def status(self):
+        with self._lock:
+            return dict(self._status)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, delete_profiles=False):
+        """Start clearing, returns False if a clear is already running"""
+        with self._lock:
+            if self.running:
+                return False
+            self._status = {'running': True, 'step': None, 'deleted': None, 'error': None}
+            # Run in an empty context so the thread does not inherit the
+            # collector state of the request that started it
+            self._thread = threading.Thread(
+                target=contextvars.Context().run, args=(self._run, delete_profiles), name='silk-clear', daemon=True,
+            )
+            self._thread.start()
+        return True
+
+    def _progress(self, step, deleted):
+        with self._lock:
+            self._status.update(step=step, deleted=deleted)
+
+    def _run(self, delete_profiles):
+        error = None
+        try:
+            clear_all(delete_profiles, progress=self._progress)
+        except Exception as e:
+            Logger.exception('Clearing the silk tables failed')
+            error = str(e)
+        finally:
+            connections.close_all()
+            with self._lock:
+                self._status.update(running=False, error=error)
+
+
+def _delete_request_ids(ids, using):
+    """
+    Delete the requests with the given primary keys and the rows that refer
+    to them, children first, with plain DELETE statements that neither load
+    the rows nor send signals.
+    """
+    from silk import models
+
+    num_rows = 0
+    with transaction.atomic(using=using):
+        for field in ('max_time_taken_request', 'max_num_queries_request', 'max_db_time_request'):
+            models.RequestRollup.objects.using(using).filter(**{'%s__in' % field: ids}).update(**{field: None})
+        through = models.Profile.queries.through
+        for queryset in (
+            through.objects.filter(profile__request__in=ids),
+            models.Profile.objects.filter(request__in=ids),
+            models.NPlusOneFinding.objects.filter(request__in=ids),
+            models.SQLQuery.objects.filter(request__in=ids),
+            models.Response.objects.filter(request__in=ids),
+            models.Request.objects.filter(pk__in=ids),
+        ):
+            num_rows += raw_delete(queryset, using)
+    invalidate(ids)
+    return num_rows
+
+
+def delete_requests(requests, chunk_size=1000, deadline=None, renew=None):
+    """
+    Delete a queryset of requests along with their responses, queries,
+    profiles and findings, oldest first and chunk_size requests per
+    transaction so that no single statement or lock covers the whole set.
+    No chunk is started after deadline, a time.monotonic() value, nor once
+    renew, called after every chunk e.g. to extend a lease, returns False.
+    Returns the number of requests and the number of rows deleted.
+    """
+    using = router.db_for_write(requests.model)
+    num_requests = num_rows = 0
+    while deadline is None or time.monotonic() < deadline:
+        ids = list(requests.using(using).order_by('start_time', 'id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            break
+        num_rows += _delete_request_ids(ids, using)
+        num_requests += len(ids)
+        if renew is not None and not renew():
             break
-        model.objects.filter(pk__in=items_to_delete).delete()
+    return num_requests, num_rows
@@ -0,0 +1,99 @@
+def parse_collapsed(text):
+    """Yield (frames, count) for each line of stacks in the collapsed stack format"""
+    for line in text.splitlines():
+        stack, _, count = line.rpartition(' ')
+        if stack and count.isdigit():
+            yield stack.split(';'), int(count)
+
+
+def flame_tree(text):
+    """
+    Merge collapsed stacks into a tree of {'name', 'value', 'children'} nodes,
+    where value is the number of samples in which the frame was on the stack.
+    Children are ordered by name, as in a flame graph.
+    """
+    root = {'name': 'all', 'value': 0, 'children': {}, 'unit': 'samples'}
+    for frames, count in parse_collapsed(text):
+        root['value'] += count
+        node = root
+        for name in frames:
+            children = node['children']
+            if name not in children:
+                children[name] = {'name': name, 'value': 0, 'children': {}}
+            node = children[name]
+            node['value'] += count
+    return _sorted_children(root)
+
+
+def _sorted_children(node):
+    node['children'] = [_sorted_children(child) for _, child in sorted(node['children'].items())]
+    return node
+
+
+def frame_name(func):
+    """Label of a pstats function key, in the same format as the frames of sampled stacks"""
+    filename, line, name = func
+    if filename == '~':  # built-in functions
+        return name
+    return '%s (%s:%d)' % (name, filename, line)
+
+
+def stats_flame_tree(stats, min_fraction=0.001):
+    """
+    Build the same tree as flame_tree from cProfile stats (pstats.Stats.stats),
+    with values in milliseconds. cProfile only records caller/callee pairs
+    rather than whole stacks, so the time of a function is split between the
+    places it was called from in proportion to the time of each call edge.
+    Frames taking less than min_fraction of the total time are left out,
+    which also bounds the size of the tree.
+    """
+    callees = {}
+    roots = []
+    for func, (_, _, _, cumulative, callers) in stats.items():
+        # Calls made directly by frames that were already running when the
+        # profiler was enabled are not recorded as call edges
+        untracked = cumulative - sum(edge[3] for caller, edge in callers.items() if caller != func)
+        if untracked > 0:
+            roots.append((frame_name(func), func, untracked))
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((frame_name(func), func, edge[3]))
+    for calls in callees.values():
+        calls.sort()
+    roots.sort()
+    total = sum(time for _, _, time in roots)
+    min_time = total * min_fraction
+
+    def node(name, func, time, path):
+        children = []
+        func_time = stats[func][3]
+        for child_name, child, edge_time in callees.get(func, ()) if func_time else ():
+            child_time = min(time, edge_time * time / func_time)
+            if child_time >= min_time and child not in path:
+                children.append(node(child_name, child, child_time, path | {child}))
+        return {'name': name, 'value': round(time * 1000, 3), 'children': children}
+
+    return {
+        'name': 'all',
+        'value': round(total * 1000, 3),
+        'children': [node(name, func, time, frozenset([func])) for name, func, time in roots if time >= min_time],
+        'unit': 'ms',
+    }
+
+
+def diff_flame_tree(tree, baseline):
+    """
+    Mark every frame of tree with 'delta', the change in the share of the
+    whole profile taken by the same stack compared to baseline. It is
+    positive where the frame takes a larger share than in baseline.
+    """
+    def annotate(node, base):
+        base_children = {child['name']: child for child in base['children']} if base else {}
+        base_share = base['value'] / base_total if base else 0
+        node['delta'] = round(node['value'] / total - base_share, 4)
+        for child in node['children']:
+            annotate(child, base_children.get(child['name']))
+
+    total = tree['value'] or 1
+    base_total = baseline['value'] or 1
+    annotate(tree, baseline)
+    return tree
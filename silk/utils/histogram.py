@@ -0,0 +1,43 @@
+"""
+Fixed log-scale latency bins. A histogram is a mapping of bin index to count
+and histograms are merged by adding counts bin by bin, so histograms written
+by separate processes or servers combine exactly. Percentiles read from a
+histogram are within RELATIVE_ACCURACY of the true value (as in DDSketch).
+"""
+import math
+
+RELATIVE_ACCURACY = 0.02
+_gamma = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_log_gamma = math.log(_gamma)
+MIN_VALUE = 0.01  # milliseconds, smaller values share the lowest bin
+
+
+def bin_for(value):
+    """Index of the bin a latency in milliseconds falls into"""
+    return math.ceil(math.log(max(value, MIN_VALUE)) / _log_gamma)
+
+
+def bin_value(index):
+    """Representative latency of a bin"""
+    return 2 * _gamma ** index / (_gamma + 1)
+
+
+def percentiles(counts, quantiles):
+    """
+    Estimate quantiles (0-1) from (bin index, count) pairs, returns a list
+    with one value per quantile, None if the histogram is empty
+    """
+    counts = sorted(counts)
+    total = sum(count for _, count in counts)
+    if not total:
+        return [None] * len(quantiles)
+    values = []
+    for quantile in quantiles:
+        rank = quantile * (total - 1)
+        seen = 0
+        for index, count in counts:
+            seen += count
+            if seen > rank:
+                values.append(bin_value(index))
+                break
+    return values
@@ -1,15 +1,103 @@
-from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections
+from django.db.models import Q
+
+from silk.config import SilkyConfig
 
 __author__ = 'mtford'
 
 
-def _page(request, query_set, per_page=200):
-    paginator = Paginator(query_set, per_page)
-    page_number = request.GET.get('page')
+class KeysetPage(Sequence):
+    """A page of objects and the cursor that continues after its last object"""
+
+    def __init__(self, object_list, next_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _encode_cursor(field, value, pk):
+    # str() keeps the microseconds of datetimes, which DjangoJSONEncoder drops
+    data = json.dumps([field, value, pk], default=str)
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def _decode_cursor(query_set, field, cursor):
+    """The (value, pk) of a cursor, or None if it is malformed or was made for another ordering"""
     try:
-        page = paginator.page(page_number)
-    except PageNotAnInteger:
-        page = paginator.page(1)
-    except EmptyPage:
-        page = paginator.page(paginator.num_pages)
-    return page
+        cursor_field, value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeError, TypeError, ValueError):
+        return None
+    if cursor_field != field:
+        return None
+    opts = query_set.model._meta
+    try:
+        try:
+            value = opts.get_field(field).to_python(value)
+        except FieldDoesNotExist:
+            # annotations are numeric and survive the JSON round trip
+            pass
+        pk = opts.pk.to_python(pk)
+    except ValidationError:
+        return None
+    return value, pk
+
+
+def _keyset_page(query_set, order_by, cursor=None, per_page=200):
+    """
+    Page through query_set ordered by order_by (a field or annotation name,
+    prefixed with '-' for descending order) and the primary key as a tie
+    breaker. Unlike OFFSET pagination each page is found with an index seek
+    whatever its depth, and pages do not shift when new rows are recorded.
+    Rows with a null order_by value are left out.
+    """
+    field = order_by.lstrip('-')
+    descending = order_by.startswith('-')
+    query_set = query_set.filter(**{'%s__isnull' % field: False})
+    position = _decode_cursor(query_set, field, cursor) if cursor else None
+    if position is not None:
+        value, pk = position
+        lookup = 'lt' if descending else 'gt'
+        query_set = query_set.filter(
+            Q(**{'{}__{}'.format(field, lookup): value}) | Q(**{field: value, 'pk__%s' % lookup: pk})
+        )
+    pk_order = '-pk' if descending else 'pk'
+    # fetch one extra row to find out whether there is a next page
+    object_list = list(query_set.order_by(order_by, pk_order)[:per_page + 1])
+    next_cursor = None
+    if len(object_list) > per_page:
+        object_list = object_list[:per_page]
+        last = object_list[-1]
+        next_cursor = _encode_cursor(field, getattr(last, field), last.pk)
+    return KeysetPage(object_list, next_cursor)
+
+
+def _count(query_set):
+    """
+    The number of rows in query_set. With SILKY_ESTIMATED_COUNTS enabled the
+    PostgreSQL planner's estimate is used instead of running COUNT(*).
+    """
+    connection = connections[query_set.db]
+    if SilkyConfig().SILKY_ESTIMATED_COUNTS and connection.vendor == 'postgresql':
+        sql, params = query_set.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]['Plan']['Plan Rows']
+    return query_set.count()
@@ -0,0 +1,76 @@
+from uuid import uuid4
+
+from django.core.cache import caches
+
+from silk.config import SilkyConfig
+
+_GENERATION_KEY = 'silk:profile:generation'
+
+
+def _cache():
+    alias = SilkyConfig().SILKY_PROFILE_CACHE
+    return caches[alias] if alias else None
+
+
+def _request_generation_key(request_id):
+    """Key of the generation of the entries cached for a request"""
+    return 'silk:profile:request-generation:%s' % request_id
+
+
+def cache_key(generation, kind, request_id, *args):
+    return ':'.join(['silk', 'profile', str(generation), kind, str(request_id)] + [str(arg) for arg in args])
+
+
+def _generation(cache, request_id):
+    """
+    The generation of the entries cached for a request, combined with the one
+    of all requests. A request's generation is a random token created with
+    cache.add(), so concurrent readers agree on it without a read-modify-write.
+    """
+    request_key = _request_generation_key(request_id)
+    generations = cache.get_many([_GENERATION_KEY, request_key])
+    request_generation = generations.get(request_key)
+    if request_generation is None:
+        cache.add(request_key, uuid4().hex, timeout=None)
+        request_generation = cache.get(request_key)
+    return '%s-%s' % (generations.get(_GENERATION_KEY, 0), request_generation)
+
+
+def get_or_compute(compute, kind, request_id, *args):
+    """
+    Return what compute() returns for a request, cached in the
+    SILKY_PROFILE_CACHE cache. The profile data of a request does not change
+    once it has been written, so entries stay valid until the request is
+    deleted, see invalidate() and invalidate_all().
+    """
+    cache = _cache()
+    if cache is None:
+        return compute()
+    key = cache_key(_generation(cache, request_id), kind, request_id, *args)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value)
+    return value
+
+
+def invalidate(request_ids):
+    """
+    Drop everything cached for the given requests. Their generations are
+    deleted, so their entries are no longer looked up and expire from the cache.
+    """
+    cache = _cache()
+    if cache is None:
+        return
+    cache.delete_many([_request_generation_key(request_id) for request_id in request_ids])
+
+
+def invalidate_all():
+    """Drop everything cached for all requests, by moving on to new cache keys"""
+    cache = _cache()
+    if cache is None:
+        return
+    try:
+        cache.incr(_GENERATION_KEY)
+    except ValueError:
+        cache.set(_GENERATION_KEY, 1, timeout=None)
@@ -0,0 +1,28 @@
+import hashlib
+import re
+
+_string_literal = re.compile(r"'(?:[^']|'')*'")
+_number_literal = re.compile(r'(?<![\w."])-?\d+(?:\.\d+)?\b')
+_placeholder = re.compile(r'%(?:\([^)]*\))?s')
+_whitespace = re.compile(r'\s+')
+_value_list = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_repeated_value_lists = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+
+
+def normalize_sql(sql):
+    """
+    Reduce a query to its shape: literals and placeholders become '?' and
+    lists of values (IN lists, multi-row VALUES) collapse to '(...)', so the
+    same statement run with different parameters normalizes to the same text.
+    """
+    sql = _string_literal.sub('?', sql)
+    sql = _placeholder.sub('?', sql)
+    sql = _number_literal.sub('?', sql)
+    sql = _whitespace.sub(' ', sql).strip()
+    sql = _value_list.sub('(...)', sql)
+    return _repeated_value_lists.sub('(...)', sql)
+
+
+def fingerprint(sql):
+    """sha1 of the normalized query"""
+    return hashlib.sha1(normalize_sql(sql).encode('utf-8')).hexdigest()
@@ -0,0 +1,41 @@
+import os
+import sys
+import sysconfig
+
+# Frames from these directories belong to the standard library or installed
+# packages rather than to the profiled application.
+_library_paths = tuple({
+    sysconfig.get_paths()[name]
+    for name in ('stdlib', 'platstdlib', 'purelib', 'platlib')
+})
+_silk_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+
+
+def capture_stack(skip=0, max_depth=None, app_frames_only=False):
+    """
+    Capture the current stack as a tuple of (filename, lineno, funcname)
+    tuples, innermost frame first. Unlike traceback.format_stack this does not
+    read any source lines, so it is cheap enough to run for every query.
+    """
+    frame = sys._getframe(skip + 1)
+    stack = []
+    while frame is not None and (max_depth is None or len(stack) < max_depth):
+        code = frame.f_code
+        if not (app_frames_only and code.co_filename.startswith(_library_paths)):
+            stack.append((code.co_filename, frame.f_lineno, code.co_name))
+        frame = frame.f_back
+    return tuple(stack)
+
+
+def format_stack(stack):
+    """Render a captured stack in the same format as the traceback module, without source lines"""
+    return '\n'.join('  File "%s", line %d, in %s' % frame for frame in stack)
+
+
+def first_app_frame(stack):
+    """The innermost frame of a captured stack that belongs to the profiled application"""
+    for frame in stack:
+        filename = frame[0]
+        if not filename.startswith(_library_paths) and not filename.startswith(_silk_path):
+            return frame
+    return None
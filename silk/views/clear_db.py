@@ -1,15 +1,12 @@
-import os
-import shutil
-
 from django.db import transaction
+from django.http import JsonResponse
 from django.shortcuts import render
 from django.utils.decorators import method_decorator
 from django.views.generic import View
 
 from silk.auth import login_possibly_required, permissions_possibly_required
 from silk.config import SilkyConfig
-from silk.models import Profile, Request, Response, SQLQuery
-from silk.utils.data_deletion import delete_model
+from silk.utils.data_deletion import ClearJob, clear_all
 
 
 @method_decorator(transaction.non_atomic_requests, name="dispatch")
@@ -18,28 +15,32 @@ class ClearDBView(View):
     @method_decorator(login_possibly_required)
     @method_decorator(permissions_possibly_required)
     def get(self, request, *_, **kwargs):
-        return render(request, 'silk/clear_db.html')
+        return render(request, 'silk/clear_db.html', {'status': ClearJob().status})
 
     @method_decorator(login_possibly_required)
     @method_decorator(permissions_possibly_required)
     def post(self, request, *_, **kwargs):
         context = {}
         if 'clear_all' in request.POST:
-            delete_model(Profile)
-            delete_model(SQLQuery)
-            delete_model(Response)
-            delete_model(Request)
-            tables = ['Response', 'SQLQuery', 'Profile', 'Request']
+            delete_profiles = SilkyConfig().SILKY_DELETE_PROFILES
+            if 'background' in request.POST:
+                # Polled through ClearDBStatusView
+                started = ClearJob().start(delete_profiles)
+                return JsonResponse(dict(ClearJob().status, started=started))
+            clear_all(delete_profiles)
+            tables = ['Response', 'SQLQuery', 'Traceback', 'QueryPlan', 'NPlusOneFinding', 'RequestRollup', 'LatencyHistogram', 'DatabaseRollup', 'Profile', 'Request']
             context['msg'] = 'Cleared data for following silk tables: {}'.format(', '.join(tables))
 
-            if SilkyConfig().SILKY_DELETE_PROFILES:
-                dir = SilkyConfig().SILKY_PYTHON_PROFILER_RESULT_PATH
-                for files in os.listdir(dir):
-                    path = os.path.join(dir, files)
-                    try:
-                        shutil.rmtree(path)
-                    except OSError:
-                        os.remove(path)
-                context['msg'] += '\nDeleted all profiles from the directory.'
+            if delete_profiles:
+                context['msg'] += '\nDeleted all profiles from the storage.'
 
         return render(request, 'silk/clear_db.html', context=context)
+
+
+class ClearDBStatusView(View):
+    """Progress of a clear started in the background, in this process"""
+
+    @method_decorator(login_possibly_required)
+    @method_decorator(permissions_possibly_required)
+    def get(self, request, *_, **kwargs):
+        return JsonResponse(ClearJob().status)
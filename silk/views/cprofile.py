@@ -6,6 +6,20 @@ from silk.auth import login_possibly_required, permissions_possibly_required
 from silk.models import Request
 
 
+def _comparable_requests(silk_request, limit=20):
+    """The latest other profiled requests of the same view, to diff flame graphs against"""
+    if not silk_request.view_name:
+        return []
+    return (
+        Request.objects
+        .filter(view_name=silk_request.view_name)
+        .exclude(pk=silk_request.pk)
+        .exclude(collapsed_stacks='', prof_file='')
+        .only('id', 'start_time', 'time_taken')
+        .order_by('-start_time')[:limit]
+    )
+
+
 class CProfileView(View):
 
     @method_decorator(login_possibly_required)
@@ -16,5 +30,7 @@ class CProfileView(View):
         context = {
             'silk_request': silk_request,
             'request': request}
+        if silk_request.collapsed_stacks or silk_request.prof_file:
+            context['comparable_requests'] = _comparable_requests(silk_request)
 
         return render(request, 'silk/cprofile.html', context)
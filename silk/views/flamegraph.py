@@ -0,0 +1,54 @@
+import json
+import marshal
+from contextlib import closing
+
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views.generic import View
+
+from silk.auth import login_possibly_required, permissions_possibly_required
+from silk.models import Request
+from silk.utils.flamegraph import diff_flame_tree, flame_tree, stats_flame_tree
+from silk.utils.profile_cache import get_or_compute
+
+
+def _read_stats(source):
+    """Load the marshalled pstats data of a django file field"""
+    source.open('rb')
+    with closing(source):
+        return marshal.loads(source.read())
+
+
+def _flame_tree(silk_request):
+    if silk_request.collapsed_stacks:
+        return flame_tree(silk_request.collapsed_stacks)
+    if silk_request.prof_file:
+        return stats_flame_tree(_read_stats(silk_request.prof_file))
+    return None
+
+
+def request_flame_tree(request_id):
+    """The flame graph tree of a request's sampled stacks or binary profile, cached by request id"""
+    def compute():
+        silk_request = get_object_or_404(
+            Request.objects.only('collapsed_stacks', 'prof_file'), pk=request_id
+        )
+        tree = _flame_tree(silk_request)
+        if tree is None:
+            raise Http404('Request %s has no profile' % request_id)
+        return tree
+
+    return get_or_compute(compute, 'flamegraph', request_id)
+
+
+class FlameGraphView(View):
+
+    @method_decorator(login_possibly_required)
+    @method_decorator(permissions_possibly_required)
+    def get(self, request, request_id):
+        tree = request_flame_tree(request_id)
+        compare = request.GET.get('compare')
+        if compare:
+            tree = diff_flame_tree(tree, request_flame_tree(compare))
+        return HttpResponse(json.dumps({'tree': tree}).encode('utf-8'), content_type='application/json')
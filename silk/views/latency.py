@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.db.models import Sum
+from django.shortcuts import render
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.generic import View
+
+from silk.auth import login_possibly_required, permissions_possibly_required
+from silk.models import LatencyHistogram, RequestRollup
+from silk.utils import histogram
+
+
+class LatencyView(View):
+    """Latency percentiles of each view, read from the merged LatencyHistogram rows of a time window"""
+    windows = {
+        '60': 'Last hour',
+        '1440': 'Last day',
+        '10080': 'Last week',
+        '': 'All time',
+    }
+    default_window = '1440'
+    quantiles = (0.5, 0.9, 0.99)
+
+    def _get_views(self, window):
+        histograms = LatencyHistogram.objects.all()
+        if window:
+            since = timezone.now() - timedelta(minutes=int(window))
+            histograms = histograms.filter(bucket__gte=RequestRollup.bucket_for(since))
+        counts = {}
+        for view_name, bin_index, count in histograms.order_by().values_list('view_name', 'bin').annotate(Sum('count')):
+            counts.setdefault(view_name, []).append((bin_index, count))
+        views = []
+        for view_name, view_counts in counts.items():
+            p50, p90, p99 = histogram.percentiles(view_counts, self.quantiles)
+            views.append({
+                'view_name': view_name,
+                'num_requests': sum(count for _, count in view_counts),
+                'p50_time': p50,
+                'p90_time': p90,
+                'p99_time': p99,
+            })
+        return sorted(views, key=lambda view: view['p99_time'], reverse=True)
+
+    @method_decorator(login_possibly_required)
+    @method_decorator(permissions_possibly_required)
+    def get(self, request):
+        window = request.GET.get('window', self.default_window)
+        if window not in self.windows:
+            window = self.default_window
+        context = {
+            'request': request,
+            'options_window': self.windows,
+            'window': window,
+            'views': self._get_views(window),
+        }
+        return render(request, 'silk/latency.html', context)
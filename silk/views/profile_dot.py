@@ -17,6 +17,7 @@ from gprof2dot import DotWriter, PstatsParser, Theme
 # silk
 from silk.auth import login_possibly_required, permissions_possibly_required
 from silk.models import Request
+from silk.utils.profile_cache import get_or_compute
 
 COLOR_MAP = Theme(
     mincolor=(0.18, 0.51, 0.53),
@@ -43,7 +44,24 @@ def _temp_file_from_file_field(source):
             os.unlink(destination.name)
 
 
-def _create_profile(source, get_filename=_temp_file_from_file_field):
+@contextmanager
+def _filename_from_file_field(source):
+    """
+    The path of the file of a django file field when its storage is on the
+    local file system, otherwise a temp file copy of it.
+    """
+    try:
+        path = source.path
+    except NotImplementedError:
+        path = None
+    if path:
+        yield path
+    else:
+        with _temp_file_from_file_field(source) as filename:
+            yield filename
+
+
+def _create_profile(source, get_filename=_filename_from_file_field):
     """
     Parse a profile from a django file field source.
     """
@@ -64,13 +82,27 @@ def _create_dot(profile, cutoff):
         return fp.getvalue()
 
 
+def _cutoff(value, default=5):
+    """
+    The node cutoff as a whole percentage from 0 to 99, as entered on the
+    profile page, so that each request has a bounded number of cached graphs
+    """
+    try:
+        cutoff = round(float(value))
+    except (TypeError, ValueError, OverflowError):
+        return default
+    return min(max(cutoff, 0), 99)
+
+
 class ProfileDotView(View):
 
     @method_decorator(login_possibly_required)
     @method_decorator(permissions_possibly_required)
     def get(self, request, request_id):
         silk_request = get_object_or_404(Request, pk=request_id, prof_file__isnull=False)
-        cutoff = float(request.GET.get('cutoff', '') or 5)
-        profile = _create_profile(silk_request.prof_file)
-        result = dict(dot=_create_dot(profile, cutoff))
+        cutoff = _cutoff(request.GET.get('cutoff'))
+        dot = get_or_compute(
+            lambda: _create_dot(_create_profile(silk_request.prof_file), cutoff), 'dot', request_id, cutoff
+        )
+        result = dict(dot=dot)
         return HttpResponse(json.dumps(result).encode('utf-8'), content_type='application/json')
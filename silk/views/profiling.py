@@ -1,4 +1,4 @@
-from django.db.models import Count, Sum
+from django.db.models import Count
 from django.shortcuts import render
 from django.template.context_processors import csrf
 from django.utils.decorators import method_decorator
@@ -67,7 +67,7 @@ class ProfilingView(View):
         elif order_by == 'Time':
             query_set = query_set.order_by('-time_taken')
         elif order_by == 'Time on queries':
-            query_set = query_set.annotate(db_time=Sum('queries__time_taken')).order_by('-db_time')
+            query_set = query_set.order_by('-db_time')
         elif order_by:
             raise RuntimeError('Unknown order_by: "%s"' % order_by)
         if func_name:
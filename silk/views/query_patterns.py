@@ -0,0 +1,97 @@
+from django.db import connections
+from django.db.models import Aggregate, Avg, Count, F, FloatField, Min, Sum, Window
+from django.db.models.functions import RowNumber
+from django.db.models.lookups import GreaterThanOrEqual, LessThan
+from django.shortcuts import render
+from django.utils.decorators import method_decorator
+from django.views.generic import View
+
+from silk.auth import login_possibly_required, permissions_possibly_required
+from silk.models import SQLQuery
+
+
+class PercentileDisc(Aggregate):
+    """PostgreSQL's nearest-rank percentile of an ordered set, fraction is between 0 and 1"""
+    function = 'PERCENTILE_DISC'
+    template = '%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = FloatField()
+
+
+class QueryPatternsView(View):
+    """SQL queries grouped by fingerprint, i.e. by statement regardless of parameters"""
+    show = [25, 50, 100, 250]
+    default_show = 50
+    order_by = {
+        'total_time': 'Total Time',
+        'count': 'Count',
+        'avg_time': 'Avg. Time',
+        'num_requests': 'Requests',
+    }
+    default_order_by = 'total_time'
+    percentile = 95
+
+    def _percentiles(self, query_fingerprints):
+        """
+        Nearest-rank percentile of time_taken for each fingerprint in a single
+        query, picking the row ranked ceil(percentile / 100 * n) by time_taken
+        """
+        position = Window(RowNumber(), partition_by=[F('fingerprint')], order_by=F('time_taken').asc())
+        num_timed = Window(Count('id'), partition_by=[F('fingerprint')])
+        return dict(
+            SQLQuery.objects.filter(fingerprint__in=query_fingerprints, time_taken__isnull=False)
+            .alias(position=position, num_timed=num_timed)
+            .filter(
+                GreaterThanOrEqual(F('position') * 100, F('num_timed') * self.percentile),
+                LessThan((F('position') - 1) * 100, F('num_timed') * self.percentile),
+            )
+            .values_list('fingerprint', 'time_taken')
+        )
+
+    def _get_patterns(self, show, order_by):
+        # PostgreSQL computes the percentile with the other aggregates,
+        # elsewhere one more query computes it for all the patterns shown
+        grouped_percentile = connections[SQLQuery.objects.db].vendor == 'postgresql'
+        aggregates = {}
+        if grouped_percentile:
+            aggregates['p95_time'] = PercentileDisc('time_taken', fraction=self.percentile / 100)
+        patterns = list(
+            SQLQuery.objects.exclude(fingerprint='').values('fingerprint').annotate(
+                count=Count('id'),
+                num_timed=Count('time_taken'),
+                total_time=Sum('time_taken'),
+                avg_time=Avg('time_taken'),
+                num_requests=Count('request', distinct=True),
+                example_id=Min('id'),
+                **aggregates,
+            ).order_by(F(order_by).desc(nulls_last=True))[:show]
+        )
+        examples = SQLQuery.objects.only('query', 'request_id').in_bulk([p['example_id'] for p in patterns])
+        if not grouped_percentile:
+            percentiles = self._percentiles([p['fingerprint'] for p in patterns if p['num_timed']])
+        for pattern in patterns:
+            pattern['example'] = examples[pattern['example_id']]
+            if not grouped_percentile:
+                pattern['p95_time'] = percentiles.get(pattern['fingerprint'])
+        return patterns
+
+    @method_decorator(login_possibly_required)
+    @method_decorator(permissions_possibly_required)
+    def get(self, request):
+        try:
+            show = int(request.GET.get('show', self.default_show))
+        except (TypeError, ValueError):
+            show = self.default_show
+        if show not in self.show:
+            show = self.default_show
+        order_by = request.GET.get('order_by', self.default_order_by)
+        if order_by not in self.order_by:
+            order_by = self.default_order_by
+        context = {
+            'request': request,
+            'options_show': self.show,
+            'options_order_by': self.order_by,
+            'show': show,
+            'order_by': order_by,
+            'patterns': self._get_patterns(show, order_by),
+        }
+        return render(request, 'silk/query_patterns.html', context)
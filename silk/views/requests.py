@@ -1,12 +1,14 @@
-from django.db.models import Q, Sum
+from django.db.models import Q
 from django.shortcuts import render
 from django.template.context_processors import csrf
 from django.utils.decorators import method_decorator
 from django.views.generic import View
 
 from silk.auth import login_possibly_required, permissions_possibly_required
+from silk.config import SilkyConfig
 from silk.models import Request, Response
 from silk.request_filters import BaseFilter, FiltersManager, filters_from_request
+from silk.utils.pagination import _count, _keyset_page
 
 __author__ = 'mtford'
 
@@ -34,8 +36,7 @@ class RequestsView(View):
         },
         'db_time': {
             'label': 'Time on queries',
-            'additional_query_filter': lambda x: x.annotate(db_time=Sum('queries__time_taken'))
-            .filter(db_time__gte=0)
+            'additional_query_filter': None
         },
     }
     order_dir = {
@@ -107,28 +108,31 @@ class RequestsView(View):
             'method'
         ).distinct()
 
-    def _get_objects(self, show=None, order_by=None, order_dir=None, path=None, filters=None):
-        if not filters:
-            filters = []
-        if not show:
-            show = self.default_show
+    def _filter_objects(self, order_by, path=None, filters=None):
         query_set = Request.objects.all()
-        if not order_by:
-            order_by = self.default_order_by
-        if not order_dir:
-            order_dir = self.default_order_dir
-        if order_by not in self.order_by.keys():
-            raise RuntimeError('Unknown order_by: "%s"' % order_by)
         ob = self.order_by[order_by]
         if ob['additional_query_filter'] is not None:
             query_set = ob['additional_query_filter'](query_set)
-        query_set = query_set.order_by('{}{}'.format('-' if order_dir == 'DESC' else '', order_by))
         if path:
             query_set = query_set.filter(path=path)
-        for f in filters:
+        for f in filters or []:
             query_set = f.contribute_to_query_set(query_set)
             query_set = query_set.filter(f)
-        return query_set[:show]
+        return query_set
+
+    def _get_objects(self, show=None, order_by=None, order_dir=None, path=None, filters=None, cursor=None):
+        if not show:
+            show = self.default_show
+        if not order_by:
+            order_by = self.default_order_by
+        if not order_dir:
+            order_dir = self.default_order_dir
+        if order_by not in self.order_by.keys():
+            raise RuntimeError('Unknown order_by: "%s"' % order_by)
+        query_set = self._filter_objects(order_by, path, filters)
+        return _keyset_page(
+            query_set, '{}{}'.format('-' if order_dir == 'DESC' else '', order_by), cursor, show,
+        )
 
     def _create_context(self, request):
         raw_filters = self.filters_manager.get(request).copy()
@@ -159,8 +163,11 @@ class RequestsView(View):
         context.update(csrf(request))
         if path:
             context['path'] = path
+        filters = [BaseFilter.from_dict(x) for _, x in raw_filters.items()]
         context['results'] = self._get_objects(show, order_by, order_dir, path,
-                                               filters=[BaseFilter.from_dict(x) for _, x in raw_filters.items()])
+                                               filters=filters, cursor=request.GET.get('cursor'))
+        if SilkyConfig().SILKY_ESTIMATED_COUNTS:
+            context['count'] = _count(self._filter_objects(order_by, path, filters))
         return context
 
     @method_decorator(login_possibly_required)
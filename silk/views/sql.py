@@ -4,7 +4,7 @@ from django.views.generic import View
 
 from silk.auth import login_possibly_required, permissions_possibly_required
 from silk.models import Profile, Request, SQLQuery
-from silk.utils.pagination import _page
+from silk.utils.pagination import _count, _keyset_page
 
 __author__ = 'mtford'
 
@@ -22,6 +22,7 @@ class SQLView(View):
             per_page = int(request.GET.get('per_page', self.default_page_size))
         except (TypeError, ValueError):
             per_page = self.default_page_size
+        cursor = request.GET.get('cursor')
         context = {
             'request': request,
             'options_page_size': self.page_sizes,
@@ -29,15 +30,16 @@ class SQLView(View):
         }
         if request_id:
             silk_request = Request.objects.get(id=request_id)
-            query_set = SQLQuery.objects.filter(request=silk_request).order_by('-start_time')
-            for q in query_set:
+            page = _keyset_page(SQLQuery.objects.filter(request=silk_request), '-start_time', cursor, per_page)
+            for q in page:
                 q.start_time_relative = q.start_time - silk_request.start_time
-            page = _page(request, query_set, per_page)
             context['silk_request'] = silk_request
+            context['count'] = silk_request.num_sql_queries
         if profile_id:
             p = Profile.objects.get(id=profile_id)
-            page = _page(request, p.queries.order_by('-start_time').all(), per_page)
+            page = _keyset_page(p.queries.all(), '-start_time', cursor, per_page)
             context['profile'] = p
+            context['count'] = _count(p.queries.all())
         if not (request_id or profile_id):
             raise KeyError('no profile_id or request_id')
         # noinspection PyUnboundLocalVariable
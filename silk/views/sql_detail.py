@@ -9,6 +9,7 @@ from django.views.generic import View
 
 from silk.auth import login_possibly_required, permissions_possibly_required
 from silk.models import Profile, Request, SQLQuery
+from silk.sql import explain_query
 from silk.views.code import _code
 
 
@@ -47,7 +48,7 @@ class SQLDetailView(View):
         file_path = request.GET.get('file_path', '')
         line_num = int(request.GET.get('line_num', 0))
         tb = sql_query.traceback_ln_only
-        analysis = sql_query.analysis
+        analysis = explain_query(sql_query)
         str, files = self._urlify(tb)
         if file_path and file_path not in files:
             raise PermissionDenied
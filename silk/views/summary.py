@@ -1,4 +1,17 @@
-from django.db.models import Avg, Count, Max, Sum
+from django.conf import settings
+from django.db.models import (
+    Avg,
+    Count,
+    F,
+    FloatField,
+    IntegerField,
+    Max,
+    Q,
+    Sum,
+    Window,
+)
+from django.db.models.fields.json import KeyTextTransform, KeyTransform
+from django.db.models.functions import Cast, RowNumber
 from django.shortcuts import render
 from django.template.context_processors import csrf
 from django.utils.decorators import method_decorator
@@ -18,7 +31,7 @@ class SummaryView(View):
         return queries__aggregate['num']
 
     def _avg_time_spent_on_queries(self, filters):
-        taken__aggregate = models.Request.objects.filter(*filters).annotate(time_spent=Sum('queries__time_taken')).aggregate(num=Avg('time_spent'))
+        taken__aggregate = models.Request.objects.filter(*filters).aggregate(num=Avg('db_time'))
         return taken__aggregate['num']
 
     def _avg_overall_time(self, filters):
@@ -35,12 +48,12 @@ class SummaryView(View):
         return sorted(requests, key=lambda item: item.time_taken, reverse=True)
 
     def _time_spent_in_db_by_view(self, filters):
-        values_list = models.Request.objects.filter(*filters).values_list('view_name').annotate(t=Sum('queries__time_taken')).filter(t__gte=0).order_by('-t')[:5]
+        values_list = models.Request.objects.filter(*filters).values_list('view_name').annotate(t=Sum('db_time')).filter(t__gt=0).order_by('-t')[:5]
         requests = []
         for view, _ in values_list:
-            r = models.Request.objects.filter(view_name=view, *filters).annotate(t=Sum('queries__time_taken')).filter(t__isnull=False).order_by('-t')[0]
+            r = models.Request.objects.filter(view_name=view, *filters).order_by('-db_time')[0]
             requests.append(r)
-        return sorted(requests, key=lambda item: item.t, reverse=True)
+        return sorted(requests, key=lambda item: item.db_time, reverse=True)
 
     def _num_queries_by_view(self, filters):
         queryset = models.Request.objects.filter(*filters).values_list('view_name').annotate(t=Count('queries')).order_by('-t')[:5]
@@ -54,22 +67,124 @@ class SummaryView(View):
                 pass
         return sorted(requests, key=lambda item: item.t, reverse=True)
 
-    def _create_context(self, request):
-        raw_filters = self.filters_manager.get(request)
-        filters = [BaseFilter.from_dict(filter_d) for _, filter_d in raw_filters.items()]
+    def _queries_by_alias(self, filters):
+        """
+        Number of queries and time spent on each database alias by the filtered
+        requests, summed by the database from the breakdown stored on each request
+        """
+        aliases = list(settings.DATABASES)
+        aggregates = {}
+        for i, using in enumerate(aliases):
+            breakdown = KeyTransform(using, 'queries_by_alias')
+            aggregates[f'vendor_{i}'] = Max(KeyTextTransform('vendor', breakdown))
+            aggregates[f'num_queries_{i}'] = Sum(Cast(KeyTextTransform('num_queries', breakdown), IntegerField()))
+            aggregates[f'time_{i}'] = Sum(Cast(KeyTextTransform('time', breakdown), FloatField()))
+        totals = models.Request.objects.filter(*filters).aggregate(**aggregates)
+        by_alias = [
+            {
+                'using': using,
+                'vendor': totals[f'vendor_{i}'],
+                'num_queries': totals[f'num_queries_{i}'],
+                'time': totals[f'time_{i}'] or 0,
+            }
+            for i, using in enumerate(aliases)
+            if totals[f'num_queries_{i}']
+        ]
+        return sorted(by_alias, key=lambda db: db['time'], reverse=True)
+
+    def _queries_by_alias_from_rollups(self, filters):
+        return list(
+            models.DatabaseRollup.objects.filter(*filters).values('using', 'vendor')
+            .annotate(num_queries=Sum('num_queries'), time=Sum('time')).order_by('-time')
+        )
+
+    @staticmethod
+    def _rollup_filters(filters):
+        """
+        Translate the request filters to RequestRollup filters, or return None
+        if a filter is on anything but the start time, which rollups do not have
+        """
+        rollup_filters = []
+        for f in filters:
+            lookups = []
+            for lookup, value in f.children:
+                field, _, operator = lookup.partition('__')
+                if field != 'start_time':
+                    return None
+                lookups.append((f'bucket__{operator}', models.RequestRollup.bucket_for(value)))
+            rollup_filters.append(Q(*lookups))
+        return rollup_filters
+
+    def _top_views_from_rollups(self, rollups, field, order_by=None):
+        """
+        The request holding the maximum of `field` for the 5 views with the
+        highest maximum, or the highest `order_by` sum if given
+        """
+        rollups = rollups.annotate(rank=Window(
+            RowNumber(), partition_by=[F('view_name')], order_by=F(field).desc(),
+        ))
+        if order_by:
+            rollups = rollups.annotate(view_total=Window(Sum(order_by), partition_by=[F('view_name')]))
+        rollups = rollups.filter(rank=1).order_by('-view_total' if order_by else f'-{field}')
+        request_ids = [request_id for request_id in rollups.values_list(f'{field}_request', flat=True)[:5] if request_id]
+        requests = models.Request.objects.in_bulk(request_ids)
+        return [requests[request_id] for request_id in request_ids if request_id in requests]
+
+    def _summary_from_rollups(self, filters):
+        rollups = models.RequestRollup.objects.filter(*filters)
+        totals = rollups.aggregate(
+            num_requests=Sum('num_requests'),
+            time_taken=Sum('time_taken'),
+            num_queries=Sum('num_queries'),
+            db_time=Sum('db_time'),
+        )
+        num_requests = totals['num_requests'] or 0
+        p50, p90, p99 = models.LatencyHistogram.percentiles(
+            models.LatencyHistogram.objects.filter(*filters), (0.5, 0.9, 0.99),
+        )
+        longest = self._top_views_from_rollups(rollups, 'max_time_taken')
+        most_db_time = self._top_views_from_rollups(rollups, 'max_db_time', order_by='db_time')
+        most_queries = self._top_views_from_rollups(rollups, 'max_num_queries')
+        return {
+            'num_requests': num_requests,
+            'avg_num_queries': totals['num_queries'] / num_requests if num_requests else None,
+            'avg_time_spent_on_queries': totals['db_time'] / num_requests if num_requests else None,
+            'avg_overall_time': totals['time_taken'] / num_requests if num_requests else None,
+            'p50_time': p50,
+            'p90_time': p90,
+            'p99_time': p99,
+            'longest_queries_by_view': sorted(longest, key=lambda r: r.time_taken or 0, reverse=True),
+            'most_time_spent_in_db': most_db_time,
+            'most_queries': sorted(most_queries, key=lambda r: r.num_sql_queries, reverse=True),
+        }
+
+    def _summary(self, filters):
         avg_overall_time = self._avg_num_queries(filters)
-        c = {
-            'request': request,
+        return {
             'num_requests': models.Request.objects.filter(*filters).count(),
-            'num_profiles': models.Profile.objects.filter(*filters).count(),
             'avg_num_queries': avg_overall_time,
             'avg_time_spent_on_queries': self._avg_time_spent_on_queries(filters),
             'avg_overall_time': self._avg_overall_time(filters),
             'longest_queries_by_view': self._longest_query_by_view(filters),
             'most_time_spent_in_db': self._time_spent_in_db_by_view(filters),
             'most_queries': self._num_queries_by_view(filters),
-            'filters': raw_filters
         }
+
+    def _create_context(self, request):
+        raw_filters = self.filters_manager.get(request)
+        filters = [BaseFilter.from_dict(filter_d) for _, filter_d in raw_filters.items()]
+        rollup_filters = self._rollup_filters(filters)
+        if rollup_filters is not None:
+            c = self._summary_from_rollups(rollup_filters)
+            c['queries_by_alias'] = self._queries_by_alias_from_rollups(rollup_filters)
+        else:
+            c = self._summary(filters)
+            c['queries_by_alias'] = self._queries_by_alias(filters)
+        c.update({
+            'request': request,
+            'num_profiles': models.Profile.objects.filter(*filters).count(),
+            'filters': raw_filters
+        })
         c.update(csrf(request))
         return c
 